@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+
+# python -m pycc1101 <command> [arguments], see each command's --help:
+#
+#   bench      throughput and packet error rate between two radios
+#   benchmark  SPI cost of the driver operations on the simulator
+#   capture    inspect or replay a packet capture
+
+import sys
+
+COMMANDS = ("bench", "benchmark", "capture")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv or argv[0] not in COMMANDS:
+        print("usage: python -m pycc1101 {{{}}} [arguments]".format(",".join(COMMANDS)))
+        return 2
+
+    if argv[0] == "bench":
+        from .bench import main as command
+    elif argv[0] == "benchmark":
+        from .benchmark import main as command
+    else:
+        from .capture import main as command
+
+    command(argv[1:])
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .pycc1101 import RadioTimeoutError, TICC1101
+
+
+def _step(steps):
+    # Runs the next step, StopIteration cannot be set on a Future
+    try:
+        return False, next(steps)
+    except StopIteration as done:
+        return True, done.value
+
+
+class AsyncTICC1101(object):
+    # asyncio counterpart of TICC1101. Every SPI access runs on one dedicated
+    # executor thread, so transfers are serialised and never block the event
+    # loop, and the waits of sendData/sidle are asyncio.sleep calls instead.
+    # When the radio has a GDO0 event source, recv() waits on its fd.
+
+    def __init__(self, radio=None, pollInterval=0.001, **kwargs):
+        self.radio = radio if radio is not None else TICC1101(**kwargs)
+        self.pollInterval = pollInterval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pycc1101-spi")
+        self._lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        # Waits for the queued SPI calls without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _radioLock(self):
+        # Created lazily so it binds to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        return self._lock
+
+    async def run(self, function, *args, **kwargs):
+        # Runs any blocking TICC1101 call on the SPI thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def sidle(self):
+        async with self._radioLock():
+            await self._sidle()
+
+    async def _chipState(self):
+        return self.radio.chipState(await self.run(self.radio._snop))
+
+    async def _waitChipState(self, states, timeout, operation, sleep=0.0):
+        # TICC1101._waitChipState with asyncio.sleep, the backoff is capped at
+        # pollInterval
+        radio = self.radio
+        deadline = time.monotonic() + timeout
+
+        if sleep > 0:
+            await asyncio.sleep(sleep)
+
+        interval = radio.POLL_MIN
+
+        while True:
+            status = await self.run(radio._snop)
+
+            if not status & 0x80 and radio.chipState(status) in states:
+                return status
+
+            now = time.monotonic()
+
+            if now >= deadline:
+                state = radio.chipState()
+                await self.run(radio._recover)
+                raise RadioTimeoutError(operation, state, timeout)
+
+            await asyncio.sleep(min(interval, deadline - now))
+            interval = min(2 * interval, self.pollInterval)
+
+    async def _sidle(self):
+        radio = self.radio
+        await self.run(radio._strobe, radio.SIDLE)
+
+        if radio.status & 0x80 or radio.chipState() != radio.STATE_IDLE:
+            await self._waitChipState((radio.STATE_IDLE,), radio.stateTimeout, "sidle")
+
+        await self.run(radio._strobe, radio.SFTX)
+
+    async def send(self, payload, address=None):
+        # The steps of TICC1101.sendData, run on the SPI thread
+        async with self._radioLock():
+            return await self._runSteps(self.radio._sendSteps(list(payload), address))
+
+    async def _runSteps(self, steps):
+        # TICC1101._runSteps with asyncio.sleep between the steps
+        while True:
+            done, value = await self.run(_step, steps)
+
+            if done:
+                return value
+
+            await asyncio.sleep(value)
+
+    def _pollPacket(self):
+        self.radio._setRXState()
+        return self.radio.recvData()
+
+    async def _waitGDO0(self, timeout):
+        # Waits until the GDO0 event fd is readable, True on a falling edge
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.radio.gdo0.fileno()
+
+        def ready():
+            if not readable.done():
+                readable.set_result(None)
+
+        loop.add_reader(fd, ready)
+
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+        timestamp, rising = self.radio.gdo0.read()
+        return not rising
+
+    async def recv(self, timeout=None):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while True:
+            async with self._radioLock():
+                data = await self.run(self._pollPacket)
+
+            if data:
+                return data
+
+            remaining = None if deadline is None else deadline - loop.time()
+
+            if remaining is not None and remaining <= 0:
+                return None
+
+            if self.radio.gdo0 is not None:
+                await self._waitGDO0(remaining)
+            else:
+                await asyncio.sleep(self.pollInterval if remaining is None else min(self.pollInterval, remaining))
+
+    async def packets(self):
+        while True:
+            data = await self.recv()
+
+            if data:
+                yield data
@@ -0,0 +1,373 @@
+#!/usr/bin/python3
+
+# Link throughput and packet error rate between two radios. The sender and
+# the receiver are given the same sweep (payload length x data rate x packet
+# mode x modulation) and walk through it point by point: both configure the
+# point, the sender sends count numbered packets followed by END_REPEAT end
+# markers, and the receiver moves on to the next point on an end marker or
+# when the point deadline passes.
+#
+#   python -m pycc1101 bench --role rx --lengths 8,32,58 --rates 1200,38400
+#   python -m pycc1101 bench --role tx --lengths 8,32,58 --rates 1200,38400
+#   python -m pycc1101 bench --loopback --loss 0.05 --format csv
+#
+# With --loopback both roles run in this process on simulated radios sharing
+# one SimulatedAir, synchronised on every point: results are reproducible
+# without hardware, and the per-packet latency (send call to reception) is
+# measured on one clock.
+
+import argparse
+import csv
+import itertools
+import json
+import statistics
+import struct
+import sys
+import threading
+import time
+
+from .instrumentation import Histogram
+from .profile import PANSTAMP_PROFILE
+
+# kind, sweep point, sequence number, send time in microseconds (modulo 2 ** 32)
+BENCH_HEADER = struct.Struct("<BBHI")
+
+KIND_DATA = 0xB1
+KIND_END = 0xB2
+END_REPEAT = 3
+
+MODES = {"fixed": "PKT_LEN_FIXED", "variable": "PKT_LEN_VARIABLE"}
+
+# Payload bytes of a variable length packet: the FIFO also holds the length
+# byte and the two appended status bytes
+MAX_PAYLOAD = 61
+
+
+class BenchPoint(object):
+    __slots__ = ("index", "length", "rate", "mode", "modulation")
+
+    def __init__(self, index, length, rate, mode, modulation):
+        self.index = index
+        self.length = length
+        self.rate = rate
+        self.mode = mode
+        self.modulation = modulation
+
+    def describe(self):
+        return {"point": self.index, "length": self.length, "rate": self.rate, "mode": self.mode,
+                "modulation": self.modulation}
+
+
+def sweep(lengths, rates, modes, modulations):
+    points = []
+
+    for length, rate, mode, modulation in itertools.product(lengths, rates, modes, modulations):
+        if not BENCH_HEADER.size <= length <= MAX_PAYLOAD:
+            raise Exception("Payload length must be between {} and {} bytes".format(BENCH_HEADER.size,
+                                                                                  MAX_PAYLOAD))
+
+        if mode not in MODES:
+            raise Exception("Unknown packet mode {}".format(mode))
+
+        points.append(BenchPoint(len(points) & 0xFF, length, rate, mode, modulation))
+
+    return points
+
+
+def configure(radio, point):
+    # The RX filter follows the data rate (Carson's rule on the deviation).
+    # ASK/OOK sends PATABLE[0] for zeros and PATABLE[1] for ones.
+    ook = point.modulation in ("ASK", "OOK")
+
+    radio.sidle()
+    radio.setDataRate(point.rate)
+    radio.setRXBandwidth(max(58000, 2 * (radio.getDeviation() + point.rate / 2.0)))
+    radio._writeBurst(radio.PATABLE, [0x00, PANSTAMP_PROFILE.patable[0]] if ook else PANSTAMP_PROFILE.patable)
+
+    with radio.configure() as cfg:
+        cfg["MOD_FORMAT"] = "ASK/OOK" if ook else point.modulation
+        cfg["PA_POWER"] = 1 if ook else 0
+        cfg["LENGTH_CONFIG"] = MODES[point.mode]
+        cfg["PACKET_LENGTH"] = point.length if point.mode == "fixed" else MAX_PAYLOAD
+        cfg["ADR_CHK"] = "DISABLED"
+        cfg["APPEND_STATUS"] = True
+
+
+def microseconds():
+    return int(time.monotonic() * 1e6) & 0xFFFFFFFF
+
+
+def payload(kind, point, sequence):
+    header = BENCH_HEADER.pack(kind, point.index, sequence, microseconds())
+    return header + bytes((sequence + offset) & 0xFF for offset in range(point.length - len(header)))
+
+
+def packetTime(radio, point):
+    # Expected seconds per packet: airtime plus the SPI and turnaround cost
+    return radio.airtime(point.length + 3) + 0.02
+
+
+def percentiles(histogram, prefix):
+    snapshot = histogram.snapshot((50, 90, 99))
+    row = {}
+
+    for percent, value in snapshot["percentiles"].items():
+        row["{}P{}Ms".format(prefix, percent)] = value * 1000 if value is not None else None
+
+    return row
+
+
+def distribution(values, prefix):
+    if not values:
+        return {prefix + "Min": None, prefix + "Mean": None, prefix + "Max": None}
+
+    return {prefix + "Min": min(values), prefix + "Mean": statistics.mean(values), prefix + "Max": max(values)}
+
+
+def runSender(radio, points, count, guard=0.2, interval=0.0, sync=None):
+    rows = []
+
+    for point in points:
+        configure(radio, point)
+
+        if sync is not None:
+            sync()
+        else:
+            time.sleep(guard)
+
+        latency = Histogram()
+        sent = 0
+        start = time.monotonic()
+
+        for sequence in range(count):
+            began = time.monotonic()
+
+            if radio.sendData(payload(KIND_DATA, point, sequence)):
+                sent += 1
+
+            latency.record(time.monotonic() - began)
+
+            if interval:
+                time.sleep(interval)
+
+        seconds = time.monotonic() - start
+
+        for _ in range(END_REPEAT):
+            radio.sendData(payload(KIND_END, point, count))
+
+        row = point.describe()
+        row.update({
+            "sent": sent,
+            "sendSeconds": seconds,
+            "sendPacketsPerSecond": sent / seconds if seconds else 0.0,
+        })
+        row.update(percentiles(latency, "send"))
+        rows.append(row)
+
+    return rows
+
+
+def runReceiver(radio, points, count, guard=0.2, timeout=2.0, sync=None):
+    rows = []
+
+    for point in points:
+        configure(radio, point)
+        radio.start_receiver(capacity=max(64, count))
+
+        if sync is not None:
+            sync()
+
+        deadline = time.monotonic() + guard + 2 * count * packetTime(radio, point) + timeout
+        seen = set()
+        rssi = []
+        lqi = []
+        latency = Histogram()
+        crcErrors = duplicates = foreign = 0
+        first = last = None
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                packet = radio.get(remaining)
+
+                if packet is None:
+                    break
+
+                if packet.crcOk is False:
+                    crcErrors += 1
+                    continue
+
+                if len(packet.payload) < BENCH_HEADER.size:
+                    foreign += 1
+                    continue
+
+                kind, index, sequence, sentAt = BENCH_HEADER.unpack_from(packet.payload)
+
+                if index != point.index or kind not in (KIND_DATA, KIND_END):
+                    foreign += 1
+                    continue
+
+                if kind == KIND_END:
+                    break
+
+                if sequence in seen:
+                    duplicates += 1
+                    continue
+
+                seen.add(sequence)
+                first = packet.timestamp if first is None else first
+                last = packet.timestamp
+
+                if packet.rssi is not None:
+                    rssi.append(packet.rssi)
+                    lqi.append(packet.lqi)
+
+                if sync is not None:
+                    # Same clock on both sides
+                    latency.record(((int(packet.timestamp * 1e6) - sentAt) & 0xFFFFFFFF) / 1e6)
+
+        finally:
+            radio.stop_receiver()
+
+        received = len(seen)
+        window = (last - first) if received > 1 else 0.0
+        rate = (received - 1) / window if window else 0.0
+
+        row = point.describe()
+        row.update({
+            "expected": count,
+            "received": received,
+            "per": 1.0 - received / float(count) if count else 0.0,
+            "crcErrors": crcErrors,
+            "duplicates": duplicates,
+            "foreign": foreign,
+            "packetsPerSecond": rate,
+            "goodput": rate * point.length,
+        })
+        row.update(distribution(rssi, "rssi"))
+        row.update(distribution(lqi, "lqi"))
+        row.update(percentiles(latency, "latency"))
+        rows.append(row)
+
+    return rows
+
+
+def runLoopback(points, count, loss=0.0, seed=None, interval=0.0, timeout=2.0):
+    # Both roles on simulated radios, the sender in a thread
+    from .pycc1101 import TICC1101
+    from .simulator import SimulatedAir, SimulatedCC1101
+
+    air = SimulatedAir(lossRate=loss, seed=seed)
+    radios = [TICC1101(debug=False, spi=SimulatedCC1101(air)) for _ in range(2)]
+
+    for radio in radios:
+        radio.reset()
+        radio.attach(PANSTAMP_PROFILE)
+
+    barrier = threading.Barrier(2)
+    sent = []
+    errors = []
+
+    def sender():
+        try:
+            sent.extend(runSender(radios[0], points, count, interval=interval, sync=barrier.wait))
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    thread = threading.Thread(target=sender, name="pycc1101-bench-tx")
+    thread.start()
+
+    try:
+        received = runReceiver(radios[1], points, count, timeout=timeout, sync=barrier.wait)
+    except threading.BrokenBarrierError:
+        received = []
+    finally:
+        # Releases the sender if the receiver stopped early
+        barrier.abort()
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    for row, tx in zip(received, sent):
+        row.update(dict((key, value) for key, value in tx.items() if key not in row))
+
+    return received
+
+
+def write(rows, output, fmt):
+    if fmt == "json":
+        json.dump(rows, output, indent=2)
+        output.write("\n")
+        return
+
+    fields = []
+
+    for row in rows:
+        fields.extend(key for key in row if key not in fields)
+
+    writer = csv.DictWriter(output, fields)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def numbers(text, kind=int):
+    return [kind(value) for value in text.split(",") if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pycc1101 bench",
+                                     description="Throughput and packet error rate between two CC1101 radios")
+    role = parser.add_mutually_exclusive_group(required=True)
+    role.add_argument("--role", choices=("tx", "rx"), help="this side of a two radio run")
+    role.add_argument("--loopback", action="store_true", help="both sides on simulated radios")
+    parser.add_argument("--lengths", type=numbers, default=[16, 32, 58], help="payload bytes, comma separated")
+    parser.add_argument("--rates", type=lambda text: numbers(text, float), default=[38400.0],
+                        help="data rates in baud, comma separated")
+    parser.add_argument("--modes", type=lambda text: text.split(","), default=["variable"],
+                        help="fixed, variable")
+    parser.add_argument("--modulations", type=lambda text: text.split(","), default=["GFSK"],
+                        help="2-FSK, GFSK, ASK, 4-FSK, MSK")
+    parser.add_argument("--packets", type=int, default=100, help="packets per sweep point")
+    parser.add_argument("--interval", type=float, default=0.0, help="pause between packets, s")
+    parser.add_argument("--guard", type=float, default=0.2, help="sender delay after each reconfiguration, s")
+    parser.add_argument("--timeout", type=float, default=2.0, help="receiver slack per sweep point, s")
+    parser.add_argument("--loss", type=float, default=0.0, help="loopback packet loss rate")
+    parser.add_argument("--seed", type=int, help="loopback random seed")
+    parser.add_argument("--bus", type=int, default=0)
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--speed", type=int, default=50000, help="SPI clock in Hz")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--output", help="file to write the results to, stdout by default")
+    args = parser.parse_args(argv)
+
+    points = sweep(args.lengths, args.rates, args.modes, args.modulations)
+
+    if args.loopback:
+        rows = runLoopback(points, args.packets, args.loss, args.seed, args.interval, args.timeout)
+    else:
+        from .pycc1101 import TICC1101
+
+        radio = TICC1101(args.bus, args.device, args.speed, debug=False)
+        radio.selfTest()
+        radio.attach(PANSTAMP_PROFILE)
+
+        if args.role == "tx":
+            rows = runSender(radio, points, args.packets, args.guard, args.interval)
+        else:
+            rows = runReceiver(radio, points, args.packets, args.guard, args.timeout)
+
+    if args.output is None:
+        write(rows, sys.stdout, args.format)
+    else:
+        with open(args.output, "w", newline="") as output:
+            write(rows, output, args.format)
+
+
+if __name__ == "__main__":
+    main()
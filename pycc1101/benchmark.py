@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+
+# Measures SPI transactions, bytes clocked and wall time of the driver
+# operations against the simulated CC1101, no hardware needed:
+#
+#   python -m pycc1101.benchmark --speed 50000 --repeat 20 --shadow
+#
+# --allocations adds the memory allocated (through tracemalloc) and the time
+# per call of the FIFO fill and drain primitives, without any SPI transport.
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from .pycc1101 import TICC1101
+from .simulator import SimulatedAir, SimulatedCC1101
+
+PAYLOAD = [0x01, 0x02, 0x03, 0x04]
+
+
+def configure(radio):
+    radio.reset()
+    radio.setDefaultValues()
+    radio.setFilteringAddress(0x0A)
+    radio.setPacketMode("PKT_LEN_FIXED")
+    radio.configureAddressFiltering("ENABLED_NO_BROADCAST")
+
+
+def createRadio(air, speed, shadow, realtime=True):
+    radio = TICC1101(speed=speed, debug=False, shadow=shadow,
+                     spi=SimulatedCC1101(air, realtime=realtime))
+    configure(radio)
+
+    return radio
+
+
+def measure(name, radio, operation, repeat, prepare=None):
+    transactions = 0
+    bytesClocked = 0
+    busTime = 0.0
+    wallTime = 0.0
+
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+
+        radio._spi.resetCounters()
+        start = time.perf_counter()
+        operation()
+        wallTime += time.perf_counter() - start
+
+        transactions += radio._spi.transactions
+        bytesClocked += radio._spi.bytesClocked
+        busTime += radio._spi.busTime
+
+    return {
+        "operation": name,
+        "transactions": transactions / float(repeat),
+        "bytes": bytesClocked / float(repeat),
+        "bus_ms": busTime * 1000 / repeat,
+        "wall_ms": wallTime * 1000 / repeat,
+    }
+
+
+def run(speed=50000, repeat=10, shadow=False, realtime=True):
+    air = SimulatedAir()
+    tx = createRadio(air, speed, shadow, realtime)
+    rx = createRadio(air, speed, shadow, realtime)
+
+    def armReceiver():
+        rx.sidle()
+        rx._flushRXFifo()
+        rx._setRXState()
+
+    def sendToReceiver():
+        armReceiver()
+        tx.sendData(list(PAYLOAD))
+
+        # recvData only returns a complete packet, RX ends with it
+        while rx.chipState(rx._snop()) == rx.STATE_RX:
+            time.sleep(0.001)
+
+    results = [measure("setDefaultValues", tx, tx.setDefaultValues, repeat, tx.reset)]
+    configure(tx)
+
+    results += [
+        measure("sendData", tx, lambda: tx.sendData(list(PAYLOAD)), repeat, armReceiver),
+        measure("recvData", rx, rx.recvData, repeat, sendToReceiver),
+    ]
+
+    return results
+
+
+class DriverOnlyTransport(object):
+    # Stands in for spidev when only the driver side of a transfer is
+    # measured: it returns the same list for every transfer of a length
+    max_speed_hz = 0
+
+    def __init__(self):
+        self._results = {}
+
+    def xfer2(self, data):
+        result = self._results.get(len(data))
+
+        if result is None:
+            result = self._results[len(data)] = [0x00] * len(data)
+
+        return result
+
+    def writebytes2(self, data):
+        pass
+
+
+def measureAllocations(repeat):
+    # Peak memory allocated and time per call of the FIFO fill and drain
+    # primitives, the SPI transport excluded
+    radio = TICC1101(debug=False, spi=DriverOnlyTransport())
+    payload = bytes(range(radio.FIFO_SIZE))
+    config = ("PKT_LEN_VARIABLE", radio.FIFO_SIZE - 3, None)
+
+    operations = (
+        ("fifoFill", lambda: radio._writeBurst(radio.TXFIFO, payload, status=False)),
+        ("fifoFillStatus", lambda: radio._writeBurst(radio.TXFIFO, payload, before=radio.SRX)),
+        ("fifoDrain", lambda: radio._readBurst(radio.RXFIFO, radio.FIFO_SIZE)),
+        ("buildPacket", lambda: radio._buildPacket(payload[:config[1]], config, reuse=True)),
+    )
+    results = []
+
+    for name, operation in operations:
+        operation()
+        start = time.perf_counter()
+
+        for _ in range(repeat):
+            operation()
+
+        wallTime = time.perf_counter() - start
+        allocated = 0
+        tracemalloc.start()
+
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            operation()
+            allocated += tracemalloc.get_traced_memory()[1] - current
+
+        tracemalloc.stop()
+
+        results.append({
+            "operation": name,
+            "allocated_bytes": allocated / float(repeat),
+            "wall_us": wallTime * 1000000 / repeat,
+        })
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CC1101 driver benchmark on the simulated SPI backend")
+    parser.add_argument("--speed", type=int, default=50000, help="SPI clock in Hz")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--shadow", action="store_true", help="enable the shadow register copy")
+    parser.add_argument("--allocations", action="store_true", help="measure the FIFO fill and drain allocations")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.speed, args.repeat, args.shadow)
+    allocations = measureAllocations(max(args.repeat, 1000)) if args.allocations else []
+
+    if args.json:
+        print(json.dumps(results + allocations, indent=2))
+        return
+
+    print("{:<18} {:>12} {:>10} {:>10} {:>10}".format("operation", "transactions", "bytes", "bus ms", "wall ms"))
+
+    for result in results:
+        print("{operation:<18} {transactions:>12.1f} {bytes:>10.1f} {bus_ms:>10.2f} {wall_ms:>10.2f}".format(**result))
+
+    if allocations:
+        print()
+        print("{:<18} {:>12} {:>10}".format("operation", "allocated B", "wall us"))
+
+        for result in allocations:
+            print("{operation:<18} {allocated_bytes:>12.1f} {wall_us:>10.2f}".format(**result))
+
+
+if __name__ == "__main__":
+    main()
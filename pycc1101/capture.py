@@ -0,0 +1,431 @@
+#!/usr/bin/python3
+
+# Append-only capture of received packets and replay through a TICC1101.
+#
+# A capture is a data file and a sidecar index (path + ".idx"). The data file
+# starts with HEADER and holds length-prefixed records: RECORD followed by
+# the payload. The index holds one fixed size INDEX_ENTRY per record (data
+# offset, timestamp, address), so both files can be memory-mapped and a time
+# range or an address is found from the index alone.
+#
+#   python -m pycc1101.capture info capture.bin
+#   python -m pycc1101.capture dump capture.bin --start 1700000000 --address 10
+#   python -m pycc1101.capture replay capture.bin --timing compressed --max-gap 0.1
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .packet import Packet
+
+MAGIC = b"PCC1CAP"
+VERSION = 1
+HEADER = struct.Struct("<7sB")
+
+# length, timestamp (UNIX time), channel, RSSI in 0.5 dB, LQI, flags, address
+RECORD = struct.Struct("<HdhhBBB")
+INDEX_ENTRY = struct.Struct("<Qdh")
+
+FLAG_CRC_OK = 0x01
+FLAG_CRC_KNOWN = 0x02
+FLAG_ADDRESS = 0x04
+
+NO_RSSI = -0x8000
+NO_LQI = 0xFF
+
+
+class CapturedPacket(Packet):
+    # A packet read back from a capture, its timestamp is already UNIX time
+    __slots__ = ()
+
+
+def encodeRecord(packet, timestamp):
+    payload = bytes(packet.payload)
+    flags = 0
+
+    if packet.crcOk is not None:
+        flags |= FLAG_CRC_KNOWN | (FLAG_CRC_OK if packet.crcOk else 0)
+
+    if packet.address is not None:
+        flags |= FLAG_ADDRESS
+
+    header = RECORD.pack(len(payload), timestamp,
+                         packet.channel if packet.channel is not None else -1,
+                         int(round(packet.rssi * 2)) if packet.rssi is not None else NO_RSSI,
+                         packet.lqi if packet.lqi is not None else NO_LQI,
+                         flags,
+                         packet.address if packet.address is not None else 0)
+
+    return header + payload
+
+
+def decodeRecord(buff, offset):
+    # Packet whose payload is a view on buff, None for a truncated record
+    if offset + RECORD.size > len(buff):
+        return None
+
+    length, timestamp, channel, rssi, lqi, flags, address = RECORD.unpack_from(buff, offset)
+    start = offset + RECORD.size
+
+    if start + length > len(buff):
+        return None
+
+    return CapturedPacket(memoryview(buff)[start:start + length],
+                          rssi / 2.0 if rssi != NO_RSSI else None,
+                          lqi if lqi != NO_LQI else None,
+                          bool(flags & FLAG_CRC_OK) if flags & FLAG_CRC_KNOWN else None,
+                          address if flags & FLAG_ADDRESS else None,
+                          channel if channel >= 0 else None,
+                          timestamp)
+
+
+class CaptureWriter(object):
+    # Records are encoded into memory and written by a background thread
+    # once bufferSize bytes are pending or every flushInterval seconds, so
+    # write() never blocks on the disk. Packet timestamps are time.monotonic
+    # values and are stored as UNIX time, except those of packets read from a
+    # capture which are kept.
+
+    def __init__(self, path, bufferSize=1 << 20, flushInterval=1.0):
+        self.path = path
+        self.bufferSize = bufferSize
+        self.flushInterval = flushInterval
+        self.records = 0
+        self.flushes = 0
+        self._clockOffset = time.time() - time.monotonic()
+        self._data = open(path, "ab")
+        self._index = open(path + ".idx", "ab")
+
+        if self._data.tell() == 0:
+            self._data.write(HEADER.pack(MAGIC, VERSION))
+            self._data.flush()
+
+        self._offset = self._data.tell()
+        self._pendingData = bytearray()
+        self._pendingIndex = bytearray()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="pycc1101-capture")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, packet):
+        if packet.timestamp is None:
+            timestamp = time.time()
+        elif isinstance(packet, CapturedPacket):
+            timestamp = packet.timestamp
+        else:
+            timestamp = packet.timestamp + self._clockOffset
+        record = encodeRecord(packet, timestamp)
+
+        with self._cond:
+            self._pendingIndex += INDEX_ENTRY.pack(self._offset, timestamp,
+                                                   packet.address if packet.address is not None else -1)
+            self._pendingData += record
+            self._offset += len(record)
+            self.records += 1
+
+            if len(self._pendingData) >= self.bufferSize:
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            data, index = self._take()
+
+        self._writeOut(data, index)
+
+    def _take(self):
+        data, self._pendingData = self._pendingData, bytearray()
+        index, self._pendingIndex = self._pendingIndex, bytearray()
+
+        return data, index
+
+    def _writeOut(self, data, index):
+        # The data goes first: an index entry never points past the data file
+        if data:
+            self._data.write(data)
+            self._data.flush()
+            self._index.write(index)
+            self._index.flush()
+            self.flushes += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pendingData) >= self.bufferSize,
+                                    self.flushInterval)
+                closed = self._closed
+                data, index = self._take()
+
+            self._writeOut(data, index)
+
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self._data.close()
+        self._index.close()
+
+
+class CaptureReader(object):
+    # Memory-maps a capture. Packets are built on access and their payload is
+    # a view on the map. Records must be appended in time order (as written
+    # by CaptureWriter) for the time range lookups.
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = self._mmap(self._file)
+
+        if len(self._map) < HEADER.size or HEADER.unpack_from(self._map)[0] != MAGIC:
+            raise Exception("{} is not a pycc1101 capture".format(path))
+
+        if not os.path.exists(path + ".idx"):
+            self.rebuildIndex()
+
+        self._indexFile = open(path + ".idx", "rb")
+        self._index = self._mmap(self._indexFile)
+        self._count = len(self._index) // INDEX_ENTRY.size
+
+        # Drop index entries of records cut by a crash
+        while self._count and decodeRecord(self._map, self._entry(self._count - 1)[0]) is None:
+            self._count -= 1
+
+        self._addresses = None
+
+    @staticmethod
+    def _mmap(f):
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for name in ("_map", "_index"):
+            buff = getattr(self, name, None)
+
+            if isinstance(buff, mmap.mmap):
+                try:
+                    buff.close()
+                except BufferError:
+                    pass  # Packets still reference the map
+
+        self._file.close()
+        self._indexFile.close()
+
+    def rebuildIndex(self):
+        # Scans the data file, for captures without (or with a damaged) index
+        entries = bytearray()
+        offset = HEADER.size
+
+        while True:
+            packet = decodeRecord(self._map, offset)
+
+            if packet is None:
+                break
+
+            entries += INDEX_ENTRY.pack(offset, packet.timestamp, packet.address if packet.address is not None else -1)
+            offset += RECORD.size + len(packet.payload)
+
+        with open(self.path + ".idx", "wb") as f:
+            f.write(entries)
+
+    def _entry(self, number):
+        return INDEX_ENTRY.unpack_from(self._index, number * INDEX_ENTRY.size)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(*number.indices(self._count))]
+
+        if number < 0:
+            number += self._count
+
+        if not 0 <= number < self._count:
+            raise IndexError("capture record out of range")
+
+        return decodeRecord(self._map, self._entry(number)[0])
+
+    def __iter__(self):
+        for number in range(self._count):
+            yield self[number]
+
+    def _bisect(self, timestamp):
+        # First record with a timestamp >= timestamp
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self._entry(middle)[1] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def between(self, start=None, end=None):
+        # Packets with start <= timestamp < end, UNIX time
+        first = 0 if start is None else self._bisect(start)
+        last = self._count if end is None else self._bisect(end)
+
+        for number in range(first, last):
+            yield self[number]
+
+    def byAddress(self, address):
+        # The address table is built from the index on first use
+        if self._addresses is None:
+            self._addresses = {}
+
+            for number in range(self._count):
+                self._addresses.setdefault(self._entry(number)[2], []).append(number)
+
+        for number in self._addresses.get(address, ()):
+            yield self[number]
+
+
+def capture(radio, path, count=None, timeout=None, **kwargs):
+    # Records packets of the radio's background receiver until count packets
+    # or a timeout without traffic. Returns the number of packets written.
+    receiver = radio.start_receiver()
+    written = 0
+
+    try:
+        with CaptureWriter(path, **kwargs) as writer:
+            while count is None or written < count:
+                packet = receiver.ring.get(timeout)
+
+                if packet is None:
+                    break
+
+                writer.write(packet)
+                written += 1
+    finally:
+        radio.stop_receiver()
+
+    return written
+
+
+def replay(radio, packets, timing="original", speed=1.0, maxGap=1.0, batchSize=16):
+    # Sends captured packets again. timing "original" keeps the gaps between
+    # packets (divided by speed), "compressed" also caps every gap at maxGap,
+    # None sends them back to back through sendMany in batches of batchSize.
+    # Packets are sent to the address they were captured with, the radio's
+    # own ADDR is left as is. Returns the number of packets sent.
+    sent = 0
+    batch = []
+    address = None
+
+    def flush():
+        result = radio.sendMany([packet.tobytes() for packet in batch], address)["packets"]
+        del batch[:]
+        return result
+
+    previous = None
+    started = None
+
+    for packet in packets:
+        if packet.address != address:
+            if batch:
+                sent += flush()
+
+            address = packet.address
+
+        if timing is None:
+            batch.append(packet)
+
+            if len(batch) >= batchSize:
+                sent += flush()
+
+            continue
+
+        now = time.monotonic()
+
+        if previous is not None:
+            gap = (packet.timestamp - previous) / speed
+
+            if timing == "compressed":
+                gap = min(gap, maxGap)
+
+            delay = started + gap - now
+
+            if delay > 0:
+                time.sleep(delay)
+
+        previous = packet.timestamp
+        started = time.monotonic()
+        sent += 1 if radio.sendData(packet.tobytes(), address) else 0
+
+    if batch:
+        sent += flush()
+
+    return sent
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or replay a pycc1101 packet capture")
+    parser.add_argument("command", choices=("info", "dump", "replay"))
+    parser.add_argument("path")
+    parser.add_argument("--start", type=float, help="UNIX time of the first packet")
+    parser.add_argument("--end", type=float, help="UNIX time after the last packet")
+    parser.add_argument("--address", type=int)
+    parser.add_argument("--timing", choices=("original", "compressed", "burst"), default="original")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    parser.add_argument("--max-gap", type=float, default=1.0, help="longest gap with compressed timing, s")
+    args = parser.parse_args(argv)
+
+    reader = CaptureReader(args.path)
+
+    if args.address is not None:
+        packets = (packet for packet in reader.byAddress(args.address)
+                   if (args.start is None or packet.timestamp >= args.start)
+                   and (args.end is None or packet.timestamp < args.end))
+    else:
+        packets = reader.between(args.start, args.end)
+
+    if args.command == "info":
+        first = reader[0].timestamp if len(reader) else None
+        last = reader[-1].timestamp if len(reader) else None
+        print("{} packets, {} bytes".format(len(reader), os.path.getsize(args.path)))
+
+        if first is not None:
+            print("from {} to {} ({:.3f} s)".format(time.ctime(first), time.ctime(last), last - first))
+
+    elif args.command == "dump":
+        for packet in packets:
+            print("{:.6f} {!r}".format(packet.timestamp, packet))
+
+    else:
+        from .pycc1101 import TICC1101
+
+        radio = TICC1101(debug=False)
+        radio.reset()
+        radio.setDefaultValues()
+        timing = None if args.timing == "burst" else args.timing
+        print("{} packets sent".format(replay(radio, packets, timing, args.speed, args.max_gap)))
+
+
+if __name__ == "__main__":
+    main()
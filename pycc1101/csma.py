@@ -0,0 +1,287 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from .instrumentation import Histogram
+from .receiver import BackgroundReceiver
+
+
+class CsmaScheduler(object):
+    # Listen before talk on the hardware clear channel assessment. While
+    # running, MCSM1.CCA_MODE and the AGCCTRL1 carrier sense thresholds are
+    # set and MCSM1.RXOFF_MODE = TXOFF_MODE = RX keep the radio listening
+    # between packets, so the RSSI is valid when the next STX is strobed
+    # (STX from IDLE would transmit without any assessment).
+    #
+    # A packet is loaded in the TX FIFO once. STX only leaves RX when the
+    # channel is clear, when it is refused the packet waits a random number
+    # of slots, drawn from a window doubling with every busy channel
+    # (minExponent to maxExponent), and STX is strobed again. After
+    # maxAttempts busy channels the packet is dropped.
+    #
+    # Packets are queued by send() and transmitted by a thread, the caller
+    # gets a Future resolved with the result. Carrier sensed right after a
+    # packet of ours means another node was sending at the same time, it is
+    # counted as a collision.
+    #
+    # Packets of other nodes received while listening are flushed, unless
+    # keepReceived is set: the scheduler then runs a BackgroundReceiver
+    # sharing its lock while enabled, read the packets with get().
+
+    def __init__(self, radio, ccaMode="RSSI_BELOW_THRESHOLD_UNLESS_RECEIVING", absoluteThreshold=0,
+                 relativeThreshold=None, slotTime=None, minExponent=3, maxExponent=5, maxAttempts=5,
+                 lock=None, keepReceived=False, seed=None, capacity=64):
+        if ccaMode == "ALWAYS":
+            raise Exception("CSMA needs a clear channel assessment mode")
+
+        self.radio = radio
+        self.ccaMode = ccaMode
+        self.absoluteThreshold = absoluteThreshold
+        self.relativeThreshold = relativeThreshold
+        self.slotTime = slotTime
+        self.minExponent = minExponent
+        self.maxExponent = maxExponent
+        self.maxAttempts = maxAttempts
+        self.lock = lock if lock is not None else threading.RLock()
+        self.keepReceived = keepReceived
+        self.capacity = capacity
+        self.receiver = None
+        self.latency = Histogram()
+        self._random = random.Random(seed)
+        self._queue = queue.Queue()
+        self._saved = None
+        self._settle = None
+        self._running = threading.Event()
+        self._thread = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.attempts = 0
+        self.channelBusy = 0
+        self.backoffs = 0
+        self.backoffSeconds = 0.0
+        self.collisions = 0
+        self.rxOverflows = 0
+        self.maxQueued = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def enable(self):
+        radio = self.radio
+
+        with self.lock:
+            if self._saved is None:
+                self._saved = (radio._readRegister(radio.MCSM1), radio._readRegister(radio.AGCCTRL1))
+                radio.setCCAMode(self.ccaMode)
+                radio.setCarrierSenseThreshold(self.absoluteThreshold, self.relativeThreshold)
+                radio._writeSingleByte(radio.MCSM1, radio._readRegister(radio.MCSM1) | 0x0F)
+                self._settle = radio._rssiSettlingTime()
+
+                if self.slotTime is None:
+                    # One clear channel assessment: RX to TX turnaround and
+                    # a fresh RSSI estimate
+                    self.slotTime = 0.0001 + self._settle
+
+                if self.keepReceived:
+                    # Started after MCSM1 is set, it restores that value
+                    self.receiver = BackgroundReceiver(radio, self.capacity, lock=self.lock)
+                    self.receiver.start()
+
+    def disable(self):
+        radio = self.radio
+
+        if self.receiver is not None:
+            # Joined outside the lock, its thread may be waiting for it
+            self.receiver.stop()
+            self.receiver = None
+
+        with self.lock:
+            if self._saved is not None:
+                radio._writeSingleByte(radio.MCSM1, self._saved[0])
+                radio._writeSingleByte(radio.AGCCTRL1, self._saved[1])
+                self._saved = None
+
+    def start(self):
+        self.enable()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="pycc1101-csma")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        # Packets still queued are sent first
+        self._running.clear()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.disable()
+
+    # Queue
+
+    def send(self, payload, address=None):
+        # Queues payload for address (ADDR when None), returns a Future
+        # resolved with the transmit() result
+        future = Future()
+        self._queue.put((list(payload), address, time.monotonic(), future))
+        self.maxQueued = max(self.maxQueued, self._queue.qsize())
+
+        return future
+
+    def get(self, timeout=None):
+        # Next packet received while listening, with keepReceived
+        if self.receiver is None:
+            raise Exception("Received packets are only kept with keepReceived")
+
+        return self.receiver.ring.get(timeout)
+
+    def sendAll(self, payloads, address=None):
+        futures = [self.send(payload, address) for payload in payloads]
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while self._running.is_set() or not self._queue.empty():
+            try:
+                payload, address, queued, future = self._queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+
+            try:
+                result = self.transmit(payload, address)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            self.latency.record(time.monotonic() - queued)
+            future.set_result(result)
+
+    # Transmission
+
+    def _backoff(self, busy):
+        exponent = min(self.minExponent + busy - 1, self.maxExponent)
+        delay = self._random.randint(0, (1 << exponent) - 1) * self.slotTime
+
+        self.backoffs += 1
+        self.backoffSeconds += delay
+
+        if delay:
+            time.sleep(delay)
+
+    def _listen(self, idle=True):
+        # (Re)enters RX with empty FIFOs and waits until the RSSI is valid
+        radio = self.radio
+
+        if idle:
+            radio.sidle()
+            radio._flushRXFifo()
+
+        radio._setRXState()
+        radio._waitChipState((radio.STATE_RX,), radio.stateTimeout, "csma")
+        time.sleep(self._settle)
+
+    def transmit(self, payload, address=None):
+        # Sends one packet now, from the calling thread. Returns True once it
+        # was sent, False when it was dropped or did not complete.
+        radio = self.radio
+        self.enable()
+
+        with self.lock:
+            fifo = radio._buildPacket(payload, radio._packetConfig(address))
+
+            if not fifo:
+                self.failed += 1
+                return False
+
+            airtime = radio.airtime(len(fifo))
+
+            status = radio._snop(rxFifo=True)
+
+            if radio.chipState(status) != radio.STATE_RX or (radio.fifoBytesAvailable(status)
+                                                              and not self.keepReceived):
+                self._listen()
+
+            radio._writeBurst(radio.TXFIFO, fifo)
+            busy = 0
+
+            while True:
+                self.attempts += 1
+
+                if radio.chipState(radio._snop()) == radio.STATE_RXFIFO_OVERFLOW:
+                    # Filled by other nodes while backing off, the TX FIFO is kept
+                    self.rxOverflows += 1
+                    radio._flushRXFifo()
+                    self._listen(False)
+
+                radio._setTXState()
+
+                if radio.chipState() == radio.STATE_RX:
+                    # STX may not have been executed when the SNOP was clocked in
+                    radio._snop()
+
+                if radio.chipState() in (radio.STATE_TX, radio.STATE_SETTLING):
+                    break
+
+                if radio.chipState() not in (radio.STATE_RX, radio.STATE_RXFIFO_OVERFLOW):
+                    self.failed += 1
+                    radio.sidle()
+                    radio._setRXState()
+                    return False
+
+                self.channelBusy += 1
+                busy += 1
+
+                if busy >= self.maxAttempts:
+                    self.dropped += 1
+                    radio.sidle()
+                    radio._setRXState()
+                    return False
+
+                self._backoff(busy)
+
+            start = time.monotonic()
+            status = radio._waitChipState(radio.TX_END_STATES, radio._txDeadline(airtime) - start, "csma",
+                                          sleep=0.9 * airtime)
+
+            if radio.chipState(status) == radio.STATE_TXFIFO_UNDERFLOW:
+                self.failed += 1
+                radio.sidle()
+                radio._setRXState()
+                return False
+
+            if radio.chipState(status) == radio.STATE_RX:
+                # Back in RX, the RSSI settles before it is valid for carrier
+                # sense, and before the next clear channel assessment
+                time.sleep(self._settle)
+
+                if radio.carrierSense():
+                    self.collisions += 1
+
+            self.sent += 1
+
+            return True
+
+    def statistics(self):
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "attempts": self.attempts,
+            "channelBusy": self.channelBusy,
+            "busyRatio": self.channelBusy / float(self.attempts) if self.attempts else 0.0,
+            "backoffs": self.backoffs,
+            "backoffSeconds": self.backoffSeconds,
+            "collisions": self.collisions,
+            "rxOverflows": self.rxOverflows,
+            "queued": self._queue.qsize(),
+            "maxQueued": self.maxQueued,
+            "latency": self.latency.snapshot(),
+        }
@@ -0,0 +1,181 @@
+import os
+import struct
+import tempfile
+import time
+
+from .profile import ConfigurationProfile
+
+# Continuous ASK/OOK transmission of every code of a fixed-code remote
+# control, as in Samy Kamkar's OpenSesame. A De Bruijn sequence of order n
+# holds every word of n symbols exactly once as a window, so receivers that
+# decode the last n symbols from a shift register see every code in k ** n
+# symbols instead of n * k ** n.
+#
+# Each symbol is expanded into on/off chips sent at the data rate, e.g. PWM
+# "1000" / "1110" for 0 / 1. The chip stream is streamed with send_stream in
+# infinite packet mode without preamble, sync word or CRC.
+
+# Chips of every symbol, indexed by symbol value
+ENCODINGS = {
+    "raw": ("0", "1"),
+    "manchester": ("01", "10"),
+    "pwm": ("1000", "1110"),
+}
+
+# Cached stream: chip count, then the chips packed MSB first
+CACHE_HEADER = struct.Struct("<Q")
+
+
+def deBruijn(n, k=2):
+    # Concatenation of the Lyndon words whose length divides n, in
+    # lexicographic order (Fredricksen, Kessler, Maiorana), k ** n symbols
+    sequence = []
+    word = [-1]
+
+    while word:
+        word[-1] += 1
+        length = len(word)
+
+        if n % length == 0:
+            sequence.extend(word)
+
+        while len(word) < n:
+            word.append(word[-length])
+
+        while word and word[-1] == k - 1:
+            word.pop()
+
+    return sequence
+
+
+def encode(symbols, encoding):
+    # (chip count, bytes), the last byte padded with off chips
+    chips = "".join([encoding[symbol] for symbol in symbols])
+    padded = chips + "0" * (-len(chips) % 8)
+
+    return len(chips), int(padded, 2).to_bytes(len(padded) // 8, "big") if padded else b""
+
+
+def defaultCacheDirectory():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pycc1101")
+
+
+class DeBruijnTransmitter(object):
+    # Sends the linear De Bruijn sequence of codeLength symbols (the cyclic
+    # sequence followed by its first codeLength - 1 symbols) through radio.
+    # encoding is a name of ENCODINGS or a tuple of chip strings, one per
+    # symbol. rate is in chips per second. The encoded streams are cached in
+    # cacheDirectory (None disables the cache).
+
+    def __init__(self, radio, codeLength, encoding="pwm", rate=2000, power=0xC0, cacheDirectory=""):
+        self.radio = radio
+        self.codeLength = codeLength
+        self.encodingName = encoding if isinstance(encoding, str) else "custom"
+        self.encoding = ENCODINGS[encoding] if isinstance(encoding, str) else tuple(encoding)
+        self.rate = rate
+        self.power = power
+        self.cacheDirectory = defaultCacheDirectory() if cacheDirectory == "" else cacheDirectory
+
+        if len(self.encoding) < 2 or any(set(chips) - set("01") or not chips for chips in self.encoding):
+            raise Exception("An encoding needs chip strings of 0 and 1 for at least two symbols")
+
+    @property
+    def symbolCount(self):
+        return len(self.encoding)
+
+    def codes(self):
+        return self.symbolCount ** self.codeLength
+
+    def symbols(self):
+        sequence = deBruijn(self.codeLength, self.symbolCount)
+        return sequence + sequence[:self.codeLength - 1]
+
+    def _cachePath(self):
+        name = "debruijn-{}-{}.bin".format(self.codeLength, "-".join(self.encoding))
+        return os.path.join(self.cacheDirectory, name)
+
+    def bitstream(self):
+        # (chip count, bytes to send), from the cache when possible
+        path = None if self.cacheDirectory is None else self._cachePath()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+
+            chips, = CACHE_HEADER.unpack_from(data)
+
+            if len(data) - CACHE_HEADER.size == -(-chips // 8):
+                return chips, data[CACHE_HEADER.size:]
+
+        chips, data = encode(self.symbols(), self.encoding)
+
+        if path is not None:
+            # Written atomically, several processes may share the cache
+            os.makedirs(self.cacheDirectory, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=self.cacheDirectory, prefix=".debruijn-")
+
+            with os.fdopen(fd, "wb") as f:
+                f.write(CACHE_HEADER.pack(chips))
+                f.write(data)
+
+            os.rename(temporary, path)
+
+        return chips, data
+
+    def _configure(self):
+        # Returns the profile restoring the registers that are changed
+        radio = self.radio
+        saved = dict((address, radio._readRegister(address))
+                     for address in (radio.MDMCFG4, radio.MDMCFG3, radio.MDMCFG2, radio.MDMCFG1,
+                                     radio.PKTCTRL0, radio.FREND0))
+        restore = ConfigurationProfile(saved, radio._readBurst(radio.PATABLE, 2))
+
+        radio.sidle()
+        achieved = radio.setDataRate(self.rate)
+        # Off chips use PATABLE[0], on chips PATABLE[1]
+        radio._writeBurst(radio.PATABLE, [0x00, self.power])
+
+        with radio.configure() as cfg:
+            cfg["MOD_FORMAT"] = "ASK/OOK"
+            cfg["MANCHESTER_EN"] = False
+            cfg["SYNC_MODE"] = 0
+            cfg["NUM_PREAMBLE"] = 0
+            cfg["FEC_EN"] = False
+            cfg["PKT_FORMAT"] = "NORMAL"
+            cfg["WHITE_DATA"] = False
+            cfg["CRC_EN"] = False
+            cfg["PA_POWER"] = 1
+
+        return restore, achieved
+
+    def transmit(self):
+        # Sends the whole sequence once, returns the statistics of the run
+        radio = self.radio
+        chips, data = self.bitstream()
+        restore, rate = self._configure()
+
+        try:
+            start = time.monotonic()
+            sent = radio.send_stream(data)
+            seconds = time.monotonic() - start
+        finally:
+            radio.applyProfile(restore, force=True)
+
+        minimum = chips / rate
+        symbolChips = sum(len(chips) for chips in self.encoding) / float(self.symbolCount)
+
+        return {
+            "sent": sent,
+            "codeLength": self.codeLength,
+            "encoding": self.encodingName,
+            "codes": self.codes(),
+            "chips": chips,
+            "bytes": len(data),
+            "rate": rate,
+            "seconds": seconds,
+            "minimumSeconds": minimum,
+            "overhead": seconds / minimum - 1.0 if minimum else 0.0,
+            # Every code sent on its own, back to back
+            "naiveSeconds": self.codes() * self.codeLength * symbolChips / rate,
+        }
@@ -0,0 +1,119 @@
+import fcntl
+import os
+import select
+import struct
+
+# Edge events from the Linux GPIO character device (/dev/gpiochipN), ABI v1.
+# Both sources below hand out events through a pollable file descriptor,
+# with the kernel's struct gpioevent_data layout.
+
+GPIOHANDLE_REQUEST_INPUT = 1 << 0
+GPIOEVENT_REQUEST_RISING_EDGE = 1 << 0
+GPIOEVENT_REQUEST_FALLING_EDGE = 1 << 1
+GPIOEVENT_REQUEST_BOTH_EDGES = GPIOEVENT_REQUEST_RISING_EDGE | GPIOEVENT_REQUEST_FALLING_EDGE
+
+GPIOEVENT_EVENT_RISING_EDGE = 0x01
+GPIOEVENT_EVENT_FALLING_EDGE = 0x02
+
+# struct gpioevent_request { u32 lineoffset; u32 handleflags; u32 eventflags;
+#                            char consumer_label[32]; int fd; }
+
+_EVENT_REQUEST = struct.Struct("III32si")
+_EVENT_DATA = struct.Struct("QI4x")
+
+# _IOWR(0xB4, 0x04, struct gpioevent_request)
+GPIO_GET_LINEEVENT_IOCTL = (3 << 30) | (_EVENT_REQUEST.size << 16) | (0xB4 << 8) | 0x04
+
+EDGES = {
+    "rising": GPIOEVENT_REQUEST_RISING_EDGE,
+    "falling": GPIOEVENT_REQUEST_FALLING_EDGE,
+    "both": GPIOEVENT_REQUEST_BOTH_EDGES,
+}
+
+
+class EdgeEventSource(object):
+
+    def __init__(self, fd):
+        self._fd = fd
+        self._epoll = select.epoll()
+        self._epoll.register(fd, select.EPOLLIN | select.EPOLLPRI)
+
+    def fileno(self):
+        return self._fd
+
+    def read(self):
+        # Returns (timestamp_ns, rising)
+        timestamp, event = _EVENT_DATA.unpack(os.read(self._fd, _EVENT_DATA.size))
+        return timestamp, event == GPIOEVENT_EVENT_RISING_EDGE
+
+    def wait(self, timeout=None):
+        if not self._epoll.poll(-1 if timeout is None else timeout):
+            return None
+
+        return self.read()
+
+    def close(self):
+        if self._fd is not None:
+            self._epoll.close()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GPIOLineEvent(EdgeEventSource):
+
+    def __init__(self, line, chip="/dev/gpiochip0", edge="falling", consumer="pycc1101"):
+        if edge not in EDGES:
+            raise Exception("Edge must be one of {}".format(", ".join(sorted(EDGES))))
+
+        request = bytearray(_EVENT_REQUEST.pack(line, GPIOHANDLE_REQUEST_INPUT, EDGES[edge],
+                                                consumer.encode()[:31], 0))
+        chipFd = os.open(chip, os.O_RDONLY)
+
+        try:
+            fcntl.ioctl(chipFd, GPIO_GET_LINEEVENT_IOCTL, request)
+        finally:
+            os.close(chipFd)
+
+        EdgeEventSource.__init__(self, _EVENT_REQUEST.unpack(bytes(request))[4])
+        self.line = line
+
+
+class PipeEventSource(EdgeEventSource):
+    # Stand-in for a GPIO line, edges are injected with trigger() or setLevel()
+    # (which can be passed to SimulatedCC1101.attachGDO0)
+
+    def __init__(self, edge="falling"):
+        if edge not in EDGES:
+            raise Exception("Edge must be one of {}".format(", ".join(sorted(EDGES))))
+
+        self._events = EDGES[edge]
+        self._level = 0
+        self._writeFd = None
+        readFd, self._writeFd = os.pipe()
+        EdgeEventSource.__init__(self, readFd)
+
+    def trigger(self, rising=False, timestamp=0):
+        event = GPIOEVENT_EVENT_RISING_EDGE if rising else GPIOEVENT_EVENT_FALLING_EDGE
+
+        if event & self._events:
+            os.write(self._writeFd, _EVENT_DATA.pack(timestamp, event))
+
+    def setLevel(self, level):
+        level = 1 if level else 0
+
+        if level != self._level:
+            self._level = level
+            self.trigger(rising=bool(level))
+
+    def close(self):
+        if self._writeFd is not None:
+            os.close(self._writeFd)
+            self._writeFd = None
+
+        EdgeEventSource.close(self)
@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .receiver import BackgroundReceiver
+
+
+class MergedStream(object):
+    # Packets of several receivers in timestamp order. Each receiver delivers
+    # its own packets in order, but the threads race each other, so a packet
+    # is only released once it is older than the reorder window. When the
+    # consumer falls behind the oldest packet is dropped and counted.
+
+    def __init__(self, window=0.005, capacity=1024):
+        self.window = window
+        self.capacity = capacity
+        self.overruns = 0
+        self.delivered = 0
+        self.closed = False
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, packet):
+        with self._cond:
+            heapq.heappush(self._heap, (packet.timestamp, next(self._sequence), packet))
+
+            if len(self._heap) > self.capacity:
+                heapq.heappop(self._heap)
+                self.overruns += 1
+
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+
+                if self._heap and (self.closed or self._heap[0][0] <= now - self.window):
+                    self.delivered += 1
+                    return heapq.heappop(self._heap)[2]
+
+                if self.closed:
+                    return None
+
+                if self._heap:
+                    wait = self._heap[0][0] + self.window - now
+                else:
+                    wait = None
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                self._cond.wait(wait)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class RadioGroup(object):
+    # Owns several TICC1101 on one or more SPI buses. Radios of the same bus
+    # share a bus lock taken around every transfer, and every radio has its
+    # own lock so its receive thread and its sends never interleave.
+    #
+    # Receiving radios run a BackgroundReceiver each, their packets are tagged
+    # with the radio name (Packet.source) and merged into one stream.
+    # Transmitting radios run a sender thread each which takes packets from
+    # its own queue first, then from a shared one: an idle radio always picks
+    # up the next packet, and the queued packets are sent with sendMany.
+
+    def __init__(self, window=0.005, capacity=1024, batchSize=8, pollInterval=0.0005):
+        self.radios = {}
+        self.stream = MergedStream(window, capacity)
+        self.batchSize = batchSize
+        self.pollInterval = pollInterval
+        self._names = []
+        self._busLocks = {}
+        self._locks = {}
+        self._receivers = {}
+        self._queues = {}
+        self._shared = queue.Queue()
+        self._senders = {}
+        self._sent = {}
+        self._running = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add(self, radio, name=None, bus=None):
+        name = name if name is not None else "radio{}".format(len(self._names))
+        bus = bus if bus is not None else radio.bus
+
+        if name in self.radios:
+            raise Exception("Radio {} is already in the group".format(name))
+
+        if bus not in self._busLocks:
+            self._busLocks[bus] = threading.Lock()
+
+        radio.busLock = self._busLocks[bus]
+        self.radios[name] = radio
+        self._locks[name] = threading.RLock()
+        self._queues[name] = queue.Queue()
+        self._sent[name] = 0
+        self._names.append(name)
+
+        return name
+
+    def lock(self, name):
+        # Hold it to use a radio directly while the group is running
+        return self._locks[name]
+
+    def start(self, receive=None, transmit=None):
+        # receive and transmit are lists of radio names, all radios by default
+        self._running.set()
+
+        for name in (self._names if receive is None else receive):
+            self._startReceiver(name)
+
+        for name in (self._names if transmit is None else transmit):
+            thread = threading.Thread(target=self._send, args=(name,), name="pycc1101-send-" + name)
+            thread.daemon = True
+            thread.start()
+            self._senders[name] = thread
+
+    def _startReceiver(self, name):
+        # Receivers are kept after stop() for their statistics
+        radio = self.radios[name]
+
+        def sink(packet):
+            packet.source = name
+            self.stream.put(packet)
+
+        with self._locks[name]:
+            receiver = BackgroundReceiver(radio, pollInterval=self.pollInterval, sink=sink, lock=self._locks[name])
+            receiver.start()
+
+        self._receivers[name] = receiver
+
+    def stop(self):
+        self._running.clear()
+
+        for thread in self._senders.values():
+            thread.join()
+
+        for receiver in self._receivers.values():
+            receiver.stop()
+
+        # Nothing sends the jobs still queued any more, their futures would
+        # never be resolved
+        for source in list(self._queues.values()) + [self._shared]:
+            while True:
+                try:
+                    payload, future = source.get_nowait()
+                except queue.Empty:
+                    break
+
+                future.cancel()
+
+        self._senders.clear()
+        self.stream.close()
+
+    # Merged receive stream
+
+    def get(self, timeout=None):
+        return self.stream.get(timeout)
+
+    def packets(self, timeout=None):
+        while True:
+            packet = self.stream.get(timeout)
+
+            if packet is None:
+                return
+
+            yield packet
+
+    __iter__ = packets
+
+    # Send scheduling
+
+    def send(self, payload, radio=None):
+        # Queues payload for radio, or for the first idle radio. Returns a
+        # Future resolved with the sendData result.
+        future = Future()
+        (self._shared if radio is None else self._queues[radio]).put((list(payload), future))
+
+        return future
+
+    def sendAll(self, payloads, radio=None):
+        futures = [self.send(payload, radio) for payload in payloads]
+        return [future.result() for future in futures]
+
+    def _take(self, name):
+        # Up to batchSize jobs, the radio's own queue first
+        jobs = []
+
+        for source in (self._queues[name], self._shared):
+            while len(jobs) < self.batchSize:
+                try:
+                    jobs.append(source.get_nowait())
+                except queue.Empty:
+                    break
+
+        if not jobs:
+            try:
+                jobs.append(self._shared.get(timeout=0.05))
+            except queue.Empty:
+                pass
+
+        return jobs
+
+    def _send(self, name):
+        radio = self.radios[name]
+
+        while self._running.is_set():
+            jobs = self._take(name)
+
+            if not jobs:
+                continue
+
+            try:
+                with self._locks[name]:
+                    if len(jobs) == 1:
+                        results = [radio.sendData(jobs[0][0])]
+                    else:
+                        results = radio.sendMany([payload for payload, future in jobs])["results"]
+
+                    receiver = self._receivers.get(name)
+
+                    if receiver is not None and receiver._running.is_set():
+                        radio._setRXState()
+
+            except Exception as e:
+                for payload, future in jobs:
+                    future.set_exception(e)
+
+                continue
+
+            self._sent[name] += sum(1 for result in results if result)
+
+            for (payload, future), result in zip(jobs, results):
+                future.set_result(result)
+
+    def statistics(self):
+        return {
+            "received": dict((name, receiver.packetsReceived) for name, receiver in self._receivers.items()),
+            "fifoOverflows": dict((name, receiver.fifoOverflows) for name, receiver in self._receivers.items()),
+            "sent": dict(self._sent),
+            "delivered": self.stream.delivered,
+            "overruns": self.stream.overruns,
+        }
@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+
+from .instrumentation import Histogram
+
+# Frequency synthesizer calibration time from IDLE, TI-CC1101 Datasheet
+# Table 34, in seconds
+CALIBRATION_TIME = 0.0007
+
+
+class HoppingScheduler(object):
+    # Frequency hopping with a precomputed calibration table, TI-CC1101
+    # Datasheet Section 28.2 "Frequency Hopping and Multi-Channel Systems".
+    # Every channel is calibrated once in IDLE and its FSCAL3/FSCAL2/FSCAL1
+    # values are cached, MCSM0.FS_AUTOCAL is cleared and a hop becomes one SPI
+    # transfer: SIDLE, CHANNR and the three FSCAL registers, then the strobe
+    # of the target state. The ~720 us calibration on every SRX/STX is gone.
+    #
+    # The table is only valid for the FREQ/channel spacing it was made with and
+    # for about the same temperature, call calibrate(force=True) after a large
+    # temperature change.
+
+    STATES = {"rx": 0x34, "fstxon": 0x31, "idle": None}  # SRX, SFSTXON
+    CHIP_STATES = {"rx": 1, "fstxon": 3, "idle": 0}  # Chip status byte STATE[2:0]
+
+    def __init__(self, radio, channels, dwell=None, state="rx", cachePath=None, waitSettled=False):
+        if state not in self.STATES:
+            raise Exception("Unknown hop target state: {}".format(state))
+
+        self.radio = radio
+        self.channels = list(channels)
+        self.dwell = dwell
+        self.state = state
+        self.cachePath = cachePath
+        self.waitSettled = waitSettled
+        self.table = {}
+        self.hops = 0
+        self.calibrations = 0
+        self.latency = Histogram()
+        self.lastLatency = None
+        self.channel = None
+        self._index = -1
+        self._savedMCSM0 = None
+        self._running = threading.Event()
+        self._thread = None
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        self.calibrate()
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.disable()
+
+    # Calibration table
+
+    def _cacheKey(self):
+        # Synthesizer settings the FSCAL values depend on
+        radio = self.radio
+        names = ("FREQ2", "FREQ1", "FREQ0", "MDMCFG1", "MDMCFG0", "FSCTRL1")
+
+        return dict((name, radio._readRegister(getattr(radio, name))) for name in names)
+
+    def calibrate(self, force=False):
+        # Fills the table for every channel, from the cache file if it matches
+        if not force and self.cachePath is not None and os.path.exists(self.cachePath):
+            self.load(self.cachePath)
+
+        missing = [channel for channel in self.channels if force or channel not in self.table]
+
+        if not missing:
+            return self.table
+
+        radio = self.radio
+
+        with self._lock:
+            radio.sidle()
+
+            for channel in missing:
+                radio._writeSingleByte(radio.CHANNR, channel)
+                radio._strobe(radio.SCAL)
+                radio._waitChipState((radio.STATE_IDLE,), radio.stateTimeout, "calibrate",
+                                     sleep=CALIBRATION_TIME)
+
+                self.table[channel] = tuple(radio._readBurst(radio.FSCAL3, 3))
+                self.calibrations += 1
+
+        if self.cachePath is not None:
+            self.save(self.cachePath)
+
+        return self.table
+
+    def save(self, path):
+        document = {
+            "key": self._cacheKey(),
+            "channels": dict((str(channel), list(values)) for channel, values in self.table.items()),
+        }
+        temporary = path + ".tmp"
+
+        with open(temporary, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+
+        os.rename(temporary, path)
+
+    def load(self, path):
+        # Returns False (and keeps the table) when the cache was made with
+        # other synthesizer settings
+        with open(path) as f:
+            document = json.load(f)
+
+        if document.get("key") != self._cacheKey():
+            return False
+
+        for channel, values in document["channels"].items():
+            self.table[int(channel)] = tuple(values)
+
+        return True
+
+    # Hopping
+
+    def enable(self):
+        # Clears MCSM0.FS_AUTOCAL, the cached values would be overwritten by
+        # every automatic calibration otherwise
+        radio = self.radio
+
+        if self._savedMCSM0 is None:
+            self._savedMCSM0 = radio._readRegister(radio.MCSM0)
+            radio._writeSingleByte(radio.MCSM0, self._savedMCSM0 & 0xCF)
+
+    def disable(self):
+        if self._savedMCSM0 is not None:
+            self.radio._writeSingleByte(self.radio.MCSM0, self._savedMCSM0)
+            self._savedMCSM0 = None
+
+    def hop(self, channel=None):
+        # Hops to channel, or to the next one of the list. Returns the latency
+        # in seconds: the SPI transfer, plus the PLL settling if waitSettled.
+        radio = self.radio
+
+        with self._lock:
+            if channel is None:
+                self._index = (self._index + 1) % len(self.channels)
+                channel = self.channels[self._index]
+
+            if channel not in self.table:
+                raise Exception("Channel {} is not calibrated".format(channel))
+
+            self.enable()
+            fscal3, fscal2, fscal1 = self.table[channel]
+            start = time.perf_counter()
+
+            radio._writeRegisters(((radio.CHANNR, channel),
+                                   (radio.FSCAL3, fscal3),
+                                   (radio.FSCAL2, fscal2),
+                                   (radio.FSCAL1, fscal1)),
+                                  before=radio.SIDLE, after=self.STATES[self.state])
+
+            if self.waitSettled:
+                radio._waitChipState((self.CHIP_STATES[self.state],), radio.stateTimeout, "hop")
+
+            latency = time.perf_counter() - start
+
+            self.channel = channel
+            self.hops += 1
+            self.lastLatency = latency
+            self.latency.record(latency)
+
+            if radio.instrumentation is not None:
+                radio.instrumentation.observe("hop", latency)
+
+            return latency
+
+    def sendData(self, dataBytes):
+        # Sends on the current channel then hops to the next one
+        with self._lock:
+            if self.channel is None:
+                self.hop()
+
+            result = self.radio.sendData(dataBytes)
+            self.hop()
+
+            return result
+
+    def recvData(self):
+        # Hops to the next channel after every received packet
+        with self._lock:
+            if self.channel is None:
+                self.hop()
+
+            packet = self.radio.recvData()
+
+            if packet:
+                self.hop()
+
+            return packet
+
+    # Time plan
+
+    def start(self, plan=None):
+        # Hops from a thread. plan is a sequence of (channel, dwell seconds),
+        # by default every channel of the list for self.dwell seconds.
+        if plan is None:
+            if self.dwell is None:
+                raise Exception("A dwell time or a plan is required")
+
+            plan = [(channel, self.dwell) for channel in self.channels]
+
+        self.calibrate()
+        self.enable()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, args=(list(plan),), name="pycc1101-hopping")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, plan):
+        # Deadlines are absolute so the plan does not drift with hop latency
+        deadline = time.monotonic()
+
+        while self._running.is_set():
+            for channel, dwell in plan:
+                if not self._running.is_set():
+                    break
+
+                self.hop(channel)
+                deadline += dwell
+                remaining = deadline - time.monotonic()
+
+                if remaining > 0:
+                    time.sleep(remaining)
+                else:
+                    deadline = time.monotonic()
+
+    def statistics(self):
+        return {
+            "hops": self.hops,
+            "calibrations": self.calibrations,
+            "channel": self.channel,
+            "lastLatency": self.lastLatency,
+            "latency": self.latency.snapshot(),
+        }
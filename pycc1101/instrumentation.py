@@ -0,0 +1,230 @@
+import functools
+import os
+import tempfile
+import threading
+import time
+
+
+class Histogram(object):
+    # Log-linear buckets in the spirit of HdrHistogram: values are recorded
+    # as integer nanoseconds and every power of two is split in
+    # 2 ** precision sub buckets, so the relative error is below 2 ** -precision.
+
+    def __init__(self, precision=5):
+        self.precision = precision
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._subBuckets = 1 << precision
+        self._counts = {}
+
+    def _index(self, value):
+        if value < self._subBuckets:
+            return value
+
+        shift = value.bit_length() - self.precision - 1
+        return ((shift + 1) << self.precision) + (value >> shift) - self._subBuckets
+
+    def _bounds(self, index):
+        if index < self._subBuckets:
+            return index, index
+
+        shift = (index >> self.precision) - 1
+        mantissa = (index & (self._subBuckets - 1)) + self._subBuckets
+
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e9))
+        index = self._index(value)
+
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        # In seconds, None when empty
+        if not self.count:
+            return None
+
+        target = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+
+            if seen >= target:
+                low, high = self._bounds(index)
+                return min(max((low + high) / 2.0, self.min), self.max) / 1e9
+
+        return self.max / 1e9
+
+    def mean(self):
+        return self.total / 1e9 / self.count if self.count else None
+
+    def snapshot(self, percentiles=(50, 90, 99, 99.9)):
+        return {
+            "count": self.count,
+            "sum": self.total / 1e9,
+            "min": self.min / 1e9 if self.count else None,
+            "max": self.max / 1e9 if self.count else None,
+            "percentiles": dict((p, self.percentile(p)) for p in percentiles),
+        }
+
+
+class Instrumentation(object):
+    # Counters per SPI primitive, latency histograms per driver operation and
+    # MARCSTATE transition tracing. Assign an instance to
+    # TICC1101.instrumentation (or pass it to the constructor) to enable it,
+    # with None the driver only pays one attribute check per call.
+
+    PRIMITIVES = ("_writeSingleByte", "_readSingleByte", "_readBurst", "_writeBurst", "_strobe", "_snop")
+
+    def __init__(self, precision=5, traceLength=1024):
+        self.transfers = dict((name, 0) for name in self.PRIMITIVES)
+        self.bytes = dict((name, 0) for name in self.PRIMITIVES)
+        self.histograms = {}
+        self.transitions = {}
+        self.trace = []
+        self.traceLength = traceLength
+        self.marcstate = None
+        self._precision = precision
+        self._stateHooks = []
+        self._lock = threading.Lock()
+
+    def count(self, primitive, length):
+        self.transfers[primitive] = self.transfers.get(primitive, 0) + 1
+        self.bytes[primitive] = self.bytes.get(primitive, 0) + length
+
+    def observe(self, operation, seconds):
+        with self._lock:
+            histogram = self.histograms.get(operation)
+
+            if histogram is None:
+                histogram = self.histograms[operation] = Histogram(self._precision)
+
+            histogram.record(seconds)
+
+    def onStateTransition(self, callback):
+        # callback(timestamp, previous_state, new_state), timestamp from time.monotonic
+        self._stateHooks.append(callback)
+
+    def state(self, marcstate):
+        previous = self.marcstate
+
+        if marcstate == previous:
+            return
+
+        timestamp = time.monotonic()
+        self.marcstate = marcstate
+
+        if previous is not None:
+            key = (previous, marcstate)
+            self.transitions[key] = self.transitions.get(key, 0) + 1
+
+        self.trace.append((timestamp, previous, marcstate))
+
+        if len(self.trace) > self.traceLength:
+            del self.trace[0]
+
+        for callback in self._stateHooks:
+            callback(timestamp, previous, marcstate)
+
+    def reset(self):
+        with self._lock:
+            for name in list(self.transfers):
+                self.transfers[name] = 0
+                self.bytes[name] = 0
+
+            self.histograms.clear()
+            self.transitions.clear()
+            del self.trace[:]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "transfers": dict(self.transfers),
+                "bytes": dict(self.bytes),
+                "operations": dict((name, histogram.snapshot()) for name, histogram in self.histograms.items()),
+                "transitions": dict(("0x{:02x}->0x{:02x}".format(*key), count)
+                                    for key, count in self.transitions.items()),
+            }
+
+    def export(self, callback):
+        callback(self.snapshot())
+
+    def toPrometheus(self, prefix="pycc1101", labels=None):
+        extra = "".join(',{}="{}"'.format(key, value) for key, value in sorted((labels or {}).items()))
+        snapshot = self.snapshot()
+        lines = []
+
+        lines.append("# HELP {}_spi_transfers_total SPI transfers by driver primitive".format(prefix))
+        lines.append("# TYPE {}_spi_transfers_total counter".format(prefix))
+
+        for name, value in sorted(snapshot["transfers"].items()):
+            lines.append('{}_spi_transfers_total{{primitive="{}"{}}} {}'.format(prefix, name, extra, value))
+
+        lines.append("# HELP {}_spi_bytes_total SPI bytes clocked by driver primitive".format(prefix))
+        lines.append("# TYPE {}_spi_bytes_total counter".format(prefix))
+
+        for name, value in sorted(snapshot["bytes"].items()):
+            lines.append('{}_spi_bytes_total{{primitive="{}"{}}} {}'.format(prefix, name, extra, value))
+
+        lines.append("# HELP {}_operation_seconds Latency of the driver operations".format(prefix))
+        lines.append("# TYPE {}_operation_seconds summary".format(prefix))
+
+        for name, histogram in sorted(snapshot["operations"].items()):
+            for percent, value in sorted(histogram["percentiles"].items()):
+                lines.append('{}_operation_seconds{{operation="{}",quantile="{:g}"{}}} {:.9f}'.format(
+                    prefix, name, percent / 100.0, extra, value))
+
+            lines.append('{}_operation_seconds_sum{{operation="{}"{}}} {:.9f}'.format(prefix, name, extra, histogram["sum"]))
+            lines.append('{}_operation_seconds_count{{operation="{}"{}}} {}'.format(prefix, name, extra, histogram["count"]))
+
+        lines.append("# HELP {}_marcstate_transitions_total Observed MARCSTATE transitions".format(prefix))
+        lines.append("# TYPE {}_marcstate_transitions_total counter".format(prefix))
+
+        for name, value in sorted(snapshot["transitions"].items()):
+            previous, new = name.split("->")
+            lines.append('{}_marcstate_transitions_total{{from="{}",to="{}"{}}} {}'.format(
+                prefix, previous, new, extra, value))
+
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path, prefix="pycc1101", labels=None):
+        # Written atomically for the node_exporter textfile collector
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix=".pycc1101-", suffix=".prom")
+
+        with os.fdopen(fd, "w") as f:
+            f.write(self.toPrometheus(prefix, labels))
+
+        os.rename(temporary, path)
+
+
+def timed(operation):
+    # Records the duration of a TICC1101 method when instrumentation is enabled
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = self.instrumentation
+
+            if instrumentation is None:
+                return method(self, *args, **kwargs)
+
+            start = time.perf_counter()
+
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                instrumentation.observe(operation, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,470 @@
+import collections
+import struct
+import threading
+import time
+
+from .instrumentation import Histogram
+from .receiver import BackgroundReceiver
+
+# Frame headers start with flags, source and destination address. DATA
+# frames go on with the sequence number, the oldest sequence number the
+# sender still retransmits and the payload length (fixed length packets are
+# padded). ACK frames carry the next expected sequence number and a bitmap
+# of the frames received after it, bit i is sequence number next + 1 + i.
+DATA_HEADER = struct.Struct("<BBBHHB")
+ACK_FRAME = struct.Struct("<BBBHI")
+
+FLAG_DATA = 0x01
+FLAG_ACK = 0x02
+FLAG_POLL = 0x04
+
+MAX_WINDOW = 32
+SEQUENCE_MASK = 0xFFFF
+
+
+def sequenceDistance(seq, base):
+    # seq - base modulo 2 ** 16, negative when seq comes before base
+    distance = (seq - base) & SEQUENCE_MASK
+    return distance - SEQUENCE_MASK - 1 if distance & 0x8000 else distance
+
+
+class _Outstanding(object):
+    __slots__ = ("index", "payload", "retries", "sent", "lost", "acked")
+
+    def __init__(self, index, payload):
+        self.index = index
+        self.payload = payload
+        self.retries = 0
+        self.sent = False
+        self.lost = False
+        self.acked = False
+
+
+class _Peer(object):
+    # Per destination send state and per source receive state
+
+    def __init__(self, rto):
+        self.nextSeq = 0
+        self.unacked = collections.OrderedDict()
+        self.initialRto = rto
+        self.pollSentAt = None
+        self.pollRetransmitted = False
+        self.acks = 0
+        self.srtt = None
+        self.rttvar = None
+        self.rto = rto
+        self.expected = None
+        self.buffer = {}
+
+
+class ReliableLink(object):
+    # ARQ over a TICC1101: selective repeat with per destination sequence
+    # numbers and a sliding window of up to MAX_WINDOW frames.
+    #
+    # The radio is half duplex, so a window is sent back to back with
+    # sendMany and only its last frame asks for an acknowledgement (POLL).
+    # The receiver answers with one ACK naming every frame of the window it
+    # holds, the sender retransmits the others with the next window.
+    #
+    # Frames are drained by a BackgroundReceiver (MCSM1.RXOFF_MODE = RX) and
+    # MCSM1.TXOFF_MODE = RX is set as well, so both sides are back in RX
+    # after every packet without a strobe. An ACK is loaded in the same
+    # transfer as its STX strobe and leaves through the RX to TX turnaround,
+    # without a calibration. It is held until turnaround seconds after the
+    # POLL was received, the time the sender needs to be back in RX.
+    #
+    # The retransmission timeout follows the measured round trip time (RFC
+    # 6298, Karn's algorithm), starting from the ACK airtime and the SPI
+    # time of a drain and an ACK unless initialRto is given, and doubles on
+    # every timeout. A frame is given up
+    # after retries retransmissions, the receiver skips it once the sender's
+    # oldest outstanding sequence number has moved past it.
+
+    def __init__(self, radio, address=None, window=8, retries=10, initialRto=None, minRto=0.005, maxRto=1.0,
+                 pollInterval=0.0002, turnaround=0.0005):
+        if not 1 <= window <= MAX_WINDOW:
+            raise Exception("The window is limited to {} frames".format(MAX_WINDOW))
+
+        self.radio = radio
+        self.address = address if address is not None else radio._readRegister(radio.ADDR)
+        self.window = window
+        self.retries = retries
+        self.initialRto = initialRto
+        self.minRto = minRto
+        self.maxRto = maxRto
+        self.pollInterval = pollInterval
+        self.turnaround = turnaround
+        self.rtt = Histogram()
+        self._peers = {}
+        self._delivered = collections.deque()
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._receiver = None
+        self._savedMCSM1 = None
+        self._ackEnd = None
+        self._sendSeconds = 0.0
+
+        self.framesSent = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.windowStalls = 0
+        self.failures = 0
+        self.bytesAcked = 0
+        self.acksSent = 0
+        self.acksReceived = 0
+        self.framesReceived = 0
+        self.duplicates = 0
+        self.outOfWindow = 0
+        self.skipped = 0
+        self.malformed = 0
+        self.crcErrors = 0
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def enable(self):
+        # MCSM1.TXOFF_MODE = RX: the sender listens for the ACK and the
+        # receiver for the next window right after their packet
+        radio = self.radio
+
+        with self._lock:
+            if self._savedMCSM1 is None:
+                self._savedMCSM1 = radio._readRegister(radio.MCSM1)
+                radio._writeSingleByte(radio.MCSM1, self._savedMCSM1 | 0x03)
+
+                self._receiver = BackgroundReceiver(radio, pollInterval=self.pollInterval, sink=self._handle,
+                                                    lock=self._lock)
+                self._receiver.start()
+
+    def disable(self):
+        if self._receiver is not None:
+            self._receiver.stop()
+            self._receiver = None
+
+        with self._lock:
+            if self._savedMCSM1 is not None:
+                self._waitTxDone()
+                self.radio._writeSingleByte(self.radio.MCSM1, self._savedMCSM1)
+                self._savedMCSM1 = None
+
+    def _peer(self, address):
+        peer = self._peers.get(address)
+
+        if peer is None:
+            rto = self.initialRto
+
+            if rto is None:
+                # Until the first sample, twice the time for the receiver to
+                # drain a full FIFO, load and send the ACK, and a margin
+                radio = self.radio
+                ack = ACK_FRAME.size + 2
+                rto = (2 * (radio.airtime(ack) + radio.spiTime(radio.FIFO_SIZE + ack + 32) + self.pollInterval
+                            + self.turnaround) + radio.airtimeMargin)
+
+            peer = self._peers[address] = _Peer(rto)
+
+        return peer
+
+    # Radio access
+
+    def _waitTxDone(self):
+        # An ACK may still be on air, any strobe would cut it
+        radio = self.radio
+
+        if self._ackEnd is None:
+            return
+
+        remaining = self._ackEnd - time.monotonic()
+        status = radio._waitChipState((radio.STATE_IDLE, radio.STATE_RX, radio.STATE_RXFIFO_OVERFLOW,
+                                       radio.STATE_TXFIFO_UNDERFLOW), max(remaining, 0) + radio.stateTimeout,
+                                      "ACK", sleep=remaining)
+        self._ackEnd = None
+
+        if radio.fifoBytesAvailable(status) < 15:
+            # STX was refused by the clear channel assessment, drop the ACK
+            radio.sidle()
+            radio._setRXState()
+
+    def _sendAck(self, source, peer, received):
+        radio = self.radio
+        bitmap = 0
+
+        for seq in peer.buffer:
+            distance = sequenceDistance(seq, peer.expected)
+
+            if 1 <= distance <= 32:
+                bitmap |= 1 << (distance - 1)
+
+        frame = ACK_FRAME.pack(FLAG_ACK, self.address, source, peer.expected, bitmap)
+        fifo = radio._buildPacket(frame, radio._packetConfig(source))
+        airtime = radio.airtime(len(fifo))
+        self._waitTxDone()
+
+        # The sender leaves TX after the POLL, an ACK sent before it is back
+        # in RX would be lost
+        delay = received + self.turnaround - time.monotonic() if received is not None else 0
+
+        if delay > 0:
+            time.sleep(delay)
+
+        # The FIFO is filled while the synthesizer settles
+        radio._writeBurst(radio.TXFIFO, fifo, before=radio.STX)
+        self._ackEnd = time.monotonic() + airtime
+        self.acksSent += 1
+
+    def _transmit(self, frames, address):
+        self._waitTxDone()
+        radio = self.radio
+
+        if len(frames) == 1:
+            sent = 1 if radio.sendData(frames[0], address) else 0
+        else:
+            sent = radio.sendMany(frames, address)["packets"]
+
+        self.framesSent += sent
+
+        return sent
+
+    def _handle(self, packet):
+        if packet.crcOk is False:
+            self.crcErrors += 1
+            return
+
+        payload = packet.payload
+
+        if len(payload) < 3:
+            self.malformed += 1
+            return
+
+        if payload[2] != self.address:
+            return
+
+        if payload[0] & FLAG_ACK and len(payload) >= ACK_FRAME.size:
+            flags, source, destination, expected, bitmap = ACK_FRAME.unpack_from(payload)
+            self._ackReceived(source, expected, bitmap)
+
+        elif payload[0] & FLAG_DATA and len(payload) >= DATA_HEADER.size:
+            flags, source, destination, seq, low, length = DATA_HEADER.unpack_from(payload)
+
+            if len(payload) < DATA_HEADER.size + length:
+                self.malformed += 1
+                return
+
+            self._dataReceived(source, seq, low, bytes(payload[DATA_HEADER.size:DATA_HEADER.size + length]))
+
+            if flags & FLAG_POLL:
+                self._sendAck(source, self._peers[source], packet.timestamp)
+
+        else:
+            self.malformed += 1
+
+    def _dataReceived(self, source, seq, low, data):
+        peer = self._peer(source)
+        self.framesReceived += 1
+
+        if peer.expected is None or sequenceDistance(low, peer.expected) < -MAX_WINDOW:
+            # First frame of this sender, or the sender was restarted
+            peer.expected = low
+            peer.buffer.clear()
+
+        # Frames before low were given up by the sender
+        while sequenceDistance(low, peer.expected) > 0:
+            if peer.expected in peer.buffer:
+                self._delivered.append((source, peer.buffer.pop(peer.expected)))
+            else:
+                self.skipped += 1
+
+            peer.expected = (peer.expected + 1) & SEQUENCE_MASK
+
+        distance = sequenceDistance(seq, peer.expected)
+
+        if distance < 0 or seq in peer.buffer:
+            self.duplicates += 1
+            return
+
+        if distance >= MAX_WINDOW:
+            self.outOfWindow += 1
+            return
+
+        peer.buffer[seq] = data
+
+        while peer.expected in peer.buffer:
+            self._delivered.append((source, peer.buffer.pop(peer.expected)))
+            peer.expected = (peer.expected + 1) & SEQUENCE_MASK
+
+        self._cond.notify_all()
+
+    def _ackReceived(self, source, expected, bitmap):
+        peer = self._peers.get(source)
+
+        if peer is None:
+            return
+
+        now = time.monotonic()
+        self.acksReceived += 1
+        peer.acks += 1
+
+        for seq in list(peer.unacked):
+            distance = sequenceDistance(seq, expected)
+
+            if distance < 0 or (1 <= distance <= 32 and bitmap >> (distance - 1) & 1):
+                entry = peer.unacked.pop(seq)
+                entry.acked = True
+                self.bytesAcked += len(entry.payload)
+
+        if peer.pollSentAt is not None and not peer.pollRetransmitted:
+            self._rttSample(peer, now - peer.pollSentAt)
+        else:
+            # Karn: no sample from a retransmission, but the link is alive,
+            # undo the timeout backoff
+            rto = peer.initialRto if peer.srtt is None else peer.srtt + 4 * peer.rttvar
+            peer.rto = min(max(rto, self.minRto), self.maxRto)
+
+        peer.pollSentAt = None
+        self._cond.notify_all()
+
+    def _rttSample(self, peer, rtt):
+        # RFC 6298 Section 2
+        if peer.srtt is None:
+            peer.srtt = rtt
+            peer.rttvar = rtt / 2
+        else:
+            peer.rttvar = 0.75 * peer.rttvar + 0.25 * abs(peer.srtt - rtt)
+            peer.srtt = 0.875 * peer.srtt + 0.125 * rtt
+
+        peer.rto = min(max(peer.srtt + 4 * peer.rttvar, self.minRto), self.maxRto)
+        self.rtt.record(rtt)
+
+    # Sending
+
+    def sendAll(self, payloads, address):
+        # Sends every payload to address and waits for their ACK. Returns
+        # the per payload result, False for the frames given up.
+        self.enable()
+
+        with self._cond:
+            return self._sendAll(payloads, address)
+
+    def _sendAll(self, payloads, address):
+        peer = self._peer(address)
+        pending = collections.deque(enumerate(bytes(payload) for payload in payloads))
+        results = [False] * len(pending)
+        entries = []
+        silent = 0
+        start = time.monotonic()
+
+        while pending or peer.unacked:
+            if silent > self.retries:
+                # No ACK for retries timeouts in a row, the link is down
+                self.failures += len(peer.unacked)
+                peer.unacked.clear()
+                pending.clear()
+                break
+
+            burst = [seq for seq, entry in peer.unacked.items() if entry.lost]
+
+            while pending and len(peer.unacked) < self.window:
+                index, payload = pending.popleft()
+                seq = peer.nextSeq
+                peer.nextSeq = (seq + 1) & SEQUENCE_MASK
+                entry = peer.unacked[seq] = _Outstanding(index, payload)
+                entries.append(entry)
+                burst.append(seq)
+
+            if pending:
+                self.windowStalls += 1
+
+            if not burst:
+                # Nothing known to be lost: probe with the newest frame
+                burst = [next(reversed(peer.unacked))]
+
+            for seq in list(burst):
+                entry = peer.unacked[seq]
+
+                if entry.sent:
+                    if entry.retries >= self.retries:
+                        del peer.unacked[seq]
+                        burst.remove(seq)
+                        self.failures += 1
+                        continue
+
+                    entry.retries += 1
+                    self.retransmissions += 1
+
+            if not burst:
+                continue
+
+            low = next(iter(peer.unacked))
+            frames = []
+
+            for position, seq in enumerate(burst):
+                entry = peer.unacked[seq]
+                flags = FLAG_DATA | (FLAG_POLL if position == len(burst) - 1 else 0)
+                header = DATA_HEADER.pack(flags, self.address, address, seq, low, len(entry.payload))
+                frames.append(header + entry.payload)
+                entry.sent = True
+                entry.lost = False
+
+            self._transmit(frames, address)
+            peer.pollSentAt = time.monotonic()
+            peer.pollRetransmitted = peer.unacked[burst[-1]].retries > 0
+            acks = peer.acks
+
+            if self._cond.wait_for(lambda: peer.acks != acks, peer.rto):
+                # The ACK answers the last frame sent, the others were lost
+                silent = 0
+
+                for entry in peer.unacked.values():
+                    entry.lost = True
+            else:
+                silent += 1
+                self.timeouts += 1
+                peer.pollSentAt = None
+                peer.rto = min(2 * peer.rto, self.maxRto)
+
+        self._sendSeconds += time.monotonic() - start
+
+        for entry in entries:
+            results[entry.index] = entry.acked
+
+        return results
+
+    def send(self, data, address):
+        return self.sendAll([data], address)[0]
+
+    # Receiving
+
+    def receive(self, timeout=None):
+        # Next payload delivered in order as (source address, bytes), None on
+        # timeout. Frames are acknowledged while waiting.
+        self.enable()
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._delivered, timeout):
+                return None
+
+            return self._delivered.popleft()
+
+    def statistics(self):
+        return {
+            "framesSent": self.framesSent,
+            "retransmissions": self.retransmissions,
+            "timeouts": self.timeouts,
+            "windowStalls": self.windowStalls,
+            "failures": self.failures,
+            "goodput": self.bytesAcked / self._sendSeconds if self._sendSeconds else 0.0,
+            "acksSent": self.acksSent,
+            "acksReceived": self.acksReceived,
+            "framesReceived": self.framesReceived,
+            "duplicates": self.duplicates,
+            "outOfWindow": self.outOfWindow,
+            "skipped": self.skipped,
+            "malformed": self.malformed,
+            "crcErrors": self.crcErrors,
+            "rto": dict((address, peer.rto) for address, peer in self._peers.items()),
+            "rtt": self.rtt.snapshot(),
+        }
@@ -0,0 +1,127 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# RSSI offset in dB, TI-CC1101 Datasheet Section 17.3 "RSSI"
+RSSI_OFFSET = 74
+
+
+def rssiToDBm(raw):
+    if raw >= 128:
+        raw -= 256
+
+    return raw / 2.0 - RSSI_OFFSET
+
+
+def decodeStatus(rssiByte, lqiByte):
+    # Status bytes appended with PKTCTRL1.APPEND_STATUS: (dBm, LQI, CRC_OK)
+    return rssiToDBm(rssiByte), lqiByte & 0x7F, bool(lqiByte & 0x80)
+
+
+class Packet(object):
+    __slots__ = ("payload", "rssi", "lqi", "crcOk", "address", "channel", "timestamp", "source")
+
+    def __init__(self, payload, rssi=None, lqi=None, crcOk=None, address=None, channel=None, timestamp=None,
+                 source=None):
+        self.payload = payload
+        self.rssi = rssi
+        self.lqi = lqi
+        self.crcOk = crcOk
+        self.address = address
+        self.channel = channel
+        self.timestamp = timestamp
+        self.source = source
+
+    @classmethod
+    def fromFifo(cls, data, statusLength=0, addressed=False, channel=None, timestamp=None):
+        # data is what was read from the RX FIFO after the length byte:
+        # [address] payload [rssi lqi]. The payload is a view on one buffer.
+        buff = bytes(data)
+        end = len(buff) - statusLength
+        rssi = lqi = crcOk = None
+
+        if statusLength:
+            rssi, lqi, crcOk = decodeStatus(buff[end], buff[end + 1])
+
+        start = 1 if addressed and end else 0
+        address = buff[0] if start else None
+
+        return cls(memoryview(buff)[start:end], rssi, lqi, crcOk, address, channel, timestamp)
+
+    # The payload can be used as the list recvData used to return
+
+    def __len__(self):
+        return len(self.payload)
+
+    def __iter__(self):
+        return iter(self.payload)
+
+    def __getitem__(self, index):
+        return self.payload[index]
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, Packet):
+            other = other.payload
+
+        try:
+            return bytes(self.payload) == bytes(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def tobytes(self):
+        return bytes(self.payload)
+
+    def __repr__(self):
+        return "Packet(payload={!r}, rssi={}, lqi={}, crcOk={}, address={}, channel={})".format(
+            bytes(self.payload), self.rssi, self.lqi, self.crcOk, self.address, self.channel)
+
+
+def packetDtype(maxPayload=64):
+    if numpy is None:
+        raise Exception("NumPy is required for structured packet arrays")
+
+    return numpy.dtype([
+        ("timestamp", "f8"),
+        ("channel", "i2"),
+        ("address", "i2"),
+        ("rssi", "f4"),
+        ("lqi", "i2"),
+        ("crcOk", "?"),
+        ("length", "u2"),
+        ("payload", "u1", (maxPayload,)),
+    ])
+
+
+def packetsToArray(packets, maxPayload=64):
+    # Missing values (no status bytes, no address) are stored as -1 / NaN
+    packets = list(packets)
+    array = numpy.zeros(len(packets), dtype=packetDtype(maxPayload))
+
+    for index, packet in enumerate(packets):
+        fillRow(array, index, packet.payload, packet.rssi, packet.lqi, packet.crcOk,
+                packet.address, packet.channel, packet.timestamp)
+
+    return array
+
+
+def fillRow(array, index, payload, rssi, lqi, crcOk, address, channel, timestamp):
+    length = min(len(payload), array.dtype["payload"].shape[0])
+
+    array["timestamp"][index] = timestamp if timestamp is not None else float("nan")
+    array["channel"][index] = channel if channel is not None else -1
+    array["address"][index] = address if address is not None else -1
+    array["rssi"][index] = rssi if rssi is not None else float("nan")
+    array["lqi"][index] = lqi if lqi is not None else -1
+    array["crcOk"][index] = bool(crcOk)
+    array["length"][index] = len(payload)
+    array["payload"][index, :length] = numpy.frombuffer(payload, dtype=numpy.uint8, count=length)
@@ -0,0 +1,176 @@
+import hashlib
+import re
+
+from .registers import REGISTER_NAMES, REGISTER_ADDRESSES, PATABLE_ADDRESS, PATABLE_SIZE
+
+
+class ConfigurationProfile(object):
+    _HEX = re.compile(r"0[xX]([0-9A-Fa-f]+)")
+    # Words start at a word boundary, so the "x1F" of 0x1F is not one
+    _WORD = re.compile(r"\b[A-Za-z][A-Za-z0-9_]*")
+
+    def __init__(self, registers=None, patable=None, name=None):
+        self.name = name
+        self.registers = {}
+        self.patable = []
+
+        for key, value in (registers or {}).items():
+            self[key] = value
+
+        if patable is not None:
+            self.setPATable(patable)
+
+    def _address(self, key):
+        if isinstance(key, str):
+            if key.upper() not in REGISTER_ADDRESSES:
+                raise Exception("Unknown register {}".format(key))
+            return REGISTER_ADDRESSES[key.upper()]
+
+        if not 0 <= key < len(REGISTER_NAMES):
+            raise Exception("Register address {:x} is not a configuration register".format(key))
+
+        return key
+
+    def __setitem__(self, key, value):
+        if not 0 <= value <= 0xFF:
+            raise Exception("Register value {} does not fit in a byte".format(value))
+
+        self.registers[self._address(key)] = value
+
+    def __getitem__(self, key):
+        return self.registers[self._address(key)]
+
+    def __contains__(self, key):
+        return self._address(key) in self.registers
+
+    def __len__(self):
+        return len(self.registers)
+
+    def __eq__(self, other):
+        return (isinstance(other, ConfigurationProfile) and
+                self.registers == other.registers and self.patable == other.patable)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "ConfigurationProfile({!r}, {} registers, PATABLE = {})".format(
+            self.name, len(self.registers), self.patable)
+
+    def setPATable(self, values):
+        if isinstance(values, int):
+            values = [values]
+
+        if len(values) > PATABLE_SIZE:
+            raise Exception("PATABLE has only {} entries".format(PATABLE_SIZE))
+
+        self.patable = list(values)
+
+    def digest(self):
+        # Fingerprint of the register values and PATABLE
+        data = bytearray()
+
+        for address in sorted(self.registers):
+            data += bytes((address, self.registers[address]))
+
+        return hashlib.sha1(bytes(data + bytes(self.patable))).hexdigest()
+
+    def copy(self, name=None, **overrides):
+        profile = ConfigurationProfile(self.registers, self.patable, name or self.name)
+
+        for key, value in overrides.items():
+            profile[key] = value
+
+        return profile
+
+    def toDict(self):
+        values = dict((REGISTER_NAMES[address], value) for address, value in self.registers.items())
+
+        if self.patable:
+            values["PATABLE"] = list(self.patable)
+
+        return values
+
+    @classmethod
+    def fromDict(cls, values, name=None):
+        values = dict(values)
+        patable = values.pop("PATABLE", None)
+
+        return cls(values, patable, name)
+
+    @classmethod
+    def fromSmartRFExport(cls, path, name=None):
+        with open(path) as f:
+            return cls.fromSmartRFText(f.read(), name)
+
+    @classmethod
+    def fromSmartRFText(cls, source, name=None):
+        # The "Register name / Address / Value" table, the
+        # "#define SMARTRF_SETTING_<REG> 0x.." header and the "{CC1101_<REG>, 0x..}"
+        # export templates of SmartRF Studio are all understood.
+
+        profile = cls(name=name)
+
+        for line in source.splitlines():
+            line = line.split("//")[0]
+            words = [(m.start(), m.group(0)) for m in cls._WORD.finditer(line)]
+            hexes = [(m.start(), int(m.group(1), 16)) for m in cls._HEX.finditer(line)]
+
+            for position, word in words:
+                upper = word.upper()
+
+                if "PA_TABLE" in upper or "PATABLE" in upper:
+                    values = [value for start, value in hexes if start > position]
+                    index = re.search(r"(\d+)$", upper)
+
+                    # Table exports list the address before the value
+                    if index and len(values) == 2 and values[0] == PATABLE_ADDRESS:
+                        values = values[1:]
+
+                    if index and len(values) == 1:
+                        entry = int(index.group(1))
+                        table = profile.patable + [0] * (entry + 1 - len(profile.patable))
+                        table[entry] = values[0]
+                        profile.setPATable(table)
+
+                    elif values:
+                        profile.setPATable(values[:PATABLE_SIZE])
+                    break
+
+                register = upper.split("_")[-1]
+
+                if register in REGISTER_ADDRESSES:
+                    values = [value for start, value in hexes if start > position]
+
+                    if not values:
+                        continue
+
+                    # Table exports list the address before the value
+                    if len(values) > 1 and values[0] == REGISTER_ADDRESSES[register]:
+                        profile[register] = values[1]
+                    else:
+                        profile[register] = values[0]
+                    break
+
+        return profile
+
+
+# Default values extracted from Smart RF Studio 7 / Panstamp, as programmed by
+# TICC1101.setDefaultValues: 433MHz, channel 0, sync word 0xFAFA, address
+# filtering disabled and 10dBm output power. ADDR is not part of it, so the
+# address set by setFilteringAddress is kept.
+
+PANSTAMP_PROFILE = ConfigurationProfile({
+    "IOCFG2": 0x2E, "IOCFG1": 0x2E, "IOCFG0": 0x06, "FIFOTHR": 0x07,
+    "SYNC1": 0xFA, "SYNC0": 0xFA, "PKTLEN": 20, "PKTCTRL1": 0x04,
+    "PKTCTRL0": 0x04, "CHANNR": 0x00, "FSCTRL1": 0x08, "FSCTRL0": 0x00,
+    "FREQ2": 0x10, "FREQ1": 0xA7, "FREQ0": 0x62, "MDMCFG4": 0xCA,
+    "MDMCFG3": 0x83, "MDMCFG2": 0x93, "MDMCFG1": 0x22, "MDMCFG0": 0xF8,
+    "DEVIATN": 0x35, "MCSM2": 0x07, "MCSM1": 0x20, "MCSM0": 0x18,
+    "FOCCFG": 0x16, "BSCFG": 0x6C, "AGCCTRL2": 0x43, "AGCCTRL1": 0x40,
+    "AGCCTRL0": 0x91, "WOREVT1": 0x87, "WOREVT0": 0x6B, "WORCTRL": 0xFB,
+    "FREND1": 0x56, "FREND0": 0x10, "FSCAL3": 0xE9, "FSCAL2": 0x2A,
+    "FSCAL1": 0x00, "FSCAL0": 0x1F, "RCCTRL1": 0x41, "RCCTRL0": 0x00,
+    "FSTEST": 0x59, "PTEST": 0x7F, "AGCTEST": 0x3F, "TEST2": 0x81,
+    "TEST1": 0x35, "TEST0": 0x09,
+}, patable=[0xC0], name="panstamp")
@@ -1,6 +1,77 @@
-import spidev
+import threading
 import time
 
+try:
+    import spidev
+except ImportError:
+    spidev = None
+
+from .profile import ConfigurationProfile, PANSTAMP_PROFILE
+from .registers import FIELDS, REGISTER_ADDRESSES, REGISTER_FIELDS, REGISTER_NAMES, STATUS_REGISTER_ADDRESSES
+from .instrumentation import timed
+from .packet import Packet, rssiToDBm
+from . import solvers
+from .receiver import BackgroundReceiver
+from .sweep import SpectrumSweep
+
+# Padding of fixed length packets
+ZEROS = bytes(256)
+
+
+class RadioTimeoutError(Exception):
+    # A wait on the chip exceeded its deadline, the radio was recovered
+    # (IDLE, FIFOs flushed) before raising
+
+    def __init__(self, operation, state, timeout):
+        Exception.__init__(self, "{} timed out after {:.3f} s, chip state {}".format(operation, timeout, state))
+        self.operation = operation
+        self.state = state
+        self.timeout = timeout
+
+
+class RegisterTransaction(object):
+    # Field edits collected by TICC1101.configure(), written on exit with as
+    # few transfers as possible: every register is read (if a part of it is
+    # kept) and written at most once, and neighbouring registers share a
+    # burst. Reading a field returns the pending value if it was set.
+
+    def __init__(self, radio):
+        self.radio = radio
+        self.edits = {}
+        self.transfers = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        if excType is None:
+            self.commit()
+
+    def __setitem__(self, name, value):
+        field = self.radio._field(name)
+        mask, bits = self.edits.get(field.address, (0x00, 0x00))
+        self.edits[field.address] = (mask | field.mask, field.encode(value, bits))
+
+    def __getitem__(self, name):
+        field = self.radio._field(name)
+        mask, bits = self.edits.get(field.address, (0x00, 0x00))
+
+        if mask & field.mask == field.mask:
+            return field.decode(bits)
+
+        return self.radio.getField(name)
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            self[name] = value
+
+    def commit(self):
+        self.transfers += self.radio._writeFields(self.edits)
+        self.edits = {}
+
+        return self.transfers
+
+
 class TICC1101(object):
     WRITE_SINGLE_BYTE = 0x00
     WRITE_BURST = 0x40
@@ -108,50 +179,458 @@ class TICC1101(object):
     RCCTRL1_STATUS = 0xFC  # Last RC Oscillator Calibration Result
     RCCTRL0_STATUS = 0xFD  # Last RC Oscillator Calibration Result
 
-    def __init__(self, bus=0, device=0, speed=50000, debug=True):
+    FXOSC = 26000000  # Crystal oscillator frequency
+    FIFO_SIZE = 64
+
+    # Chip status byte STATE[2:0], TI-CC1101 Datasheet Table 23
+
+    STATE_IDLE = 0
+    STATE_RX = 1
+    STATE_TX = 2
+    STATE_FSTXON = 3
+    STATE_CALIBRATE = 4
+    STATE_SETTLING = 5
+    STATE_RXFIFO_OVERFLOW = 6
+    STATE_TXFIFO_UNDERFLOW = 7
+
+    # States the chip can be in once a packet has left the air
+    TX_END_STATES = (STATE_IDLE, STATE_RX, STATE_FSTXON, STATE_CALIBRATE, STATE_RXFIFO_OVERFLOW,
+                     STATE_TXFIFO_UNDERFLOW)
+
+    # Adaptive polling: once the expected duration of a wait is slept, the
+    # chip is polled with an interval doubling from POLL_MIN up to POLL_MAX
+
+    POLL_MIN = 0.00005
+    POLL_MAX = 0.002
+
+    # FSCAL3[5:4], FSCAL2 and FSCAL1 are overwritten by the chip after every
+    # frequency synthesizer calibration, so they are never served from the
+    # shadow copy. FSTEST..TEST0 loose their value in SLEEP state.
+
+    SHADOW_VOLATILE = (FSCAL3, FSCAL2, FSCAL1)
+    SHADOW_SLEEP_LOST = range(FSTEST, TEST0 + 1)
+
+    # Registers that are already correct are still rewritten by applyProfile
+    # when that joins two bursts, as long as the gap is not longer than this
+
+    PROFILE_MAX_BRIDGE = 2
+
+    # Extra reads of RXBYTES / TXBYTES before the last value is taken as is
+
+    FIFO_READ_RETRIES = 3
+
+    def __init__(self, bus=0, device=0, speed=50000, debug=True, shadow=False, spi=None, gdo0=None,
+                 instrumentation=None):
+        self.debug = debug
+        self.bus = bus
+        self.device = device
+        self.instrumentation = instrumentation
+        # Shared by the radios of one SPI bus when they are used from
+        # several threads, see group.RadioGroup
+        self.busLock = None
+        self.gdo0 = gdo0
+        self.receiver = None
+        # Length byte of a variable length packet read by recvData() before
+        # the rest of the packet had arrived
+        self._rxPendingLength = None
+        self.spiTransactionsSaved = 0
+        # Last chip status byte, see chipState() and fifoBytesAvailable()
+        self.status = None
+        # Deadline of state transitions (calibration included) and the slack
+        # added to twice the expected airtime of a transmission, in seconds
+        self.stateTimeout = 0.05
+        self.airtimeMargin = 0.01
+        self._shadow = [None] * (self.TEST0 + 1) if shadow else None
+        self._patable = None
+        # Preallocated transfer buffers, and views of them for every length
+        # so that a transfer allocates nothing: a strobe, a header and a full
+        # FIFO for writes, the packet being sent, and per address read
+        # headers followed by dummy bytes
+        self._txBuffer = bytearray(self.FIFO_SIZE + 2)
+        self._txViews = self._views(self._txBuffer)
+        self._txBufferLock = threading.Lock()
+        self._packetBuffer = bytearray(self.FIFO_SIZE)
+        self._packetViews = self._views(self._packetBuffer)
+        self._readViews = {}
+        self._spiWrite = None
+
         try:
-            self.debug = debug
-            self._spi = spidev.SpiDev()
-            self._spi.open(bus, device)
+            # Any object implementing the spidev.SpiDev xfer() call can be
+            # used as transport, e.g. simulator.SimulatedCC1101
+            if spi is None:
+                if spidev is None:
+                    raise Exception("spidev is not installed, an spi transport must be given")
+
+                spi = spidev.SpiDev()
+                spi.open(bus, device)
+
+            self._spi = spi
             self._spi.max_speed_hz = speed
+            # xfer2 keeps CSn low for the whole transfer, writebytes2 (spidev
+            # 3.5 and later) takes bytes-like objects without converting them
+            self._spiXfer = getattr(spi, "xfer2", None) or spi.xfer
+            self._spiWrite = getattr(spi, "writebytes2", None)
 
         except Exception as e:
             print(e)
 
+    @staticmethod
+    def _views(buff):
+        view = memoryview(buff)
+        return [view[:length] for length in range(len(buff) + 1)]
+
     def _usDelay(self, useconds):
         time.sleep(useconds / 1000000.0)
 
+    def _xfer(self, data):
+        if self.busLock is None:
+            return self._spiXfer(data)
+
+        with self.busLock:
+            return self._spiXfer(data)
+
+    def _write(self, data):
+        # A transfer whose returned bytes are not needed
+        if self.busLock is None:
+            return self._spiWrite(data)
+
+        with self.busLock:
+            return self._spiWrite(data)
+
+    def _lap(self, phase, start):
+        # Records the time since start for a phase of an operation and
+        # returns the new start, a no-op without instrumentation
+        if self.instrumentation is None:
+            return None
+
+        now = time.perf_counter()
+
+        if start is not None:
+            self.instrumentation.observe(phase, now - start)
+
+        return now
+
     def _writeSingleByte(self, address, byte_data):
-        return self._spi.xfer([self.WRITE_SINGLE_BYTE | address, byte_data])
+        if self.instrumentation is not None:
+            self.instrumentation.count("_writeSingleByte", 2)
+
+        self._updateShadow(address, [byte_data])
+        result = self._xfer([self.WRITE_SINGLE_BYTE | address, byte_data])
+        self.status = result[-1]
+
+        return result
 
     def _readSingleByte(self, address):
-        return self._spi.xfer([self.READ_SINGLE_BYTE | address, 0x00])[1]
+        if self.instrumentation is not None:
+            self.instrumentation.count("_readSingleByte", 2)
+
+        result = self._xfer([self.READ_SINGLE_BYTE | address, 0x00])
+        self.status = result[0]
+
+        return result[1]
+
+    def _readFifoBytes(self, address):
+        # RXBYTES / TXBYTES: a read racing an update of the register can
+        # return a corrupt value, TI-CC1101 Errata Note "SPI Read
+        # Synchronization Issue", so two consecutive reads must be at most
+        # one byte apart. At a slow SPI clock a read lasts longer than a byte
+        # on air and exact agreement may never come: the TX FIFO drains and
+        # the RX FIFO fills, the lower TX count and the higher RX count are
+        # the safe (and the more recent) value.
+        value = self._readSingleByte(address)
+
+        for _ in range(self.FIFO_READ_RETRIES):
+            again = self._readSingleByte(address)
+
+            if abs(again - value) <= 1:
+                return min(value, again) if address == self.TXBYTES else max(value, again)
+
+            value = again
+
+        return value
+
+    def _snop(self, rxFifo=False):
+        # Cheapest poll, a single byte transfer: returns the chip status byte
+        # with the RX FIFO bytes available (rxFifo) or the TX FIFO free bytes
+        if self.instrumentation is not None:
+            self.instrumentation.count("_snop", 1)
+
+        self.status = self._xfer([self.SNOP | (self.READ_SINGLE_BYTE if rxFifo else 0x00)])[0]
+
+        return self.status
+
+    def chipState(self, status=None):
+        # STATE[2:0] of the chip status byte, the last one by default
+        return ((self.status if status is None else status) >> 4) & 0x07
+
+    def fifoBytesAvailable(self, status=None):
+        # Saturates at 15, RX bytes after a read access, TX free bytes after a
+        # write access or a strobe
+        return (self.status if status is None else status) & 0x0F
 
     def _readBurst(self, start_address, length):
-        buff = []
-        ret = []
+        # One header byte, the chip then returns the registers (or FIFO
+        # bytes) from start_address on for every byte clocked in until CSn
+        # goes high, TI-CC1101 Datasheet Section 10.3
+        views = self._readViews.get(start_address)
+
+        if views is None:
+            views = self._views(bytes((start_address | self.READ_BURST,)) + bytes(self.FIFO_SIZE))
+            self._readViews[start_address] = views
+
+        if length <= self.FIFO_SIZE:
+            buff = views[length + 1]
+        else:
+            buff = bytes((start_address | self.READ_BURST,)) + bytes(length)
 
-        for x in range(length + 1):
-            addr = (start_address + (x * 8)) | self.READ_BURST
-            buff.append(addr)
+        if self.instrumentation is not None:
+            self.instrumentation.count("_readBurst", len(buff))
 
-        ret = self._spi.xfer(buff)[1:]
+        result = self._xfer(buff)
+        self.status = result[0]
+        ret = result[1:]
 
         if self.debug:
             print("_readBurst | start_address = {:x}, length = {:x}".format(start_address, length))
 
         return ret
 
-    def _writeBurst(self, address, data):
-        data.insert(0, (self.WRITE_BURST | address))
+    def _writeBurst(self, address, data, before=None, status=True):
+        # data (a list of bytes, bytes, bytearray or memoryview) is copied
+        # after the header in the preallocated buffer, it is not modified.
+        # before is a command strobe sent in the same transfer. Without
+        # status the returned bytes are not needed and writebytes2 is used
+        # when the transport has it, self.status is then left as it was.
+        offset = 0 if before is None else 1
+        size = offset + 1 + len(data)
+
+        if self.instrumentation is not None:
+            self.instrumentation.count("_writeBurst", size)
+
+        self._updateShadow(address, data)
+
+        with self._txBufferLock:
+            if size <= len(self._txBuffer):
+                buff = self._txBuffer
+                view = self._txViews[size]
+            else:
+                buff = view = bytearray(size)
+
+            if before is not None:
+                buff[0] = before
+
+            buff[offset] = self.WRITE_BURST | address
+            buff[offset + 1:size] = data
+
+            if not status and self._spiWrite is not None:
+                self._write(view)
+                return None
+
+            result = self._xfer(view)
+
+        self.status = result[-1]
+
+        return result
+
+    def _writeRegisters(self, values, before=None, after=None):
+        # Writes {address: value} as single byte accesses chained in one SPI
+        # transfer (CSn stays low between headers), optionally preceded and
+        # followed by a command strobe
+        data = [] if before is None else [before]
+
+        for address, value in values:
+            self._updateShadow(address, [value])
+            data.extend((self.WRITE_SINGLE_BYTE | address, value))
+
+        if after is not None:
+            data.append(after)
+
+        if self.instrumentation is not None:
+            self.instrumentation.count("_writeRegisters", len(data))
+
+        result = self._xfer(data)
+        self.status = result[-1]
+
+        return result
+
+    def _updateShadow(self, address, data):
+        if address == self.PATABLE:
+            self._patable = None
+
+        if self._shadow is None:
+            return
+
+        for offset, value in enumerate(data):
+            if address + offset > self.TEST0:
+                break
+            self._shadow[address + offset] = value
+
+    def _invalidateShadow(self, addresses=None):
+        self._patable = None
+
+        if self._shadow is None:
+            return
+
+        for address in (addresses if addresses is not None else range(len(self._shadow))):
+            self._shadow[address] = None
+
+    def _readRegister(self, address):
+        # Configuration registers are served from the shadow copy when it
+        # is enabled and holds a known value, any other address goes to the chip
+
+        if self._shadow is None or address > self.TEST0 or address in self.SHADOW_VOLATILE:
+            return self._readSingleByte(address)
+
+        value = self._shadow[address]
+
+        if value is None:
+            value = self._readSingleByte(address)
+            self._shadow[address] = value
+        else:
+            self.spiTransactionsSaved += 1
+
+        return value
+
+    @timed("resync")
+    def resync(self):
+        # Reload (and enable, if it was disabled) the shadow copy from the chip
+        if self._shadow is None:
+            self._shadow = [None] * (self.TEST0 + 1)
+
+        self._shadow[:] = self.snapshot()
+
+        return list(self._shadow)
+
+    def verifyShadow(self):
+        # Returns the addresses whose shadow value differs from the chip
+        if self._shadow is None:
+            return []
+
+        mismatches = []
+
+        for address in range(self.TEST0 + 1):
+            if address in self.SHADOW_VOLATILE or self._shadow[address] is None:
+                continue
+
+            value = self._readSingleByte(address)
+
+            if value != self._shadow[address]:
+                mismatches.append(address)
+
+                if self.debug:
+                    print("verifyShadow | address = {:x}, shadow = {:x}, chip = {:x}".format(
+                        address, self._shadow[address], value))
+
+        return mismatches
+
+    def _profileBursts(self, profile, known):
+        # Groups the registers that differ from the known values in
+        # (start_address, values) runs, one WRITE_BURST transfer each
+        runs = []
 
-        return self._spi.xfer(data)
+        for address in sorted(profile.registers):
+            value = profile.registers[address]
 
+            if known[address] == value:
+                continue
+
+            if runs:
+                start, values = runs[-1]
+                gap = range(start + len(values), address)
+                fill = [profile.registers.get(a, known[a]) for a in gap]
+
+                if len(fill) <= self.PROFILE_MAX_BRIDGE and None not in fill:
+                    values.extend(fill)
+                    values.append(value)
+                    continue
+
+            runs.append((address, [value]))
+
+        return runs
+
+    @timed("applyProfile")
+    def applyProfile(self, profile, force=False):
+        # Without the shadow copy (or with force) every register of the
+        # profile is written, otherwise only the ones that differ
+
+        if self._shadow is None or force:
+            return self._writeProfile(profile, [None] * (self.TEST0 + 1), None)
+
+        return self._writeProfile(profile, self._shadow, self._patable)
+
+    def _writeProfile(self, profile, known, patable):
+        transfers = 0
+
+        for start, values in self._profileBursts(profile, known):
+            if self.debug:
+                print("applyProfile | start_address = {:x}, length = {:d}".format(start, len(values)))
+
+            self._writeBurst(start, values)
+            transfers += 1
+
+        if profile.patable and profile.patable != patable:
+            self._writeBurst(self.PATABLE, list(profile.patable))
+            transfers += 1
+
+            if self._shadow is not None:
+                self._patable = list(profile.patable)
+
+        return transfers
+
+    def snapshot(self):
+        # Every configuration register, IOCFG2 to TEST0, in one transfer
+        return self._readBurst(self.IOCFG2, self.TEST0 + 1)
+
+    @timed("attach")
+    def attach(self, profile=PANSTAMP_PROFILE):
+        # Warm start on a chip that may already be configured, e.g. when the
+        # program restarts: instead of reset() and a full applyProfile, the
+        # registers are read in one burst and compared with the profile.
+        # When they match nothing is written and the chip stays in its state
+        # (RX, WOR...), otherwise it goes to IDLE and only the registers that
+        # differ are rewritten. The calibration results (SHADOW_VOLATILE) are
+        # left out of the comparison and never written. The shadow copy, when
+        # enabled, is loaded from the snapshot. Returns the number of write
+        # transfers.
+        registers = self.snapshot()
+        patable = self._readBurst(self.PATABLE, len(profile.patable)) if profile.patable else []
+
+        if self._shadow is not None:
+            self._shadow[:] = registers
+            self._patable = list(patable)
+
+        stable = [address for address in profile.registers if address not in self.SHADOW_VOLATILE]
+        chip = ConfigurationProfile(dict((address, registers[address]) for address in stable), patable)
+        expected = ConfigurationProfile(dict((address, profile.registers[address]) for address in stable),
+                                        profile.patable)
+
+        if chip.digest() == expected.digest():
+            if self.debug:
+                print("attach | {} registers verified".format(len(stable)))
+
+            return 0
+
+        self.sidle()
+
+        # None keeps the runs from bridging over the calibration results
+        known = [None if address in self.SHADOW_VOLATILE else value for address, value in enumerate(registers)]
+
+        return self._writeProfile(expected, known, patable)
+
+    @timed("reset")
     def reset(self):
+        self._invalidateShadow()
         return self._strobe(self.SRES)
 
     def _strobe(self, address):
-        return self._spi.xfer([address, 0x00])
+        # The SNOP after the strobe returns the status once it is executed
+        if self.instrumentation is not None:
+            self.instrumentation.count("_strobe", 2)
+
+        result = self._xfer([address, self.SNOP])
+        self.status = result[1]
+
+        return result
 
     def selfTest(self):
         part_number = self._readSingleByte(self.PARTNUM)
@@ -170,31 +649,93 @@ class TICC1101(object):
             print("Component Version: {:x}".format(component_version))
             print("Self test OK")
 
+    @timed("sidle")
     def sidle(self):
         self._strobe(self.SIDLE)
+        phase = self._lap(None, None)
+
+        # CHIP_RDYn (bit 7) stays high until the crystal runs
+        if self.status & 0x80 or self.chipState() != self.STATE_IDLE:
+            self._waitChipState((self.STATE_IDLE,), self.stateTimeout, "sidle")
 
-        while (self._readSingleByte(self.MARCSTATE) != 0x01):
-            self._usDelay(100)
+        self._lap("sidle.marcstateWait", phase)
 
         self._strobe(self.SFTX)
-        self._usDelay(100)
 
     def powerDown(self):
         self.sidle()
+        self._invalidateShadow(self.SHADOW_SLEEP_LOST)
         self._strobe(self.SPWD)
 
-    def setCarrierFrequency(self, freq=433):
-        # Register values extracted from SmartRF Studio 7
-        if freq == 433:
-            self._writeSingleByte(self.FREQ2, 0x10)
-            self._writeSingleByte(self.FREQ1, 0xA7)
-            self._writeSingleByte(self.FREQ0, 0x62)
-        elif freq == 868:
-            self._writeSingleByte(self.FREQ2, 0x21)
-            self._writeSingleByte(self.FREQ1, 0x62)
-            self._writeSingleByte(self.FREQ0, 0x76)
+    def setCarrierFrequency(self, freq=433e6):
+        # freq in Hz, 433 MHz and 868 MHz keep the register values extracted
+        # from SmartRF Studio 7. Returns the achieved frequency in Hz.
+        if freq == 433e6:
+            freq2, freq1, freq0 = 0x10, 0xA7, 0x62
+        elif freq == 868e6:
+            freq2, freq1, freq0 = 0x21, 0x62, 0x76
         else:
-            raise Exception("Only 433MHz and 868MHz are currently supported")
+            freq2, freq1, freq0 = solvers.solveFrequency(freq, self.FXOSC)[0]
+
+        self._writeBurst(self.FREQ2, [freq2, freq1, freq0])
+
+        return solvers.carrierFrequency(freq2, freq1, freq0, self.FXOSC)
+
+    def getCarrierFrequency(self):
+        return solvers.carrierFrequency(self._readRegister(self.FREQ2), self._readRegister(self.FREQ1),
+                                        self._readRegister(self.FREQ0), self.FXOSC)
+
+    def setDataRate(self, baud):
+        # TI-CC1101 Datasheet, Section 12 "Data Rate Programming"
+        (exponent, mantissa), achieved = solvers.solveDataRate(baud, self.FXOSC)
+        mdmcfg4 = (self._readRegister(self.MDMCFG4) & 0xF0) | exponent
+
+        self._writeBurst(self.MDMCFG4, [mdmcfg4, mantissa])
+
+        return achieved
+
+    def setDeviation(self, freq):
+        # TI-CC1101 Datasheet, Section 16.1 "Frequency Shift Keying"
+        (exponent, mantissa), achieved = solvers.solveDeviation(freq, self.FXOSC)
+        self._writeSingleByte(self.DEVIATN, (exponent << 4) | mantissa)
+
+        return achieved
+
+    def getDeviation(self):
+        return solvers.deviation(self._readRegister(self.DEVIATN), self.FXOSC)
+
+    def setChannelSpacing(self, spacing):
+        # TI-CC1101 Datasheet, Section 21 "Frequency Programming"
+        (exponent, mantissa), achieved = solvers.solveChannelSpacing(spacing, self.FXOSC)
+        mdmcfg1 = (self._readRegister(self.MDMCFG1) & 0xFC) | exponent
+
+        self._writeBurst(self.MDMCFG1, [mdmcfg1, mantissa])
+
+        return achieved
+
+    def getChannelSpacing(self):
+        return solvers.channelSpacing(self._readRegister(self.MDMCFG1), self._readRegister(self.MDMCFG0),
+                                      self.FXOSC)
+
+    def setRXBandwidth(self, bandwidth):
+        # TI-CC1101 Datasheet, Section 13 "Receiver Channel Filter Bandwidth"
+        (exponent, mantissa), achieved = solvers.solveRXBandwidth(bandwidth, self.FXOSC)
+        mdmcfg4 = (self._readRegister(self.MDMCFG4) & 0x0F) | (exponent << 6) | (mantissa << 4)
+
+        self._writeSingleByte(self.MDMCFG4, mdmcfg4)
+
+        return achieved
+
+    def getRXBandwidth(self):
+        return solvers.rxBandwidth(self._readRegister(self.MDMCFG4), self.FXOSC)
+
+    def _rssiSettlingTime(self):
+        # Seconds in RX before the RSSI (and so CCA) is valid: the averaging
+        # window of AGCCTRL0.FILTER_LENGTH channel filter samples, taken at
+        # about the RX filter bandwidth
+        samples = 8 << (self._readRegister(self.AGCCTRL0) & 0x03)
+
+        return samples / self.getRXBandwidth()
 
     def setChannel(self, channel=0x00):
         self._writeSingleByte(self.CHANNR, channel)
@@ -202,174 +743,105 @@ class TICC1101(object):
     def setSyncWord(self, sync_word="FAFA"):
         assert len(sync_word) == 4
 
-        self._writeSingleByte(self.SYNC1, int(sync_word[:2], 16))
-        self._writeSingleByte(self.SYNC0, int(sync_word[2:], 16))
+        self._writeBurst(self.SYNC1, [int(sync_word[:2], 16), int(sync_word[2:], 16)])
 
     def getRegisterConfiguration(self, register, showConfig=True):
-        def toBits(byte):
-            return bin(byte)[2:].zfill(8)
-
-        if register == "PKTCTRL1":
-            bits = toBits(self._readSingleByte(self.PKTCTRL1))
-
-            if showConfig:
-                print("PKTCTRL1")
-                print("PQT[7:5] = {}".format(bits[:3]))
-                print("CRC_AUTOFLUSH = {}".format(bits[4]))
-                print("APPEND_STATUS = {}".format(bits[5]))
-                print("ADR_CHK[1:0] = {}".format(bits[6:]))
-
-        elif register == "PKTCTRL0":
-            bits = toBits(self._readSingleByte(self.PKTCTRL0))
-
-            if showConfig:
-                print("PKTCTRL0")
-                print("WHITE_DATA = {}".format(bits[1]))
-                print("PKT_FORMAT[1:0] = {}".format(bits[2:4]))
-                print("CRC_EN = {}".format(bits[5]))
-                print("LENGTH_CONFIG[1:0] = {}".format(bits[6:]))
-
-        elif register == "ADDR":
-            bits = toBits(self._readSingleByte(self.ADDR))
-
-            if showConfig:
-                print("ADDR")
-                print("DEVICE_ADDR = {}".format(bits))
-
-        elif register == "CHANNR":
-            bits = toBits(self._readSingleByte(self.CHANNR))
-
-            if showConfig:
-                print("CAHNNR")
-                print("CHAN = {}".format(bits))
-
-        elif register == "PKTSTATUS":
-            bits = toBits(self._readSingleByte(self.CHANNR))
-
-            if showConfig:
-                print("PKTSTATUS")
-                print("CRC_OK = {}".format(bits[0]))
-                print("CS = {}".format(bits[1]))
-                print("PQT_REACHED = {}".format(bits[2]))
-                print("CCA = {}".format(bits[3]))
-                print("SFD = {}".format(bits[4]))
-                print("GDO2 = {}".format(bits[5]))
-                print("GDO0 = {}".format(bits[7]))
-
-        elif register == "MDMCFG2":
-            bits = toBits(self._readSingleByte(self.MDMCFG2))
-
-            if showConfig:
-                print("MDMCFG2")
-                print("DEM_DCFILT_OFF = {}".format(bits[0]))
-                print("MOD_FORMAT = {}".format(bits[1:4]))
-                print("MANCHESTER_EN = {}".format(bits[4]))
-                print("SYNC_MODE = {}".format(bits[5:]))
-
-        elif register == "MDMCFG1":
-            bits = toBits(self._readSingleByte(self.MDMCFG1))
-
-            if showConfig:
-                print("MDMCFG1")
-                print("FEC_EN = {}".format(bits[0]))
-                print("NUM_PREAMBLE = {}".format(bits[1:4]))
-                print("CHANSPC_E = {}".format(bits[6:]))
-
-        return bits
+        # Bits of a configuration or status register as a '0'/'1' string,
+        # its fields are printed with showConfig
+        if register in REGISTER_ADDRESSES:
+            value = self._readRegister(REGISTER_ADDRESSES[register])
+        elif register in STATUS_REGISTER_ADDRESSES:
+            value = self._readSingleByte(STATUS_REGISTER_ADDRESSES[register] | self.READ_BURST)
+        else:
+            raise Exception("Unknown register {}".format(register))
 
-    def setDefaultValues(self, version=1):
+        if showConfig:
+            print(register)
 
-        # Default values extracted from Smart RF Studio 7
-
-        self._writeSingleByte(self.IOCFG2, 0x2E)    # Panstamp
-        self._writeSingleByte(self.IOCFG1, 0x2E)    # Panstamp
-        self._writeSingleByte(self.IOCFG0, 0x06)    # Panstamp
-        self._writeSingleByte(self.FIFOTHR, 0x07)   # Panstamp
-        self._writeSingleByte(self.PKTLEN, 20)
-        self._writeSingleByte(self.PKTCTRL1, 0x06)  # Panstamp
-        self._writeSingleByte(self.PKTCTRL0, 0x04)  # Panstamp
-
-        self.setSyncWord()
-        self.setChannel()
-        self.configureAddressFiltering()
-
-        self._writeSingleByte(self.FSCTRL1, 0x08)   # Panstamp
-        self._writeSingleByte(self.FSCTRL0, 0x00)   # Panstamp
-
-        self.setCarrierFrequency()
-
-        self._writeSingleByte(self.MDMCFG4, 0xCA)   # Panstamp
-        self._writeSingleByte(self.MDMCFG3, 0x83)   # Panstamp
-        self._writeSingleByte(self.MDMCFG2, 0x93)   # Panstamp
-        self._writeSingleByte(self.MDMCFG1, 0x22)
-        self._writeSingleByte(self.MDMCFG0, 0xF8)
-
-        self._writeSingleByte(self.DEVIATN, 0x35)   # Panstamp
-        self._writeSingleByte(self.MCSM2, 0x07)
-        self._writeSingleByte(self.MCSM1, 0x20)     # Panstamp
-        self._writeSingleByte(self.MCSM0, 0x18)
-        self._writeSingleByte(self.FOCCFG, 0x16)
-        self._writeSingleByte(self.BSCFG, 0x6C)
-        self._writeSingleByte(self.AGCCTRL2, 0x43)  # Panstamp
-        self._writeSingleByte(self.AGCCTRL1, 0x40)
-        self._writeSingleByte(self.AGCCTRL0, 0x91)
-        self._writeSingleByte(self.WOREVT1, 0x87)
-        self._writeSingleByte(self.WOREVT0, 0x6B)
-        self._writeSingleByte(self.WORCTRL, 0xFB)
-        self._writeSingleByte(self.FREND1, 0x56)
-        self._writeSingleByte(self.FREND0, 0x10)
-        self._writeSingleByte(self.FSCAL3, 0xE9)
-        self._writeSingleByte(self.FSCAL2, 0x2A)
-        self._writeSingleByte(self.FSCAL1, 0x00)
-        self._writeSingleByte(self.FSCAL0, 0x1F)
-        self._writeSingleByte(self.RCCTRL1, 0x41)
-        self._writeSingleByte(self.RCCTRL0, 0x00)
-        self._writeSingleByte(self.FSTEST, 0x59)
-        self._writeSingleByte(self.PTEST, 0x7F)
-        self._writeSingleByte(self.AGCTEST, 0x3F)
-        self._writeSingleByte(self.TEST2, 0x81)
-        self._writeSingleByte(self.TEST1, 0x35)
-        self._writeSingleByte(self.TEST0, 0x09)
-        self._writeSingleByte(0x3E, 0xC0)           # Power 10dBm
+            for field in REGISTER_FIELDS[register]:
+                print("{} = {}".format(field.name, field.decode(value)))
 
-    def setSyncMode(self, syncmode):
-        regVal = list(self.getRegisterConfiguration("MDMCFG2"))
+        return bin(value)[2:].zfill(8)
 
-        if syncmode > 7:
-            raise Exception("Invalid SYNC mode")
+    def _field(self, name):
+        if name not in FIELDS:
+            raise Exception("Unknown register field {}".format(name))
 
-        regVal[5:] = bin(syncmode)[2:].zfill(3)
+        return FIELDS[name]
 
-        regVal = int("".join(regVal), 2)
-        self._writeSingleByte(self.MDMCFG2, regVal)
+    def getField(self, name):
+        # Decoded value of a configuration register field, see registers.FIELDS
+        field = self._field(name)
+        return field.decode(self._readRegister(field.address))
 
-    def setModulation(self, modulation):
-        regVal = list(self.getRegisterConfiguration("MDMCFG2"))
+    def configure(self):
+        # with radio.configure() as cfg: cfg["MOD_FORMAT"] = "GFSK" ...
+        return RegisterTransaction(self)
 
-        if modulation == "2-FSK":
-            modVal = "000"
+    def _writeFields(self, edits):
+        # edits maps register addresses to (mask, bits). The registers of
+        # which only some bits change are read first, with one burst when
+        # there are several and no shadow copy. Returns the write transfers.
+        partial = [address for address, (mask, bits) in edits.items() if mask != 0xFF]
+        known = [None] * (self.TEST0 + 1)
 
-        elif modulation == "GFSK":
-            modVal = "001"
+        if self._shadow is not None:
+            for address, value in enumerate(self._shadow):
+                if address not in self.SHADOW_VOLATILE:
+                    known[address] = value
 
-        elif modulation == "ASK" or modulation == "OOK":
-            modVal = "011"
+        if self._shadow is None and len(partial) > 1:
+            known = self.snapshot()
 
-        elif modulation == "4-FSK":
-            modVal = "100"
+            # As in attach, the runs must not bridge over the calibration
+            for address in self.SHADOW_VOLATILE:
+                known[address] = None
 
-        elif modulation == "MSK":
-            modVal = "111"
+        for address in partial:
+            if known[address] is None:
+                known[address] = self._readRegister(address)
 
-        else:
-            raise Exception("Modulation type NOT SUPPORTED!")
+        registers = {}
+
+        for address, (mask, bits) in edits.items():
+            base = known[address] if mask != 0xFF else 0x00
+            registers[address] = (base & ~mask & 0xFF) | bits
+
+        return self._writeProfile(ConfigurationProfile(registers), known, None)
+
+    def decodeRegisters(self, status=False):
+        # {register: {field: value}} of every configuration register, read
+        # from the chip in one burst, and of the status registers with status
+        values = dict(zip(REGISTER_NAMES, self.snapshot()))
+
+        if status:
+            for register, address in STATUS_REGISTER_ADDRESSES.items():
+                values[register] = self._readSingleByte(address | self.READ_BURST)
+
+        return dict((register, dict((field.name, field.decode(value)) for field in REGISTER_FIELDS[register]))
+                    for register, value in values.items())
+
+    @timed("setDefaultValues")
+    def setDefaultValues(self, version=1):
+
+        # Default values extracted from Smart RF Studio 7, see profile.py
+
+        return self.applyProfile(PANSTAMP_PROFILE)
+
+    def setSyncMode(self, syncmode):
+        with self.configure() as cfg:
+            cfg["SYNC_MODE"] = syncmode
 
-        regVal[1:4] = modVal
+    def setModulation(self, modulation):
+        # 2-FSK, GFSK, ASK (or OOK), 4-FSK or MSK
+        if modulation in ("ASK", "OOK"):
+            modulation = "ASK/OOK"
 
-        regVal = int("".join(regVal), 2)
-        self._writeSingleByte(self.MDMCFG2, regVal)
+        with self.configure() as cfg:
+            cfg["MOD_FORMAT"] = modulation
 
     def _flushRXFifo(self):
+        self._rxPendingLength = None
         self._strobe(self.SFRX)
         self._usDelay(2)
 
@@ -385,154 +857,314 @@ class TICC1101(object):
         self._strobe(self.SRX)
         self._usDelay(2)
 
+    def _enterOffMode(self, offMode):
+        # The state a packet ends in for MCSM1.RXOFF_MODE / TXOFF_MODE, from
+        # IDLE after an aborted transmission (TX itself is not entered again)
+        if offMode == 1:
+            self._strobe(self.SFSTXON)
+        elif offMode == 3:
+            self._setRXState()
+
     def getRSSI(self):
         return self._readSingleByte(self.RSSI)
 
+    def getRSSIdBm(self):
+        return rssiToDBm(self.getRSSI())
+
+    def sweep(self, channels, dwell_us=None, passes=1):
+        # RSSI survey of channels, see SpectrumSweep for frequency sweeps,
+        # waterfall history and streaming to disk
+        return SpectrumSweep(self, channels, dwell_us=dwell_us).sweep(passes)
+
     def _getMRStateMachineState(self):
         # The &0x1F works as a mask due to the fact
         # that the MARCSTATE register only uses the
         # first 5 bits
-        return (self._readSingleByte(self.MARCSTATE) & 0x1F)
+        marcstate = self._readSingleByte(self.MARCSTATE) & 0x1F
 
-    def getPacketConfigurationMode(self):
-        pktCtrlVal = self.getRegisterConfiguration("PKTCTRL0", False)
+        if self.instrumentation is not None:
+            self.instrumentation.state(marcstate)
 
-        if pktCtrlVal[6:] == "00": # Packet len is fixed
-            return "PKT_LEN_FIXED"
+        return marcstate
 
-        elif pktCtrlVal[6:] == "01": # Packet len is variable
-            return "PKT_LEN_VARIABLE"
+    def getDataRate(self):
+        # TI-CC1101 Datasheet, Section 12 "Data Rate Programming"
+        return solvers.dataRate(self._readRegister(self.MDMCFG4), self._readRegister(self.MDMCFG3), self.FXOSC)
 
-        elif pktCtrlVal[6:] == "10":  # Infinite packet len mode
-            return "PKT_LEN_INFINITE"
+    def _byteTime(self):
+        manchester = 2 if self._readRegister(self.MDMCFG2) & 0x08 else 1
+        return 8.0 * manchester / self.getDataRate()
 
-    def setPacketMode(self, mode="PKT_LEN_VARIABLE"):
-        regVal = list(self.getRegisterConfiguration("PKTCTRL0", False))
+    def airtime(self, fifoBytes):
+        # Seconds on air for a packet of fifoBytes bytes loaded in the TX FIFO
+        # (length and address bytes included): preamble, sync word and CRC
+        # are added from the configuration
+        crc = 2 if self._readRegister(self.PKTCTRL0) & 0x04 else 0
 
-        if mode == "PKT_LEN_FIXED":
-            val = "00"
+        return solvers.airtime(fifoBytes + crc, self._readRegister(self.MDMCFG1),
+                               self._readRegister(self.MDMCFG2), self.getDataRate())
 
-        elif mode == "PKT_LEN_VARIABLE":
-            val = "01"
+    def spiTime(self, byteCount):
+        # Seconds to clock byteCount bytes over SPI
+        speed = getattr(self._spi, "max_speed_hz", 0)
 
-        elif mode == "PKT_LEN_INFINITE":
-            val = "10"
+        return 8.0 * byteCount / speed if speed else 0.0
 
-        else:
-            raise Exception("Packet mode NOT SUPPORTED!")
+    def _txDeadline(self, airtime, start=None):
+        return (time.monotonic() if start is None else start) + 2 * airtime + self.airtimeMargin
+
+    def _waitChipState(self, states, timeout, operation, sleep=0.0, rxFifo=False):
+        # Sleeps for the expected duration, then polls SNOP with a doubling
+        # interval until the chip state is one of states. Past timeout the
+        # radio is recovered and RadioTimeoutError raised.
+        deadline = time.monotonic() + timeout
+
+        if sleep > 0:
+            time.sleep(sleep)
 
-        regVal[6:] = val
-        regVal = int("".join(regVal), 2)
-        self._writeSingleByte(self.PKTCTRL0, regVal)
+        interval = self.POLL_MIN
+
+        while True:
+            status = self._snop(rxFifo)
+
+            if not status & 0x80 and self.chipState(status) in states:
+                return status
+
+            now = time.monotonic()
+
+            if now >= deadline:
+                state = self.chipState()
+                self._recover()
+                raise RadioTimeoutError(operation, state, timeout)
+
+            time.sleep(min(interval, deadline - now))
+            interval = min(2 * interval, self.POLL_MAX)
+
+    def _recover(self):
+        # Best effort, never waits: IDLE and both FIFOs flushed
+        self._strobe(self.SIDLE)
+        self._strobe(self.SFRX)
+        self._strobe(self.SFTX)
+
+    def getPacketConfigurationMode(self):
+        return self.getField("LENGTH_CONFIG")
+
+    def setPacketMode(self, mode="PKT_LEN_VARIABLE"):
+        with self.configure() as cfg:
+            cfg["LENGTH_CONFIG"] = mode
 
     def setFilteringAddress(self, address=0x0E):
         self._writeSingleByte(self.ADDR, address)
 
     def configureAddressFiltering(self, value="DISABLED"):
-        regVal = list(self.getRegisterConfiguration("PKTCTRL1", False))
+        with self.configure() as cfg:
+            cfg["ADR_CHK"] = value
 
-        if value == "DISABLED":
-            val = "00"
+    # MCSM1.CCA_MODE, TI-CC1101 Datasheet Section 15.4 "Clear Channel Assessment"
+    CCA_MODES = FIELDS["CCA_MODE"].values
 
-        elif value == "ENABLED_NO_BROADCAST":
-            val = "01"
+    def setCCAMode(self, mode="UNLESS_RECEIVING"):
+        # With any mode but ALWAYS, STX in RX only enters TX on a clear channel
+        if mode not in self.CCA_MODES:
+            raise Exception("CCA mode NOT SUPPORTED!")
 
-        elif value == "ENABLED_00_BROADCAST":
-            val = "10"
+        with self.configure() as cfg:
+            cfg["CCA_MODE"] = mode
 
-        elif value == "ENABLED_00_255_BROADCAST":
-            val = "11"
+    def setCarrierSenseThreshold(self, absolute=0, relative=None):
+        # AGCCTRL1 carrier sense thresholds. absolute is in dB from the
+        # AGCCTRL2.MAGN_TARGET level (-7 to 7, None disables it), relative is
+        # the RSSI increase in dB that asserts carrier sense (6, 10, 14 or None)
+        if absolute is not None and not -7 <= absolute <= 7:
+            raise Exception("Absolute carrier sense threshold out of range")
 
-        else:
-            raise Exception("Address filtering configuration NOT SUPPORTED!")
+        if relative not in (None, 6, 10, 14):
+            raise Exception("Relative carrier sense threshold NOT SUPPORTED!")
 
-        regVal[6:] = val
+        with self.configure() as cfg:
+            cfg["CARRIER_SENSE_ABS_THR"] = 0x08 if absolute is None else absolute & 0x0F
+            cfg["CARRIER_SENSE_REL_THR"] = (None, 6, 10, 14).index(relative)
 
-        regVal = int("".join(regVal), 2)
-        self._writeSingleByte(self.PKTCTRL1, regVal)
+    def carrierSense(self):
+        # PKTSTATUS.CS, meaningful in RX once the RSSI has settled
+        return bool(self._readSingleByte(self.PKTSTATUS) & 0x40)
 
-    def sendData(self, dataBytes):
-        self._setRXState()
-        marcstate = self._getMRStateMachineState()
-        dataToSend = []
+    def _packetConfig(self, address=None):
+        # (packet mode, PKTLEN, address byte or None when filtering is disabled)
+        # The address byte is the ADDR register unless address is given
+        sending_mode = self.getPacketConfigurationMode()
+        pkt_len = self._readRegister(self.PKTLEN)
 
-        while ((marcstate & 0x1F) != 0x0D):
-            if self.debug:
-                print("marcstate = %x".format(marcstate))
-                print("waiting for marcstate == 0x0D")
+        if self.getField("ADR_CHK") == "DISABLED":
+            address = None
+        elif address is None:
+            address = self._readRegister(self.ADDR)
 
-            if marcstate == 0x11:
-                self._flushRXFifo()
+        return sending_mode, pkt_len, address
 
-            marcstate = self._getMRStateMachineState()
+    def _buildPacket(self, dataBytes, config=None, reuse=False):
+        # Returns the bytes to load in the TX FIFO for the configured packet
+        # mode or False if the data does not fit. The packet is a new
+        # bytearray, or with reuse a view of the radio's packet buffer that
+        # is only valid until the next call.
 
         if len(dataBytes) == 0:
             if self.debug:
                 print("sendData | No data to send")
             return False
 
-        sending_mode = self.getPacketConfigurationMode()
+        sending_mode, pkt_len, address = config if config is not None else self._packetConfig()
         data_len = len(dataBytes)
+        header = 0 if address is None else 1
 
         if sending_mode == "PKT_LEN_FIXED":
-            if data_len > self._readSingleByte(self.PKTLEN):
+            if data_len > pkt_len:
                 if self.debug:
                     print("Len of data exceeds the configured packet len")
                 return False
 
-            if self.getRegisterConfiguration("PKTCTRL1", False)[6:] != "00":
-                dataToSend.append(self._readSingleByte(self.ADDR))
-
-            dataToSend.extend(dataBytes)
-            dataToSend.extend([0] * (self._readSingleByte(self.PKTLEN) - len(dataToSend)))
+            size = max(pkt_len, header + data_len)
 
             if self.debug:
                 print("Sending a fixed len packet")
-                print("data len = %d".format((data_len)))
+                print("data len = {}".format(data_len))
 
         elif sending_mode == "PKT_LEN_VARIABLE":
-            dataToSend.append(data_len)
-
-            if self.getRegisterConfiguration("PKTCTRL1", False)[6:] != "00":
-                dataToSend.append(self._readSingleByte(self.ADDR))
-                dataToSend[0] += 1
-
-            dataToSend.extend(dataBytes)
+            header += 1
+            size = header + data_len
 
             if self.debug:
                 print("Sending a variable len packet")
-                print("Length of the packet is: %d".format(data_len))
+                print("Length of the packet is: {}".format(data_len))
 
-        elif sending_mode == "PKT_LEN_INFINITE":
+        else:
             # ToDo
             raise Exception("MODE NOT IMPLEMENTED")
 
-        print("{}".format(dataToSend))
-        self._writeBurst(self.TXFIFO, dataToSend)
-        self._usDelay(2000)
+        reuse = reuse and size <= len(self._packetBuffer)
+        packet = self._packetBuffer if reuse else bytearray(size)
+
+        if sending_mode == "PKT_LEN_VARIABLE":
+            packet[0] = size - 1
+
+        if address is not None:
+            packet[header - 1] = address
+
+        packet[header:header + data_len] = dataBytes
+
+        if reuse:
+            packet[header + data_len:size] = ZEROS[:size - header - data_len]
+            packet = self._packetViews[size]
+
+        if self.debug:
+            print("{}".format(list(packet)))
+
+        return packet
+
+    @timed("sendData")
+    def sendData(self, dataBytes, address=None):
+        # address is the destination address byte, ADDR by default
+        return self._runSteps(self._sendSteps(dataBytes, address))
+
+    def _runSteps(self, steps):
+        # Drives a step generator: sleeps for every delay (in seconds) it
+        # yields and returns its result
+        while True:
+            try:
+                delay = next(steps)
+            except StopIteration as done:
+                return done.value
+
+            time.sleep(delay)
+
+    def _sendSteps(self, dataBytes, address=None):
+        # sendData as a generator yielding the waits between its SPI accesses,
+        # so that AsyncTICC1101.send runs the same steps with asyncio.sleep.
+        # Driven by the chip status byte of every transfer: the TX FIFO is
+        # loaded in the same transfer as the SRX strobe and the waits poll
+        # with single byte SNOP transfers instead of MARCSTATE/TXBYTES reads.
+        # The end of the packet is awaited by sleeping for most of its
+        # airtime, every wait raises RadioTimeoutError past its deadline.
+        phase = self._lap(None, None)
+        dataToSend = self._buildPacket(dataBytes, self._packetConfig(address), reuse=True)
+
+        if not dataToSend:
+            self._setRXState()
+            return False
+
+        self._writeBurst(self.TXFIFO, dataToSend, before=self.SRX)
+        phase = self._lap("sendData.fifoLoad", phase)
+
+        while self.chipState() != self.STATE_RX:
+            if self.debug:
+                print("chip state = {}".format(self.chipState()))
+                print("waiting for chip state == RX")
+
+            if self.chipState() == self.STATE_RXFIFO_OVERFLOW:
+                self._flushRXFifo()
+                self._setRXState()
+            else:
+                self._waitChipState((self.STATE_RX, self.STATE_RXFIFO_OVERFLOW), self.stateTimeout,
+                                    "sendData")
+
+        phase = self._lap("sendData.rxWait", phase)
+        mcsm1 = self._readRegister(self.MCSM1)
+
+        if mcsm1 & 0x30:
+            # Clear channel assessment needs a valid RSSI, RX was just entered
+            yield self._rssiSettlingTime()
+
         self._setTXState()
-        marcstate = self._getMRStateMachineState()
+        txStart = time.monotonic()
+
+        if self.chipState() == self.STATE_RX:
+            # STX may not have been executed yet when the SNOP was clocked in
+            self._snop()
 
-        if marcstate not in [0x13, 0x14, 0x15]:  # RX, RX_END, RX_RST
+        phase = self._lap("sendData.turnaround", phase)
+
+        if self.chipState() not in (self.STATE_TX, self.STATE_SETTLING):  # TX, TX_END, RXTX_SWITCH
             self.sidle()
             self._flushTXFifo()
             self._setRXState()
 
             if self.debug:
-                print("senData | FAIL")
-                print("sendData | MARCSTATE: %x".format(self._readSingleByte(self.MARCSTATE)))
+                print("sendData | FAIL")
+                print("sendData | MARCSTATE: {:x}".format(self._readSingleByte(self.MARCSTATE)))
 
             return False
 
-        remaining_bytes = self._readSingleByte(self.TXBYTES) & 0x7F
-        while remaining_bytes != 0:
-            self._usDelay(1000)
-            remaining_bytes = self._readSingleByte(self.TXBYTES) & 0x7F
-            if self.debug:
-                print("Waiting until all bytes are transmited, remaining bytes: %d".format(remaining_bytes))
+        # The packet configuration is read while the preamble is on air
+        airtime = self.airtime(len(dataToSend))
+        deadline = self._txDeadline(airtime, txStart)
+        expected = txStart + 0.9 * airtime - time.monotonic()
 
+        if (mcsm1 & 0x03) == 0x02:
+            # TXOFF_MODE = TX, the radio stays in TX once the FIFO is empty
+            yield max(expected, 0)
+            interval = self.POLL_MIN
+            remaining_bytes = self._readFifoBytes(self.TXBYTES) & 0x7F
 
-        if (self._readSingleByte(self.TXBYTES) & 0x7F) == 0:
+            while remaining_bytes != 0:
+                if time.monotonic() > deadline:
+                    state = self.chipState()
+                    self._recover()
+                    raise RadioTimeoutError("sendData", state, 2 * airtime + self.airtimeMargin)
+
+                yield interval
+                interval = min(2 * interval, self.POLL_MAX)
+                remaining_bytes = self._readFifoBytes(self.TXBYTES) & 0x7F
+
+                if self.debug:
+                    print("Waiting until all bytes are transmited, remaining bytes: {}".format(remaining_bytes))
+
+        else:
+            yield max(expected, 0)
+            self._waitChipState(self.TX_END_STATES, deadline - time.monotonic(), "sendData")
+
+        phase = self._lap("sendData.txDrain", phase)
+
+        if self.chipState() != self.STATE_TXFIFO_UNDERFLOW:
             if self.debug:
                 print("Packet sent!")
 
@@ -541,60 +1173,509 @@ class TICC1101(object):
         else:
             if self.debug:
                 print("{}".format(self._readSingleByte(self.TXBYTES) & 0x7F))
-                print("sendData | MARCSTATE: %x".format(self._getMRStateMachineState()))
-                self.sidle()
-                self._flushTXFifo()
-                time.sleep(5)
-                self._setRXState()
+                print("sendData | MARCSTATE: {:x}".format(self._getMRStateMachineState()))
+
+            self.sidle()
+            self._flushTXFifo()
+            self._setRXState()
 
             return False
 
+    @timed("recvData")
     def recvData(self):
-        rx_bytes_val = self._readSingleByte(self.RXBYTES)
+        # Returns the packet once all of it (status bytes included) is in the
+        # RX FIFO, None while it is still arriving: reading ahead of the
+        # demodulator would underflow the FIFO. The length byte of a variable
+        # length packet is kept until the rest has arrived, as in
+        # BackgroundReceiver._drain.
+
+        # A single byte SNOP with the read bit returns the RX FIFO bytes
+        status = self._snop(rxFifo=True)
+        available = self.fifoBytesAvailable(status)
+
+        if self.chipState(status) == self.STATE_RXFIFO_OVERFLOW:
+            # The FIFO content is lost, SFRX is allowed in this state
+            self._flushRXFifo()
+            self._setRXState()
+            return None
 
-        #if rx_bytes_val has something and Underflow bit is not 1
-        if (rx_bytes_val & 0x7F and not (rx_bytes_val & 0x80)):
-            sending_mode = self.getPacketConfigurationMode()
+        if not available:
+            return None
 
-            if sending_mode == "PKT_LEN_FIXED":
-                data_len = self._readSingleByte(self.PKTLEN)
+        sending_mode = self.getPacketConfigurationMode()
 
-            elif sending_mode == "PKT_LEN_VARIABLE":
-                max_len = self._readSingleByte(self.PKTLEN)
+        if sending_mode == "PKT_LEN_FIXED":
+            data_len = self._readRegister(self.PKTLEN)
+
+        elif sending_mode == "PKT_LEN_VARIABLE":
+            if self._rxPendingLength is None:
+                # A packet failing the address check is discarded by the
+                # chip, its length byte must still be in the FIFO then
+                if available < 2 and self._rxPacketLayout()[1]:
+                    return None
+
+                max_len = self._readRegister(self.PKTLEN)
                 data_len = self._readSingleByte(self.RXFIFO)
+                available -= 1
 
                 if data_len > max_len:
                     if self.debug:
                         print("Len of data exceeds the configured maximum packet len")
-                    return False
+
+                    self.sidle()
+                    self._flushRXFifo()
+                    self._setRXState()
+                    return None
 
                 if self.debug:
                     print("Receiving a variable len packet")
-                    print("max len: %d".format(max_len))
-                    print("Packet length: %d".format(data_len))
+                    print("max len: {}".format(max_len))
+                    print("Packet length: {}".format(data_len))
+
+                self._rxPendingLength = data_len
+
+            data_len = self._rxPendingLength
 
-            elif sending_mode == "PKT_LEN_INFINITE":
-                # ToDo
-                raise Exception("MODE NOT IMPLEMENTED")
+        else:
+            # ToDo
+            raise Exception("MODE NOT IMPLEMENTED")
 
-            data = self._readBurst(self.RXFIFO, data_len)
-            valPktCtrl1 = self.getRegisterConfiguration("PKTCTRL1", False)
+        status_len, addressed = self._rxPacketLayout()
 
-            if valPktCtrl1[5] == "1":  # PKTCTRL1[5] == APPEND_STATUS
-            # When enabled, two status bytes will be appended to the payload of the
-            # packet. The status bytes contain RSSI and LQI values, as well as CRC OK.
+        if available < data_len + status_len:
+            # The count of the status byte saturates at 15
+            if self.fifoBytesAvailable(status) == 15:
+                available = self._readFifoBytes(self.RXBYTES) & 0x7F
 
-                rssi = self._readSingleByte(self.RXFIFO)
-                val = self._readSingleByte(self.RXFIFO)
-                lqi = val & 0x7f
+            if available < data_len + status_len:
+                if self.chipState(status) == self.STATE_IDLE:
+                    # RXOFF_MODE = IDLE, RX ends with the packet unless it
+                    # was aborted, then the rest will never come
+                    self._flushRXFifo()
 
-            if self.debug and valPktCtrl1[5] == "1":
-                print("Packet information is enabled")
-                print("RSSI: %d".format((rssi)))
-                print("VAL: %d".format((val)))
-                print("LQI: %d".format((lqi)))
+                return None
 
-            print("Data: ") + str(data)
+        data = self._readBurst(self.RXFIFO, data_len + status_len)
+        self._rxPendingLength = None
+        packet = Packet.fromFifo(data, status_len, addressed, self._readRegister(self.CHANNR), time.monotonic())
+
+        if self.debug and status_len:
+            print("Packet information is enabled")
+            print("RSSI: {} dBm".format(packet.rssi))
+            print("LQI: {}".format(packet.lqi))
+            print("CRC_OK: {}".format(packet.crcOk))
+
+        if self.debug:
+            print("Data: {}".format(list(packet.payload)))
+
+        # SFRX is only allowed in IDLE (or RXFIFO_OVERFLOW), in RX the FIFO
+        # is already empty
+        if self.chipState() != self.STATE_RX:
+            if self.chipState() not in (self.STATE_IDLE, self.STATE_RXFIFO_OVERFLOW):
+                self.sidle()
 
             self._flushRXFifo()
-            return data
+
+        return packet
+
+    def _rxPacketLayout(self):
+        # (status bytes after the payload, address byte before it)
+        pktctrl1 = self._readRegister(self.PKTCTRL1)
+
+        # PKTCTRL1.APPEND_STATUS
+        # When enabled, two status bytes will be appended to the payload of the
+        # packet. The status bytes contain RSSI and LQI values, as well as CRC OK.
+
+        statusLength = 2 if FIELDS["APPEND_STATUS"].decode(pktctrl1) else 0
+
+        return statusLength, FIELDS["ADR_CHK"].decode(pktctrl1) != "DISABLED"
+
+    @timed("waitForPacket")
+    def waitForPacket(self, timeout=None):
+        # Sleeps on the GDO0 edge event source (gpio.GPIOLineEvent or a
+        # stand-in) instead of polling RXBYTES. With IOCFG0 = 0x06 GDO0
+        # de-asserts at the end of the packet, the falling edge wakes us up.
+
+        if self.gdo0 is None:
+            raise Exception("No GDO0 event source configured")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._setRXState()
+
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            event = self.gdo0.wait(remaining)
+
+            if event is None:
+                return None
+
+            timestamp, rising = event
+
+            if rising:
+                continue
+
+            data = self.recvData()
+
+            if data:
+                return data
+
+            # Edge from our own TX or a filtered packet, keep waiting
+            self._setRXState()
+
+    def start_receiver(self, capacity=64, pollInterval=0.0005):
+        # Packets are drained by a background thread into a bounded ring,
+        # read them with get() or iter_packets()
+        if self.receiver is None:
+            self.receiver = BackgroundReceiver(self, capacity, pollInterval)
+            self.receiver.start()
+
+        return self.receiver
+
+    def stop_receiver(self):
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver = None
+
+    def get(self, timeout=None):
+        if self.receiver is None:
+            raise Exception("Receiver not started")
+
+        return self.receiver.ring.get(timeout)
+
+    def get_array(self, maxCount=None, timeout=None, maxPayload=64):
+        # Drains the ring into a NumPy structured array (packet.packetDtype)
+        if self.receiver is None:
+            raise Exception("Receiver not started")
+
+        return self.receiver.ring.getArray(maxCount, timeout, maxPayload)
+
+    def iter_packets(self, timeout=None):
+        while self.receiver is not None:
+            data = self.get(timeout)
+
+            if data is None:
+                return
+
+            yield data
+
+    def _streamChunks(self, data, length):
+        if isinstance(data, (bytes, bytearray, memoryview, list, tuple)):
+            data = bytes(data)
+            return [data], len(data) if length is None else length
+
+        if length is None:
+            data = [bytes(chunk) for chunk in data]
+            length = sum(len(chunk) for chunk in data)
+
+        return data, length
+
+    def _streamLengthConfig(self, length):
+        # Packets shorter than 256 bytes use fixed length mode from the start,
+        # longer ones start in infinite mode and are switched to fixed mode
+        # once less than 256 bytes remain (Datasheet, Section 15.4)
+        pktCtrl0 = self._readRegister(self.PKTCTRL0) & 0xFC
+
+        self._writeSingleByte(self.PKTLEN, length % 256)
+
+        if length < 256:
+            self._writeSingleByte(self.PKTCTRL0, pktCtrl0)
+            return pktCtrl0, True
+
+        self._writeSingleByte(self.PKTCTRL0, pktCtrl0 | 0x02)
+        return pktCtrl0, False
+
+    @timed("send_stream")
+    def send_stream(self, data, length=None):
+        # Sends data (bytes, or an iterable of byte chunks) as one packet of
+        # any length, refilling the TX FIFO whenever it drains below the
+        # FIFOTHR threshold. The data is sent as is, no length or address byte
+        # is added. length is needed when chunks come from a generator.
+
+        chunks, length = self._streamChunks(data, length)
+
+        if length == 0:
+            return False
+
+        savedPktCtrl0 = self._readRegister(self.PKTCTRL0)
+        savedPktLen = self._readRegister(self.PKTLEN)
+        threshold = 61 - 4 * (self._readRegister(self.FIFOTHR) & 0x0F)
+        byteTime = self._byteTime()
+        source = iter(chunks)
+        pending = bytearray()
+        written = 0
+
+        def fill(space):
+            while len(pending) < space:
+                chunk = next(source, None)
+
+                if chunk is None:
+                    break
+
+                pending.extend(chunk)
+
+            count = min(space, len(pending), length - written)
+
+            if count:
+                with memoryview(pending) as view:
+                    self._writeBurst(self.TXFIFO, view[:count], status=False)
+
+                del pending[:count]
+
+            return count
+
+        start = time.monotonic()
+
+        try:
+            self.sidle()
+            fixed, switched = self._streamLengthConfig(length)
+
+            written += fill(self.FIFO_SIZE)
+            self._setTXState()
+            deadline = self._txDeadline(self.airtime(length))
+
+            while True:
+                if time.monotonic() > deadline:
+                    state = self.chipState()
+                    self._recover()
+                    raise RadioTimeoutError("send_stream", state, deadline - start)
+
+                tx_bytes = self._readFifoBytes(self.TXBYTES)
+
+                if tx_bytes & 0x80:
+                    if self.debug:
+                        print("send_stream | TX FIFO underflow after {} bytes".format(written - (tx_bytes & 0x7F)))
+
+                    self.sidle()
+                    self._flushTXFifo()
+                    return False
+
+                in_fifo = tx_bytes & 0x7F
+
+                if not switched and written - in_fifo > length - 256:
+                    self._writeSingleByte(self.PKTCTRL0, fixed)
+                    switched = True
+
+                if written < length and in_fifo <= threshold:
+                    added = fill(self.FIFO_SIZE - in_fifo)
+
+                    if not added:
+                        raise Exception("Stream ended after {} of {} bytes".format(written, length))
+
+                    written += added
+                    continue
+
+                if written == length and in_fifo == 0:
+                    break
+
+                self._usDelay(max(100, (in_fifo - threshold if written < length else in_fifo) * byteTime * 1000000))
+
+            # The CRC is still on air once the FIFO is empty
+            self._waitChipState(self.TX_END_STATES, 4 * byteTime + self.airtimeMargin, "send_stream",
+                                sleep=2 * byteTime)
+
+            return True
+
+        finally:
+            self._writeSingleByte(self.PKTLEN, savedPktLen)
+            self._writeSingleByte(self.PKTCTRL0, savedPktCtrl0)
+
+    def recv_stream(self, length=None, timeout=1.0):
+        # Generator yielding the bytes of one packet of any length as they
+        # are drained from the RX FIFO. Without length the radio stays in
+        # infinite mode until nothing arrives for timeout seconds.
+
+        savedPktCtrl0 = self._readRegister(self.PKTCTRL0)
+        savedPktLen = self._readRegister(self.PKTLEN)
+        threshold = 4 * ((self._readRegister(self.FIFOTHR) & 0x0F) + 1)
+        byteTime = self._byteTime()
+        received = 0
+
+        try:
+            self.sidle()
+            self._flushRXFifo()
+
+            if length is None:
+                fixed, switched = self._readRegister(self.PKTCTRL0) & 0xFC, True
+                self._writeSingleByte(self.PKTCTRL0, fixed | 0x02)
+            else:
+                fixed, switched = self._streamLengthConfig(length)
+
+            self._setRXState()
+            last_data = time.monotonic()
+
+            while length is None or received < length:
+                rx_bytes = self._readFifoBytes(self.RXBYTES)
+
+                if rx_bytes & 0x80:
+                    raise Exception("RX FIFO overflow after {} bytes".format(received))
+
+                available = rx_bytes & 0x7F
+
+                if not switched and received + available > length - 256:
+                    self._writeSingleByte(self.PKTCTRL0, fixed)
+                    switched = True
+
+                remaining = None if length is None else length - received
+                idle = time.monotonic() - last_data > timeout
+
+                if remaining is not None and available >= remaining:
+                    count = remaining
+                elif available >= threshold:
+                    # The last byte is left in the FIFO while receiving (errata)
+                    count = available - 1
+                elif idle and available and length is None:
+                    count = available
+                else:
+                    count = 0
+
+                if count:
+                    chunk = self._readBurst(self.RXFIFO, count)
+                    received += count
+                    last_data = time.monotonic()
+                    yield bytes(chunk)
+                    continue
+
+                if idle:
+                    break
+
+                self._usDelay(max(100, (threshold - available) * byteTime * 1000000))
+
+        finally:
+            self.sidle()
+            self._flushRXFifo()
+            self._writeSingleByte(self.PKTLEN, savedPktLen)
+            self._writeSingleByte(self.PKTCTRL0, savedPktCtrl0)
+
+    @timed("sendMany")
+    def sendMany(self, packets, address=None):
+        # Sends the packets back to back: the packet configuration is read
+        # once, MCSM1.TXOFF_MODE = TX keeps the radio transmitting between
+        # packets and the TX FIFO is refilled while the previous packet is on
+        # air. Returns the per packet result and the aggregate throughput.
+        # address is the destination address byte, ADDR by default.
+
+        packets = list(packets)
+        config = self._packetConfig(address)
+        frames = [self._buildPacket(data, config) for data in packets]
+        results = [False] * len(frames)
+        queued = [index for index, frame in enumerate(frames) if frame]
+
+        stream = bytearray()
+        ends = []
+
+        for index in queued:
+            stream.extend(frames[index])
+            ends.append(len(stream))
+
+        view = memoryview(stream)
+
+        stats = {"results": results, "packets": 0, "bytes": 0, "seconds": 0.0,
+                 "packetsPerSecond": 0.0, "bytesPerSecond": 0.0}
+
+        if not queued:
+            return stats
+
+        savedMCSM1 = self._readRegister(self.MCSM1)
+        lastStart = ends[-2] if len(ends) > 1 else 0
+        threshold = 61 - 4 * (self._readRegister(self.FIFOTHR) & 0x0F)
+        byteTime = self._byteTime()
+        # TXOFF_MODE has to be restored while the last packet is on air,
+        # from its first byte leaving the FIFO to the end of its CRC
+        lastWindow = (len(stream) - lastStart + 2) * byteTime
+        written = 0
+        done = 0
+        restored = False
+
+        start = time.monotonic()
+
+        try:
+            self.sidle()
+            self._writeSingleByte(self.MCSM1, (savedMCSM1 & 0xFC) | 0x02)
+
+            written = min(self.FIFO_SIZE, len(stream))
+            self._writeBurst(self.TXFIFO, view[:written], status=False)
+            self._setTXState()
+
+            # Every packet has its own preamble, sync word and CRC
+            airtime = len(ends) * self.airtime(0) + len(stream) * byteTime
+            deadline = self._txDeadline(airtime)
+
+            while True:
+                if time.monotonic() > deadline:
+                    state = self.chipState()
+                    self._recover()
+                    raise RadioTimeoutError("sendMany", state, deadline - start)
+
+                tx_bytes = self._readFifoBytes(self.TXBYTES)
+
+                if tx_bytes & 0x80:
+                    if self.debug:
+                        print("sendMany | TX FIFO underflow")
+
+                    break
+
+                in_fifo = tx_bytes & 0x7F
+                sent = written - in_fifo
+
+                while done < len(ends) and sent >= ends[done]:
+                    results[queued[done]] = True
+                    done += 1
+
+                # Once the last packet is on air let the radio leave TX after it
+                if not restored and sent > lastStart:
+                    self._writeSingleByte(self.MCSM1, savedMCSM1)
+                    restored = True
+
+                if done == len(ends):
+                    break
+
+                remaining = len(stream) - written
+
+                if remaining and (in_fifo <= threshold or self.FIFO_SIZE - in_fifo >= remaining):
+                    count = min(self.FIFO_SIZE - in_fifo, remaining)
+                    self._writeBurst(self.TXFIFO, view[written:written + count], status=False)
+                    written += count
+                    continue
+
+                delay = min(in_fifo, self.FIFO_SIZE - threshold) * byteTime / 2
+
+                if not restored and written == len(stream):
+                    # Several polls within the last packet
+                    delay = min(delay, lastWindow / 4)
+
+                self._usDelay(max(100, delay * 1000000))
+
+            # The radio may already have started another preamble when
+            # TXOFF_MODE was restored, it would then stay in TX for ever
+            deadline = time.monotonic() + (len(stream) - lastStart + 32) * byteTime
+
+            while restored and done == len(ends) and self.chipState(self._snop()) == self.STATE_TX:
+                if time.monotonic() > deadline:
+                    self.sidle()
+                    self._flushTXFifo()
+                    self._enterOffMode(savedMCSM1 & 0x03)
+                    break
+
+                self._usDelay(max(100, 2 * byteTime * 1000000))
+
+        finally:
+            if not restored:
+                self._writeSingleByte(self.MCSM1, savedMCSM1)
+
+            # Failed, or the last packet ended before TXOFF_MODE was restored
+            # and the radio is still sending preamble
+            if done < len(ends) or not restored:
+                self.sidle()
+                self._flushTXFifo()
+                self._enterOffMode(savedMCSM1 & 0x03)
+
+        elapsed = time.monotonic() - start
+        stats["packets"] = done
+        stats["bytes"] = sum(len(packets[queued[index]]) for index in range(done))
+        stats["seconds"] = elapsed
+
+        if elapsed > 0:
+            stats["packetsPerSecond"] = done / elapsed
+            stats["bytesPerSecond"] = stats["bytes"] / elapsed
+
+        return stats
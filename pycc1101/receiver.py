@@ -0,0 +1,240 @@
+import threading
+import time
+
+from .packet import Packet, decodeStatus, fillRow, packetDtype, numpy
+
+
+class PacketRing(object):
+    # Bounded ring of preallocated packet buffers. When the consumer falls
+    # behind the oldest packet is overwritten and counted as an overrun.
+    # Slots keep the raw FIFO bytes, Packet objects (or NumPy rows) are only
+    # built when the consumer takes them.
+
+    def __init__(self, capacity=64, slotSize=256):
+        self.capacity = capacity
+        self.overruns = 0
+        self.delivered = 0
+        self.closed = False
+        self._slots = [bytearray(slotSize) for _ in range(capacity)]
+        self._lengths = [0] * capacity
+        self._meta = [None] * capacity
+        self._head = 0
+        self._count = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._count
+
+    def put(self, data, statusLength=0, addressed=False, channel=None, timestamp=None):
+        with self._cond:
+            if self._count == self.capacity:
+                self._head = (self._head + 1) % self.capacity
+                self._count -= 1
+                self.overruns += 1
+
+            index = (self._head + self._count) % self.capacity
+            self._slots[index][:len(data)] = bytes(data)
+            self._lengths[index] = len(data)
+            self._meta[index] = (statusLength, addressed, channel, timestamp)
+            self._count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._count or self.closed, timeout) or not self._count:
+                return None
+
+            index = self._head
+            statusLength, addressed, channel, timestamp = self._meta[index]
+            packet = Packet.fromFifo(memoryview(self._slots[index])[:self._lengths[index]],
+                                     statusLength, addressed, channel, timestamp)
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+            self.delivered += 1
+
+            return packet
+
+    def getArray(self, maxCount=None, timeout=None, maxPayload=64):
+        # Takes up to maxCount packets (all if None) as one structured array
+        if numpy is None:
+            raise Exception("NumPy is required for structured packet arrays")
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._count or self.closed, timeout)
+
+            count = self._count if maxCount is None else min(maxCount, self._count)
+            array = numpy.zeros(count, dtype=packetDtype(maxPayload))
+
+            for row in range(count):
+                index = (self._head + row) % self.capacity
+                statusLength, addressed, channel, timestamp = self._meta[index]
+                data = memoryview(self._slots[index])[:self._lengths[index]]
+                end = len(data) - statusLength
+                start = 1 if addressed and end else 0
+                rssi = lqi = crcOk = None
+
+                if statusLength:
+                    rssi, lqi, crcOk = decodeStatus(data[end], data[end + 1])
+
+                fillRow(array, row, data[start:end], rssi, lqi, crcOk,
+                        data[0] if start else None, channel, timestamp)
+
+            self._head = (self._head + count) % self.capacity
+            self._count -= count
+            self.delivered += count
+
+            return array
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class BackgroundReceiver(object):
+    # Drains the RX FIFO of a TICC1101 from a dedicated thread. The radio is
+    # switched to MCSM1.RXOFF_MODE = RX while running so the chip re-arms RX
+    # by itself after every packet, independently of the consumer.
+    # With a sink, sink(packet) is called instead of filling the ring, and a
+    # lock serialises every drain with other users of the radio.
+
+    def __init__(self, radio, capacity=64, pollInterval=0.0005, sink=None, lock=None):
+        self.radio = radio
+        self.ring = PacketRing(capacity)
+        self.pollInterval = pollInterval
+        self.sink = sink
+        self.lock = lock
+        self.packetsReceived = 0
+        self.fifoOverflows = 0
+        self.lengthErrors = 0
+        self._pendingLength = None
+        self._savedMCSM1 = None
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def ringOverruns(self):
+        return self.ring.overruns
+
+    @property
+    def packetsDelivered(self):
+        return self.ring.delivered
+
+    def start(self):
+        radio = self.radio
+
+        self._savedMCSM1 = radio._readRegister(radio.MCSM1)
+        radio._writeSingleByte(radio.MCSM1, self._savedMCSM1 | 0x0C)
+        radio._setRXState()
+
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="pycc1101-receiver")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._savedMCSM1 is not None:
+            self.radio._writeSingleByte(self.radio.MCSM1, self._savedMCSM1)
+            self._savedMCSM1 = None
+
+        self.ring.close()
+
+    def _run(self):
+        gdo0 = self.radio.gdo0
+
+        while self._running.is_set():
+            if self.lock is not None:
+                with self.lock:
+                    drained = self._drain()
+            else:
+                drained = self._drain()
+
+            if drained:
+                continue
+
+            if gdo0 is not None:
+                gdo0.wait(0.05)
+            elif self.pollInterval:
+                time.sleep(self.pollInterval)
+
+    def _recoverOverflow(self):
+        radio = self.radio
+
+        self.fifoOverflows += 1
+        self._pendingLength = None
+        radio._flushRXFifo()
+        radio._setRXState()
+
+    def _discardLength(self):
+        # A length byte above PKTLEN cannot be framed: the chip is still in
+        # RX, it is flushed from IDLE and RX entered again
+        radio = self.radio
+
+        self.lengthErrors += 1
+        self._pendingLength = None
+        radio.sidle()
+        radio._flushRXFifo()
+        radio._setRXState()
+
+    def _drain(self):
+        radio = self.radio
+        rxBytes = radio._readFifoBytes(radio.RXBYTES)
+
+        if rxBytes & 0x80:
+            self._recoverOverflow()
+            return False
+
+        available = rxBytes & 0x7F
+
+        if not available:
+            return False
+
+        mode = radio.getPacketConfigurationMode()
+        statusLength, addressed = radio._rxPacketLayout()
+
+        if mode == "PKT_LEN_FIXED":
+            length = radio._readRegister(radio.PKTLEN)
+
+        elif mode == "PKT_LEN_VARIABLE":
+            if self._pendingLength is None:
+                # A packet failing the address check is discarded by the
+                # chip, its length byte must still be in the FIFO then
+                if addressed and available < 2:
+                    return False
+
+                length = radio._readSingleByte(radio.RXFIFO)
+                available -= 1
+
+                if length > radio._readRegister(radio.PKTLEN):
+                    self._discardLength()
+                    return False
+
+                self._pendingLength = length
+
+            length = self._pendingLength
+
+        else:
+            raise Exception("MODE NOT IMPLEMENTED")
+
+        # Wait until the whole packet is in the FIFO, reading ahead of the
+        # demodulator would underflow it
+        if available < length + statusLength:
+            return False
+
+        data = radio._readBurst(radio.RXFIFO, length + statusLength)
+        timestamp = time.monotonic()
+        self._pendingLength = None
+        self.packetsReceived += 1
+
+        if self.sink is not None:
+            self.sink(Packet.fromFifo(data, statusLength, addressed, radio._readRegister(radio.CHANNR), timestamp))
+        else:
+            self.ring.put(data, statusLength, addressed, radio._readRegister(radio.CHANNR), timestamp)
+
+        return True
@@ -0,0 +1,189 @@
+# Configuration register names indexed by address (0x00 - 0x2E)
+# TI-CC1101 Datasheet, Section 29 "Configuration Registers"
+
+REGISTER_NAMES = (
+    "IOCFG2", "IOCFG1", "IOCFG0", "FIFOTHR", "SYNC1", "SYNC0", "PKTLEN",
+    "PKTCTRL1", "PKTCTRL0", "ADDR", "CHANNR", "FSCTRL1", "FSCTRL0", "FREQ2",
+    "FREQ1", "FREQ0", "MDMCFG4", "MDMCFG3", "MDMCFG2", "MDMCFG1", "MDMCFG0",
+    "DEVIATN", "MCSM2", "MCSM1", "MCSM0", "FOCCFG", "BSCFG", "AGCCTRL2",
+    "AGCCTRL1", "AGCCTRL0", "WOREVT1", "WOREVT0", "WORCTRL", "FREND1",
+    "FREND0", "FSCAL3", "FSCAL2", "FSCAL1", "FSCAL0", "RCCTRL1", "RCCTRL0",
+    "FSTEST", "PTEST", "AGCTEST", "TEST2", "TEST1", "TEST0",
+)
+
+REGISTER_ADDRESSES = dict((name, address) for address, name in enumerate(REGISTER_NAMES))
+
+PATABLE_ADDRESS = 0x3E
+PATABLE_SIZE = 8
+
+# Values after reset, TI-CC1101 Datasheet, Table 43
+
+RESET_VALUES = (
+    0x29, 0x2E, 0x3F, 0x07, 0xD3, 0x91, 0xFF, 0x04, 0x45, 0x00, 0x00, 0x0F,
+    0x00, 0x1E, 0xC4, 0xEC, 0x8C, 0x22, 0x02, 0x22, 0xF8, 0x47, 0x07, 0x30,
+    0x04, 0x36, 0x6C, 0x03, 0x40, 0x91, 0x87, 0x6B, 0xF8, 0x56, 0x10, 0xA9,
+    0x0A, 0x20, 0x0D, 0x41, 0x00, 0x59, 0x7F, 0x3F, 0x88, 0x31, 0x0B,
+)
+
+PATABLE_RESET = (0xC6, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00)
+
+# Status register names indexed by address - 0x30 (read with the burst bit)
+# TI-CC1101 Datasheet, Section 29.3 "Status Register Details"
+
+STATUS_REGISTER_NAMES = (
+    "PARTNUM", "VERSION", "FREQEST", "LQI", "RSSI", "MARCSTATE", "WORTIME1",
+    "WORTIME0", "PKTSTATUS", "VCO_VC_DAC", "TXBYTES", "RXBYTES",
+    "RCCTRL1_STATUS", "RCCTRL0_STATUS",
+)
+
+STATUS_REGISTER_ADDRESSES = dict((name, 0x30 + offset) for offset, name in enumerate(STATUS_REGISTER_NAMES))
+
+
+class Field(object):
+    # A bit field of a register. values names the field values, indexed by
+    # the raw value (None for the reserved ones). Fields without names decode
+    # to integers, or to booleans when they are one bit wide.
+    __slots__ = ("name", "register", "address", "mask", "shift", "values")
+
+    def __init__(self, name, register, address, mask, values=None):
+        self.name = name
+        self.register = register
+        self.address = address
+        self.mask = mask
+        self.shift = (mask & -mask).bit_length() - 1
+        self.values = values
+
+    def __repr__(self):
+        return "Field({}, {}[{:08b}])".format(self.name, self.register, self.mask)
+
+    def raw(self, value):
+        # Field value (name, bool or integer) to its unshifted integer
+        if isinstance(value, str):
+            if self.values is None or value not in self.values:
+                raise Exception("{} has no value {}".format(self.name, value))
+            return self.values.index(value)
+
+        value = int(value)
+
+        if not 0 <= value <= self.mask >> self.shift:
+            raise Exception("{} does not fit in {}".format(value, self.name))
+
+        return value
+
+    def encode(self, value, registerValue=0):
+        # registerValue with the field set to value
+        return (registerValue & ~self.mask & 0xFF) | (self.raw(value) << self.shift)
+
+    def decode(self, registerValue):
+        value = (registerValue & self.mask) >> self.shift
+
+        if self.values is not None and self.values[value] is not None:
+            return self.values[value]
+
+        if self.mask >> self.shift == 1:
+            return bool(value)
+
+        return value
+
+
+ADR_CHK_VALUES = ("DISABLED", "ENABLED_NO_BROADCAST", "ENABLED_00_BROADCAST", "ENABLED_00_255_BROADCAST")
+PKT_FORMAT_VALUES = ("NORMAL", "SYNCHRONOUS_SERIAL", "RANDOM_TX", "ASYNCHRONOUS_SERIAL")
+LENGTH_CONFIG_VALUES = ("PKT_LEN_FIXED", "PKT_LEN_VARIABLE", "PKT_LEN_INFINITE", None)
+MOD_FORMAT_VALUES = ("2-FSK", "GFSK", None, "ASK/OOK", "4-FSK", None, None, "MSK")
+CCA_MODE_VALUES = ("ALWAYS", "RSSI_BELOW_THRESHOLD", "UNLESS_RECEIVING", "RSSI_BELOW_THRESHOLD_UNLESS_RECEIVING")
+OFF_MODE_VALUES = ("IDLE", "FSTXON", "TX", "RX")
+FS_AUTOCAL_VALUES = ("NEVER", "FROM_IDLE", "TO_IDLE", "EVERY_4TH_TO_IDLE")
+
+# (register, ((field, mask[, values]), ...)), TI-CC1101 Datasheet Section 29.
+# Multi-byte values split over registers (FREQ, SYNC, WOREVT...) and the
+# fields the datasheet does not name are called after their register.
+
+REGISTER_FIELD_TABLE = (
+    ("IOCFG2", (("GDO2_INV", 0x40), ("GDO2_CFG", 0x3F))),
+    ("IOCFG1", (("GDO_DS", 0x80), ("GDO1_INV", 0x40), ("GDO1_CFG", 0x3F))),
+    ("IOCFG0", (("TEMP_SENSOR_ENABLE", 0x80), ("GDO0_INV", 0x40), ("GDO0_CFG", 0x3F))),
+    ("FIFOTHR", (("ADC_RETENTION", 0x40), ("CLOSE_IN_RX", 0x30), ("FIFO_THR", 0x0F))),
+    ("SYNC1", (("SYNC1", 0xFF),)),
+    ("SYNC0", (("SYNC0", 0xFF),)),
+    ("PKTLEN", (("PACKET_LENGTH", 0xFF),)),
+    ("PKTCTRL1", (("PQT", 0xE0), ("CRC_AUTOFLUSH", 0x08), ("APPEND_STATUS", 0x04),
+                  ("ADR_CHK", 0x03, ADR_CHK_VALUES))),
+    ("PKTCTRL0", (("WHITE_DATA", 0x40), ("PKT_FORMAT", 0x30, PKT_FORMAT_VALUES), ("CRC_EN", 0x04),
+                  ("LENGTH_CONFIG", 0x03, LENGTH_CONFIG_VALUES))),
+    ("ADDR", (("DEVICE_ADDR", 0xFF),)),
+    ("CHANNR", (("CHAN", 0xFF),)),
+    ("FSCTRL1", (("FREQ_IF", 0x1F),)),
+    ("FSCTRL0", (("FREQOFF", 0xFF),)),
+    ("FREQ2", (("FREQ2", 0x3F),)),
+    ("FREQ1", (("FREQ1", 0xFF),)),
+    ("FREQ0", (("FREQ0", 0xFF),)),
+    ("MDMCFG4", (("CHANBW_E", 0xC0), ("CHANBW_M", 0x30), ("DRATE_E", 0x0F))),
+    ("MDMCFG3", (("DRATE_M", 0xFF),)),
+    ("MDMCFG2", (("DEM_DCFILT_OFF", 0x80), ("MOD_FORMAT", 0x70, MOD_FORMAT_VALUES), ("MANCHESTER_EN", 0x08),
+                 ("SYNC_MODE", 0x07))),
+    ("MDMCFG1", (("FEC_EN", 0x80), ("NUM_PREAMBLE", 0x70), ("CHANSPC_E", 0x03))),
+    ("MDMCFG0", (("CHANSPC_M", 0xFF),)),
+    ("DEVIATN", (("DEVIATION_E", 0x70), ("DEVIATION_M", 0x07))),
+    ("MCSM2", (("RX_TIME_RSSI", 0x10), ("RX_TIME_QUAL", 0x08), ("RX_TIME", 0x07))),
+    ("MCSM1", (("CCA_MODE", 0x30, CCA_MODE_VALUES), ("RXOFF_MODE", 0x0C, OFF_MODE_VALUES),
+               ("TXOFF_MODE", 0x03, OFF_MODE_VALUES))),
+    ("MCSM0", (("FS_AUTOCAL", 0x30, FS_AUTOCAL_VALUES), ("PO_TIMEOUT", 0x0C), ("PIN_CTRL_EN", 0x02),
+               ("XOSC_FORCE_ON", 0x01))),
+    ("FOCCFG", (("FOC_BS_CS_GATE", 0x20), ("FOC_PRE_K", 0x18), ("FOC_POST_K", 0x04), ("FOC_LIMIT", 0x03))),
+    ("BSCFG", (("BS_PRE_KI", 0xC0), ("BS_PRE_KP", 0x30), ("BS_POST_KI", 0x08), ("BS_POST_KP", 0x04),
+               ("BS_LIMIT", 0x03))),
+    ("AGCCTRL2", (("MAX_DVGA_GAIN", 0xC0), ("MAX_LNA_GAIN", 0x38), ("MAGN_TARGET", 0x07))),
+    ("AGCCTRL1", (("AGC_LNA_PRIORITY", 0x40), ("CARRIER_SENSE_REL_THR", 0x30), ("CARRIER_SENSE_ABS_THR", 0x0F))),
+    ("AGCCTRL0", (("HYST_LEVEL", 0xC0), ("WAIT_TIME", 0x30), ("AGC_FREEZE", 0x0C), ("FILTER_LENGTH", 0x03))),
+    ("WOREVT1", (("WOREVT1", 0xFF),)),
+    ("WOREVT0", (("WOREVT0", 0xFF),)),
+    ("WORCTRL", (("RC_PD", 0x80), ("EVENT1", 0x70), ("RC_CAL", 0x08), ("WOR_RES", 0x03))),
+    ("FREND1", (("LNA_CURRENT", 0xC0), ("LNA2MIX_CURRENT", 0x30), ("LODIV_BUF_CURRENT_RX", 0x0C),
+                ("MIX_CURRENT", 0x03))),
+    ("FREND0", (("LODIV_BUF_CURRENT_TX", 0x30), ("PA_POWER", 0x07))),
+    ("FSCAL3", (("FSCAL3_CONFIG", 0xC0), ("CHP_CURR_CAL_EN", 0x30), ("FSCAL3_RESULT", 0x0F))),
+    ("FSCAL2", (("VCO_CORE_H_EN", 0x20), ("FSCAL2", 0x1F))),
+    ("FSCAL1", (("FSCAL1", 0x3F),)),
+    ("FSCAL0", (("FSCAL0", 0x7F),)),
+    ("RCCTRL1", (("RCCTRL1", 0x7F),)),
+    ("RCCTRL0", (("RCCTRL0", 0x7F),)),
+    ("FSTEST", (("FSTEST", 0xFF),)),
+    ("PTEST", (("PTEST", 0xFF),)),
+    ("AGCTEST", (("AGCTEST", 0xFF),)),
+    ("TEST2", (("TEST2", 0xFF),)),
+    ("TEST1", (("TEST1", 0xFF),)),
+    ("TEST0", (("TEST0_CONFIG", 0xFC), ("VCO_SEL_CAL_EN", 0x02), ("TEST0_RESERVED", 0x01))),
+
+    # Status registers, read only
+    ("PARTNUM", (("PARTNUM", 0xFF),)),
+    ("VERSION", (("VERSION", 0xFF),)),
+    ("FREQEST", (("FREQOFF_EST", 0xFF),)),
+    ("LQI", (("CRC_OK", 0x80), ("LQI_EST", 0x7F))),
+    ("RSSI", (("RSSI", 0xFF),)),
+    ("MARCSTATE", (("MARC_STATE", 0x1F),)),
+    ("WORTIME1", (("WORTIME1", 0xFF),)),
+    ("WORTIME0", (("WORTIME0", 0xFF),)),
+    ("PKTSTATUS", (("CRC_OK", 0x80), ("CS", 0x40), ("PQT_REACHED", 0x20), ("CCA", 0x10), ("SFD", 0x08),
+                   ("GDO2", 0x04), ("GDO0", 0x01))),
+    ("VCO_VC_DAC", (("VCO_VC_DAC", 0xFF),)),
+    ("TXBYTES", (("TXFIFO_UNDERFLOW", 0x80), ("NUM_TXBYTES", 0x7F))),
+    ("RXBYTES", (("RXFIFO_OVERFLOW", 0x80), ("NUM_RXBYTES", 0x7F))),
+    ("RCCTRL1_STATUS", (("RCCTRL1_STATUS", 0x7F),)),
+    ("RCCTRL0_STATUS", (("RCCTRL0_STATUS", 0x7F),)),
+)
+
+# Fields of every register by register name, and the configuration
+# register fields (writable, names unique) by field name
+
+REGISTER_FIELDS = {}
+FIELDS = {}
+
+for _register, _fields in REGISTER_FIELD_TABLE:
+    _address = REGISTER_ADDRESSES.get(_register, STATUS_REGISTER_ADDRESSES.get(_register))
+    REGISTER_FIELDS[_register] = tuple(Field(_field[0], _register, _address, *_field[1:]) for _field in _fields)
+
+    if _register in REGISTER_ADDRESSES:
+        for _field in REGISTER_FIELDS[_register]:
+            FIELDS[_field.name] = _field
+
+del _register, _fields, _address, _field
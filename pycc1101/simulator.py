@@ -0,0 +1,665 @@
+import random
+import threading
+import time
+
+from .registers import REGISTER_ADDRESSES, RESET_VALUES, PATABLE_RESET, PATABLE_SIZE
+from .solvers import FXOSC, PREAMBLE_BYTES, SYNC_BYTES, dataRate
+
+# In-process model of the CC1101 SPI interface. SimulatedCC1101 exposes the
+# spidev.SpiDev API (open, xfer, xfer2, ...) so it can be handed to
+# TICC1101(spi=...) and SimulatedAir connects several of them on one channel.
+
+FIFO_SIZE = 64
+
+R = REGISTER_ADDRESSES
+
+
+def rssiToRegister(dbm):
+    # Inverse of the datasheet conversion, RSSI_offset = 74
+    return int(round((dbm + 74) * 2)) & 0xFF
+
+
+class SimulatedAir(object):
+
+    def __init__(self, clock=time.monotonic, rssi=-60, noiseFloor=-100, lqi=0x10,
+                 lossRate=0.0, seed=None):
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.radios = []
+        self.rssi = rssi
+        self.noiseFloor = noiseFloor
+        self.lqi = lqi
+        self.lossRate = lossRate
+        self.packetsSent = 0
+        self.packetsLost = 0
+        self._random = random.Random(seed)
+
+    def attach(self, radio):
+        with self.lock:
+            radio.air = self
+            radio._lock = self.lock
+            radio._clock = self.clock
+            self.radios.append(radio)
+
+        return radio
+
+    def advance(self, now=None):
+        now = self.clock() if now is None else now
+
+        for radio in self.radios:
+            radio._advance(now)
+
+    def _receivers(self, transmitter):
+        for radio in self.radios:
+            if radio is not transmitter and radio._compatible(transmitter):
+                yield radio
+
+    def _sync(self, transmitter, t):
+        for radio in self._receivers(transmitter):
+            if self.lossRate and self._random.random() < self.lossRate:
+                self.packetsLost += 1
+                continue
+
+            radio._rxBegin(transmitter, t)
+
+    def _byte(self, transmitter, value, t):
+        for radio in self._receivers(transmitter):
+            radio._rxByte(transmitter, value, t)
+
+    def _end(self, transmitter, t):
+        self.packetsSent += 1
+
+    def _abort(self, transmitter, t):
+        for radio in self.radios:
+            radio._rxAbort(transmitter, t)
+
+    def _carrier(self, receiver):
+        for radio in self.radios:
+            if radio is not receiver and radio.state == SimulatedCC1101.TX and radio._compatible(receiver):
+                return True
+
+        return False
+
+
+class SimulatedCC1101(object):
+    # MARCSTATE values, TI-CC1101 Datasheet Table 32
+
+    SLEEP = 0x00
+    IDLE = 0x01
+    STARTCAL = 0x08
+    FS_LOCK = 0x0A
+    RX = 0x0D
+    TXRX_SWITCH = 0x10
+    RXFIFO_OVERFLOW = 0x11
+    FSTXON = 0x12
+    TX = 0x13
+    RXTX_SWITCH = 0x15
+    TXFIFO_UNDERFLOW = 0x16
+
+    # Chip status byte STATE[2:0]
+
+    STATUS_STATES = {
+        SLEEP: 0, IDLE: 0, STARTCAL: 4, FS_LOCK: 5, RX: 1, TXRX_SWITCH: 5,
+        RXFIFO_OVERFLOW: 6, FSTXON: 3, TX: 2, RXTX_SWITCH: 5, TXFIFO_UNDERFLOW: 7,
+    }
+
+    def __init__(self, air=None, byteLatency=None, transactionLatency=0.0, realtime=True,
+                 calibrationTime=720e-6, settlingTime=90e-6, fxosc=FXOSC, partnum=0x00, version=0x14):
+        self.max_speed_hz = 50000
+        self.mode = 0
+        self.byteLatency = byteLatency
+        self.transactionLatency = transactionLatency
+        self.realtime = realtime
+        self.calibrationTime = calibrationTime
+        self.settlingTime = settlingTime
+        self.fxosc = fxosc
+        self.partnum = partnum
+        self.version = version
+
+        self.transactions = 0
+        self.bytesClocked = 0
+        self.busTime = 0.0
+        self.strobes = 0
+        self.calibrations = 0
+        self.packetsReceived = 0
+        self.txOverflows = 0
+
+        self.air = None
+        self._gdo0Listeners = []
+        self._gdo0Level = 0
+        self._lock = threading.RLock()
+        self._clock = time.monotonic
+
+        if air is not None:
+            air.attach(self)
+
+        self._reset()
+
+    # spidev.SpiDev API
+
+    def open(self, bus, device):
+        self.bus = bus
+        self.device = device
+
+    def close(self):
+        pass
+
+    def xfer(self, data, *args):
+        return self._transfer(data)
+
+    xfer2 = xfer
+    xfer3 = xfer
+
+    def writebytes(self, data):
+        self._transfer(data)
+
+    writebytes2 = writebytes
+
+    def readbytes(self, length):
+        return self._transfer([0x00] * length)
+
+    def attachGDO0(self, callback):
+        # callback(level) is invoked on every GDO0 change, e.g.
+        # gpio.PipeEventSource.setLevel
+        self._gdo0Listeners.append(callback)
+
+    def resetCounters(self):
+        self.transactions = 0
+        self.bytesClocked = 0
+        self.busTime = 0.0
+        self.strobes = 0
+
+    # Bus
+
+    def _transfer(self, data):
+        data = list(data)
+        latency = self.transactionLatency + len(data) * (
+            self.byteLatency if self.byteLatency is not None else 8.0 / self.max_speed_hz)
+
+        with self._lock:
+            self.transactions += 1
+            self.bytesClocked += len(data)
+            self.busTime += latency
+
+            if self.air is not None:
+                self.air.advance()
+            else:
+                self._advance(self._clock())
+
+            if self.state == self.SLEEP:
+                # CSn low wakes the chip up, registers 0x29 - 0x2E are lost
+                self.state = self.IDLE
+                self.regs[R["FSTEST"]:] = RESET_VALUES[R["FSTEST"]:]
+
+            out = self._process(data)
+
+        # The transfer takes effect when it starts: on the chip every byte is
+        # applied as soon as it is clocked in, so a FIFO refill keeps up with
+        # the air instead of landing after the whole burst
+        if self.realtime and latency:
+            time.sleep(latency)
+
+        return out
+
+    def _process(self, data):
+        out = []
+        i = 0
+
+        while i < len(data):
+            header = data[i]
+            read = bool(header & 0x80)
+            burst = bool(header & 0x40)
+            address = header & 0x3F
+            i += 1
+
+            out.append(self._statusByte(read))
+
+            if 0x30 <= address <= 0x3D and not (read and burst):
+                self._strobe(address)
+                continue
+
+            # Status registers are always single accesses even though they
+            # are addressed with the burst bit, the next byte is a new header
+            if burst and not 0x30 <= address <= 0x3D:
+                count = len(data) - i
+            else:
+                count = min(1, len(data) - i)
+
+            for k in range(count):
+                if read:
+                    out.append(self._read(address, burst, k))
+                else:
+                    self._write(address, data[i + k], burst, k)
+                    out.append(self._statusByte(False))
+
+            i += count
+
+        return out
+
+    def _statusByte(self, read):
+        state = self.STATUS_STATES.get(self.state, 0)
+
+        if read:
+            available = len(self.rxFifo)
+        else:
+            available = FIFO_SIZE - len(self.txFifo)
+
+        return (state << 4) | min(available, 15)
+
+    def _read(self, address, burst, k):
+        if address <= R["TEST0"]:
+            address = address + k if burst else address
+            return self.regs[address] if address <= R["TEST0"] else 0x00
+
+        if address <= 0x3D:
+            return self._readStatus(address) if k == 0 else 0x00
+
+        if address == 0x3E:
+            return self.patable[k % PATABLE_SIZE]
+
+        if self.rxFifo:
+            value = self.rxFifo[0]
+            del self.rxFifo[0]
+            # A discarded packet is still removed from where it starts
+            self._rxStart = max(0, self._rxStart - 1)
+            return value
+
+        return 0x00
+
+    def _write(self, address, value, burst, k):
+        if address <= R["TEST0"]:
+            address = address + k if burst else address
+
+            if address <= R["TEST0"]:
+                self.regs[address] = value & 0xFF
+
+        elif address == 0x3E:
+            self.patable[k % PATABLE_SIZE] = value & 0xFF
+
+        elif address == 0x3F:
+            if len(self.txFifo) >= FIFO_SIZE:
+                self.txOverflows += 1
+                return
+
+            self.txFifo.append(value & 0xFF)
+
+            if self.state == self.TX and self._txPhase == "wait":
+                # Preamble was being sent while waiting for data
+                self._txPhase = "sync"
+                self._txNext = self._clock() + self._syncBytes() * self._byteTime()
+
+    def _readStatus(self, address):
+        if address == 0x30:
+            return self.partnum
+        if address == 0x31:
+            return self.version
+        if address == 0x33:
+            return self.lastLqi
+        if address == 0x34:
+            return rssiToRegister(self._rssi())
+        if address == 0x35:
+            return self.state
+        if address == 0x38:
+            return self._pktStatus()
+        if address == 0x3A:
+            return (0x80 if self.state == self.TXFIFO_UNDERFLOW else 0x00) | len(self.txFifo)
+        if address == 0x3B:
+            return (0x80 if self.rxOverflow else 0x00) | len(self.rxFifo)
+        if address == 0x3C:
+            return self.regs[R["RCCTRL1"]]
+        if address == 0x3D:
+            return self.regs[R["RCCTRL0"]]
+        return 0x00
+
+    def _rssi(self):
+        if self.state == self.RX and self.air is not None:
+            return self.air.rssi if self.air._carrier(self) else self.air.noiseFloor
+
+        return self.air.noiseFloor if self.air is not None else -100
+
+    def _pktStatus(self):
+        carrier = self.air is not None and self.state == self.RX and self.air._carrier(self)
+        value = 0x80 if self.lastCrcOk else 0x00
+
+        if carrier:
+            value |= 0x40
+        else:
+            value |= 0x10
+
+        if self._rxFrom is not None:
+            value |= 0x08
+
+        return value
+
+    # Strobes and state machine
+
+    def _setGDO0(self, level):
+        # Only IOCFG0.GDO0_CFG = 0x06 (sync word / end of packet) is modelled
+        if (self.regs[R["IOCFG0"]] & 0x3F) != 0x06:
+            return
+
+        if level == self._gdo0Level:
+            return
+
+        self._gdo0Level = level
+        level ^= (self.regs[R["IOCFG0"]] >> 6) & 0x01
+
+        for callback in self._gdo0Listeners:
+            callback(level)
+
+    def _reset(self):
+        self.regs = list(RESET_VALUES)
+        self.patable = list(PATABLE_RESET)
+        self.txFifo = bytearray()
+        self.rxFifo = bytearray()
+        self.rxOverflow = False
+        self.state = self.IDLE
+        self.lastLqi = 0x00
+        self.lastCrcOk = False
+        self._pending = None
+        self._txPhase = None
+        self._txNext = None
+        self._txFrame = bytearray()
+        self._rxFrom = None
+        self._rxCount = 0
+        self._rxStart = 0
+        self._rxFirst = None
+
+    def _strobe(self, address):
+        self.strobes += 1
+        now = self._clock()
+
+        if address == 0x30:  # SRES
+            if self._txPhase is not None and self.air is not None:
+                self.air._abort(self, now)
+            self._reset()
+
+        elif address == 0x31:  # SFSTXON
+            if self.state in (self.IDLE, self.RX):
+                self._goto(self.FSTXON, now)
+
+        elif address == 0x33:  # SCAL
+            if self.state == self.IDLE:
+                self._calibrate()
+                self._pending = (now + self.calibrationTime, self.IDLE)
+                self.state = self.STARTCAL
+
+        elif address == 0x34:  # SRX
+            if self.state in (self.IDLE, self.FSTXON, self.TX):
+                self._stopTX(now)
+                self._goto(self.RX, now)
+
+        elif address == 0x35:  # STX
+            if self.state == self.RX and (self.regs[R["MCSM1"]] >> 4) & 0x03:
+                # With CCA enabled TX is only entered if the channel is clear
+                if self.air is not None and self.air._carrier(self):
+                    return
+
+            if self.state in (self.IDLE, self.FSTXON, self.RX):
+                self._rxFrom = None
+                self._goto(self.TX, now)
+
+        elif address == 0x36:  # SIDLE
+            self._stopTX(now)
+            self._rxAbortCurrent()
+            self._pending = None
+            self.state = self.IDLE
+
+        elif address == 0x39:  # SPWD
+            if self.state == self.IDLE:
+                self.state = self.SLEEP
+
+        elif address == 0x3A:  # SFRX
+            if self.state in (self.IDLE, self.RXFIFO_OVERFLOW):
+                del self.rxFifo[:]
+                self.rxOverflow = False
+                self.state = self.IDLE
+
+        elif address == 0x3B:  # SFTX
+            if self.state in (self.IDLE, self.TXFIFO_UNDERFLOW):
+                del self.txFifo[:]
+                self.state = self.IDLE
+
+    def _goto(self, target, now):
+        calibrate = self.state == self.IDLE and ((self.regs[R["MCSM0"]] >> 4) & 0x03) == 1
+        delay = self.settlingTime
+
+        if calibrate:
+            self._calibrate()
+            delay += self.calibrationTime
+            self.state = self.STARTCAL
+        elif self.state == self.RX and target == self.TX:
+            self.state = self.RXTX_SWITCH
+        elif self.state == self.TX and target == self.RX:
+            self.state = self.TXRX_SWITCH
+        else:
+            self.state = self.FS_LOCK
+
+        self._pending = (now + delay, target)
+
+        if delay <= 0:
+            self._resolvePending(now)
+
+    def _enter(self, target, t):
+        self.state = target
+
+        if target == self.TX:
+            self._txStartPacket(t)
+
+    def _resolvePending(self, now):
+        if self._pending is not None and self._pending[0] <= now:
+            t, target = self._pending
+            self._pending = None
+            self._enter(target, t)
+
+    def _calibrate(self):
+        self.calibrations += 1
+        freq = (self.regs[R["FREQ2"]] << 16) | (self.regs[R["FREQ1"]] << 8) | self.regs[R["FREQ0"]]
+        key = (freq + self.regs[R["CHANNR"]] * 0x1F5) & 0xFFFFFF
+
+        self.regs[R["FSCAL3"]] = (self.regs[R["FSCAL3"]] & 0xCF) | 0x20
+        self.regs[R["FSCAL2"]] = 0x0A | ((key >> 6) & 0x20)
+        self.regs[R["FSCAL1"]] = (key >> 2) & 0x3F
+
+    def _advance(self, now):
+        self._resolvePending(now)
+        self._advanceTX(now)
+        self._resolvePending(now)
+
+    # Transmitter
+
+    def _byteTime(self):
+        rate = dataRate(self.regs[R["MDMCFG4"]], self.regs[R["MDMCFG3"]], self.fxosc)
+        manchester = 2 if self.regs[R["MDMCFG2"]] & 0x08 else 1
+
+        return 8.0 * manchester / rate
+
+    def _syncBytes(self):
+        return SYNC_BYTES[self.regs[R["MDMCFG2"]] & 0x07]
+
+    def _preambleBytes(self):
+        # SYNC_MODE 0 and 4 send neither preamble nor sync word
+        if not self._syncBytes():
+            return 0
+
+        return PREAMBLE_BYTES[(self.regs[R["MDMCFG1"]] >> 4) & 0x07]
+
+    def _crcBytes(self):
+        return 2 if self.regs[R["PKTCTRL0"]] & 0x04 else 0
+
+    def _compatible(self, other):
+        for name in ("FREQ2", "FREQ1", "FREQ0", "CHANNR"):
+            if self.regs[R[name]] != other.regs[R[name]]:
+                return False
+
+        if self._syncBytes() and (self.regs[R["SYNC1"]], self.regs[R["SYNC0"]]) != (
+                other.regs[R["SYNC1"]], other.regs[R["SYNC0"]]):
+            return False
+
+        return True
+
+    def _packetDone(self, count, first):
+        # Same rules for both directions: variable length uses the first
+        # byte, fixed length (or infinite switched to fixed) counts modulo 256
+        lengthConfig = self.regs[R["PKTCTRL0"]] & 0x03
+
+        if lengthConfig == 0x01:
+            return count == first + 1
+
+        if lengthConfig == 0x00:
+            return count % 256 == self.regs[R["PKTLEN"]] % 256
+
+        return False
+
+    def _txStartPacket(self, t):
+        self._txFrame = bytearray()
+        self._txPhase = "sync"
+        self._txNext = t + (self._preambleBytes() + self._syncBytes()) * self._byteTime()
+
+    def _stopTX(self, now):
+        if self._txPhase is not None and self.air is not None:
+            self.air._abort(self, now)
+
+        self._txPhase = None
+        self._txNext = None
+        self._setGDO0(0)
+
+    def _advanceTX(self, now):
+        while self.state == self.TX and self._txNext is not None and self._txNext <= now:
+            t = self._txNext
+
+            if self._txPhase == "sync":
+                if not self.txFifo:
+                    self._txPhase = "wait"
+                    self._txNext = None
+                    break
+
+                self._txPhase = "data"
+                self._txNext = t + self._byteTime()
+                self._setGDO0(1)
+
+                if self.air is not None:
+                    self.air._sync(self, t)
+
+            elif self._txPhase == "data":
+                if not self.txFifo:
+                    self._stopTX(t)
+                    self.state = self.TXFIFO_UNDERFLOW
+                    break
+
+                value = self.txFifo[0]
+                del self.txFifo[0]
+                self._txFrame.append(value)
+
+                if self.air is not None:
+                    self.air._byte(self, value, t)
+
+                if self._packetDone(len(self._txFrame), self._txFrame[0]):
+                    self._txPhase = "crc"
+                    self._txNext = t + self._crcBytes() * self._byteTime()
+                else:
+                    self._txNext = t + self._byteTime()
+
+            else:
+                self._txPhase = None
+                self._txNext = None
+                self._setGDO0(0)
+
+                if self.air is not None:
+                    self.air._end(self, t)
+
+                self._afterPacket(self.regs[R["MCSM1"]] & 0x03, t)
+
+    def _afterPacket(self, offMode, t):
+        # MCSM1 RXOFF_MODE / TXOFF_MODE: IDLE, FSTXON, TX, RX
+        if offMode == 0:
+            self.state = self.IDLE
+        elif offMode == 1:
+            self.state = self.FSTXON
+        elif offMode == 2:
+            if self.state == self.TX:
+                self._txStartPacket(t)
+            else:
+                self._goto(self.TX, t)
+        else:
+            if self.state == self.RX:
+                return
+            self._goto(self.RX, t)
+
+    # Receiver
+
+    def _rxBegin(self, transmitter, t):
+        self._resolvePending(t)
+
+        if self.state != self.RX or self._rxFrom is not None:
+            return
+
+        self._rxFrom = transmitter
+        self._rxCount = 0
+        self._rxStart = len(self.rxFifo)
+        self._rxFirst = None
+        self._setGDO0(1)
+
+    def _rxAbortCurrent(self):
+        if self._rxFrom is not None:
+            del self.rxFifo[self._rxStart:]
+            self._rxFrom = None
+            self._setGDO0(0)
+
+    def _rxAbort(self, transmitter, t):
+        if self._rxFrom is transmitter:
+            self._rxAbortCurrent()
+
+    def _rxPush(self, value):
+        if len(self.rxFifo) >= FIFO_SIZE:
+            self.rxOverflow = True
+            self.state = self.RXFIFO_OVERFLOW
+            self._rxFrom = None
+            self._setGDO0(0)
+            return False
+
+        self.rxFifo.append(value)
+        return True
+
+    def _rxByte(self, transmitter, value, t):
+        if self._rxFrom is not transmitter or self.state != self.RX:
+            return
+
+        lengthConfig = self.regs[R["PKTCTRL0"]] & 0x03
+
+        if self._rxCount == 0:
+            self._rxFirst = value
+
+            if lengthConfig == 0x01 and value > self.regs[R["PKTLEN"]]:
+                self._rxAbortCurrent()
+                return
+
+        addressPosition = 1 if lengthConfig == 0x01 else 0
+        addressCheck = self.regs[R["PKTCTRL1"]] & 0x03
+
+        if self._rxCount == addressPosition and addressCheck:
+            accepted = (value == self.regs[R["ADDR"]] or
+                        (addressCheck >= 2 and value == 0x00) or
+                        (addressCheck == 3 and value == 0xFF))
+
+            if not accepted:
+                self._rxAbortCurrent()
+                return
+
+        if not self._rxPush(value):
+            return
+
+        self._rxCount += 1
+
+        if self._packetDone(self._rxCount, self._rxFirst):
+            self._rxFrom = None
+            self._setGDO0(0)
+            self.packetsReceived += 1
+            self.lastLqi = self.air.lqi if self.air is not None else 0x00
+            self.lastCrcOk = True
+
+            if self.regs[R["PKTCTRL1"]] & 0x04:  # APPEND_STATUS
+                if not (self._rxPush(rssiToRegister(self.air.rssi)) and self._rxPush(0x80 | self.lastLqi)):
+                    return
+
+            self._afterPacket((self.regs[R["MCSM1"]] >> 2) & 0x03, t)
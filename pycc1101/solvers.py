@@ -0,0 +1,122 @@
+import functools
+
+# Register encodings of the synthesizer and modem settings, TI-CC1101
+# Datasheet Sections 12, 13, 16 and 21. Every solver returns the register
+# fields and the value actually achieved with them, and is memoized so that
+# sweeping or hopping code can call it in a loop for free.
+
+FXOSC = 26000000
+
+# Frequency bands supported by the synthesizer, in Hz
+BANDS = ((300000000, 348000000), (387000000, 464000000), (779000000, 928000000))
+
+# Preamble bytes for MDMCFG1.NUM_PREAMBLE, sync bytes for MDMCFG2.SYNC_MODE
+PREAMBLE_BYTES = (2, 3, 4, 6, 8, 12, 16, 24)
+SYNC_BYTES = (0, 2, 2, 4, 0, 2, 2, 4)
+
+
+def carrierFrequency(freq2, freq1, freq0, fxosc=FXOSC):
+    return ((freq2 << 16) | (freq1 << 8) | freq0) * fxosc / float(1 << 16)
+
+
+def dataRate(mdmcfg4, mdmcfg3, fxosc=FXOSC):
+    return (256 + mdmcfg3) * (1 << (mdmcfg4 & 0x0F)) * fxosc / float(1 << 28)
+
+
+def deviation(deviatn, fxosc=FXOSC):
+    return fxosc / float(1 << 17) * (8 + (deviatn & 0x07)) * (1 << ((deviatn >> 4) & 0x07))
+
+
+def channelSpacing(mdmcfg1, mdmcfg0, fxosc=FXOSC):
+    return fxosc / float(1 << 18) * (256 + mdmcfg0) * (1 << (mdmcfg1 & 0x03))
+
+
+def rxBandwidth(mdmcfg4, fxosc=FXOSC):
+    return fxosc / (8.0 * (4 + ((mdmcfg4 >> 4) & 0x03)) * (1 << (mdmcfg4 >> 6)))
+
+
+def airtime(packetBytes, mdmcfg1, mdmcfg2, rate):
+    # Seconds on air for packetBytes bytes after the sync word (length and
+    # address bytes, payload and CRC), TI-CC1101 Datasheet Section 15.1.
+    # With FEC the data is sent at rate 1/2 in 4 byte interleaver blocks,
+    # the trellis termination is approximated by one extra byte.
+    data = packetBytes
+
+    if mdmcfg1 & 0x80:
+        data = 2 * (packetBytes + 1)
+        data += -data % 4
+
+    # SYNC_MODE 0 and 4 send neither preamble nor sync word
+    sync = SYNC_BYTES[mdmcfg2 & 0x07]
+    total = (PREAMBLE_BYTES[(mdmcfg1 >> 4) & 0x07] if sync else 0) + sync + data
+    manchester = 2 if mdmcfg2 & 0x08 else 1
+
+    return 8.0 * manchester * total / rate
+
+
+@functools.lru_cache(maxsize=4096)
+def solveFrequency(freq, fxosc=FXOSC):
+    # (FREQ2, FREQ1, FREQ0), achieved Hz
+    if not any(low <= freq <= high for low, high in BANDS):
+        raise Exception("Carrier frequency {} Hz is outside the CC1101 bands".format(freq))
+
+    word = int(round(freq * (1 << 16) / float(fxosc))) & 0x3FFFFF
+    registers = ((word >> 16) & 0xFF, (word >> 8) & 0xFF, word & 0xFF)
+
+    return registers, carrierFrequency(*(registers + (fxosc,)))
+
+
+@functools.lru_cache(maxsize=1024)
+def solveDataRate(baud, fxosc=FXOSC):
+    # (DRATE_E, DRATE_M), achieved baud
+    best = None
+
+    for exponent in range(16):
+        mantissa = int(round(baud * (1 << 28) / float(fxosc * (1 << exponent)))) - 256
+
+        if not 0 <= mantissa <= 255:
+            continue
+
+        achieved = dataRate(exponent, mantissa, fxosc)
+
+        if best is None or abs(achieved - baud) < abs(best[1] - baud):
+            best = ((exponent, mantissa), achieved)
+
+    if best is None:
+        raise Exception("Data rate {} baud cannot be programmed".format(baud))
+
+    return best
+
+
+@functools.lru_cache(maxsize=1024)
+def solveDeviation(freq, fxosc=FXOSC):
+    # (DEVIATION_E, DEVIATION_M), achieved Hz
+    candidates = ((exponent, mantissa) for exponent in range(8) for mantissa in range(8))
+    best = min(candidates, key=lambda em: abs(deviation((em[0] << 4) | em[1], fxosc) - freq))
+
+    return best, deviation((best[0] << 4) | best[1], fxosc)
+
+
+@functools.lru_cache(maxsize=1024)
+def solveChannelSpacing(spacing, fxosc=FXOSC):
+    # (CHANSPC_E, CHANSPC_M), achieved Hz
+    best = None
+
+    for exponent in range(4):
+        mantissa = int(round(spacing * (1 << 18) / float(fxosc * (1 << exponent)))) - 256
+        mantissa = min(max(mantissa, 0), 255)
+        achieved = channelSpacing(exponent, mantissa, fxosc)
+
+        if best is None or abs(achieved - spacing) < abs(best[1] - spacing):
+            best = ((exponent, mantissa), achieved)
+
+    return best
+
+
+@functools.lru_cache(maxsize=256)
+def solveRXBandwidth(bandwidth, fxosc=FXOSC):
+    # (CHANBW_E, CHANBW_M), achieved Hz
+    candidates = ((exponent, mantissa) for exponent in range(4) for mantissa in range(4))
+    best = min(candidates, key=lambda em: abs(rxBandwidth((em[0] << 6) | (em[1] << 4), fxosc) - bandwidth))
+
+    return best, rxBandwidth((best[0] << 6) | (best[1] << 4), fxosc)
@@ -0,0 +1,215 @@
+import time
+
+from .packet import RSSI_OFFSET, numpy
+from . import solvers
+from .hopping import CALIBRATION_TIME
+
+# PLL settling time from IDLE to RX without calibration, TI-CC1101 Datasheet
+# Table 34, in microseconds
+PLL_SETTLING_US = 75
+
+
+class SweepResult(object):
+    # dBm samples of a sweep, one row per pass and one column per step
+
+    def __init__(self, labels, dbm, timestamps):
+        self.labels = labels
+        self.dbm = dbm
+        self.timestamps = timestamps
+
+    @property
+    def minimum(self):
+        return self.dbm.min(axis=0)
+
+    @property
+    def mean(self):
+        return self.dbm.mean(axis=0)
+
+    @property
+    def maximum(self):
+        return self.dbm.max(axis=0)
+
+    def quietest(self, count=1):
+        # Labels of the steps with the lowest peak RSSI
+        return [self.labels[index] for index in numpy.argsort(self.maximum)[:count]]
+
+
+class SpectrumSweep(object):
+    # Steps CHANNR (or FREQ2/1/0 when frequencies are given) and samples RSSI
+    # at every step. Each step is calibrated once up front and autocal is
+    # disabled, as with the HoppingScheduler, so a retune is SIDLE, the
+    # register writes and SRX in one SPI transfer. The RSSI of a step is read
+    # in the same transfer that retunes to the next one: status registers are
+    # single accesses even with the burst bit, so the chip takes the next byte
+    # as a new header. A pass over n steps costs n + 1 transfers.
+
+    def __init__(self, radio, channels=None, frequencies=None, dwell_us=None, calibrate=True, historyLength=256):
+        if numpy is None:
+            raise Exception("NumPy is required for spectrum sweeps")
+
+        if (channels is None) == (frequencies is None):
+            raise Exception("Either channels or frequencies are required")
+
+        self.radio = radio
+        self.calibrate = calibrate
+        self.historyLength = historyLength
+
+        if channels is not None:
+            self.labels = list(channels)
+            self.steps = [((radio.CHANNR, channel),) for channel in self.labels]
+        else:
+            self.labels = list(frequencies)
+            self.steps = []
+
+            for freq in self.labels:
+                freq2, freq1, freq0 = solvers.solveFrequency(freq, radio.FXOSC)[0]
+                self.steps.append(((radio.FREQ2, freq2), (radio.FREQ1, freq1), (radio.FREQ0, freq0)))
+
+        self.dwell_us = self.settlingTime() if dwell_us is None else dwell_us
+        self.recordDtype = numpy.dtype([("timestamp", "f8"), ("dbm", "f4", (len(self.steps),))])
+        self.history = numpy.full((historyLength, len(self.steps)), numpy.nan, dtype=numpy.float32)
+        self.passes = 0
+        self.transfers = 0
+        self._table = None
+        self._saved = None
+
+    def settlingTime(self):
+        # Minimum dwell in microseconds: PLL settling plus the averaging
+        # window of the RSSI estimate
+        return PLL_SETTLING_US + 1e6 * self.radio._rssiSettlingTime()
+
+    @property
+    def waterfall(self):
+        # The last historyLength passes, oldest first
+        index = self.passes % self.historyLength
+        return numpy.concatenate((self.history[index:], self.history[:index]))
+
+    def _prepare(self):
+        radio = self.radio
+        addresses = [radio.MCSM0, radio.FSCAL3, radio.FSCAL2, radio.FSCAL1]
+        addresses.extend(address for address, value in self.steps[0])
+
+        radio.sidle()
+        self._saved = [(address, radio._readRegister(address)) for address in addresses]
+
+        if self.calibrate and self._table is None:
+            self._table = []
+
+            for step in self.steps:
+                radio._writeRegisters(step)
+                radio._strobe(radio.SCAL)
+                radio._waitChipState((radio.STATE_IDLE,), radio.stateTimeout, "sweep calibration",
+                                     sleep=CALIBRATION_TIME)
+
+                fscal = radio._readBurst(radio.FSCAL3, 3)
+                self._table.append(((radio.FSCAL3, fscal[0]), (radio.FSCAL2, fscal[1]), (radio.FSCAL1, fscal[2])))
+
+        if self.calibrate:
+            radio._writeSingleByte(radio.MCSM0, self._saved[0][1] & 0xCF)
+
+    def _restore(self):
+        radio = self.radio
+
+        radio.sidle()
+        radio._writeRegisters(self._saved)
+        self._saved = None
+
+    def _transfer(self, step, sample):
+        radio = self.radio
+        data = [radio.RSSI | radio.READ_BURST, 0x00] if sample else []
+        data.append(radio.SIDLE)
+        writes = self.steps[step] + (self._table[step] if self._table is not None else ())
+
+        for address, value in writes:
+            radio._updateShadow(address, [value])
+            data.extend((radio.WRITE_SINGLE_BYTE | address, value))
+
+        data.append(radio.SRX)
+        self.transfers += 1
+
+        if radio.instrumentation is not None:
+            radio.instrumentation.count("sweep", len(data))
+
+        return radio._xfer(data)
+
+    def _wait(self, deadline):
+        # time.sleep is too coarse for dwell times of a few hundred us
+        remaining = deadline - time.perf_counter()
+
+        if remaining > 0.002:
+            time.sleep(remaining - 0.001)
+
+        while time.perf_counter() < deadline:
+            pass
+
+    def _rows(self, passes):
+        # Yields (timestamp, raw RSSI bytes) per pass, passes None is endless
+        radio = self.radio
+        dwell = self.dwell_us / 1e6
+        count = len(self.steps)
+        raw = numpy.zeros(count, dtype=numpy.uint8)
+        done = 0
+
+        self._prepare()
+
+        try:
+            self._transfer(0, False)
+            deadline = time.perf_counter() + dwell
+
+            while passes is None or done < passes:
+                timestamp = time.time()
+
+                for step in range(count):
+                    self._wait(deadline)
+                    last = step == count - 1
+
+                    if last and passes is not None and done == passes - 1:
+                        raw[step] = radio._readSingleByte(radio.RSSI)
+                        self.transfers += 1
+                    else:
+                        raw[step] = self._transfer(0 if last else step + 1, True)[1]
+                        deadline = time.perf_counter() + dwell
+
+                done += 1
+                yield timestamp, raw
+        finally:
+            self._restore()
+
+    def _record(self, raw, out):
+        # Raw register values to dBm, TI-CC1101 Datasheet Section 17.3
+        numpy.subtract(raw.view(numpy.int8) / numpy.float32(2), RSSI_OFFSET, out=out, casting="unsafe")
+        self.history[self.passes % self.historyLength] = out
+        self.passes += 1
+
+        return out
+
+    def sweep(self, passes=1):
+        dbm = numpy.empty((passes, len(self.steps)), dtype=numpy.float32)
+        timestamps = numpy.empty(passes, dtype=numpy.float64)
+
+        for index, (timestamp, raw) in enumerate(self._rows(passes)):
+            timestamps[index] = timestamp
+            self._record(raw, dbm[index])
+
+        return SweepResult(self.labels, dbm, timestamps)
+
+    def stream(self, path=None, passes=None):
+        # Generator of (timestamp, dBm row). With a path, every pass is also
+        # appended as one recordDtype record, read back with
+        # numpy.fromfile(path, dtype=sweep.recordDtype)
+        record = numpy.zeros(1, dtype=self.recordDtype)
+        f = open(path, "ab") if path is not None else None
+
+        try:
+            for timestamp, raw in self._rows(passes):
+                record["timestamp"] = timestamp
+                dbm = self._record(raw, record["dbm"][0])
+
+                if f is not None:
+                    record.tofile(f)
+                    f.flush()
+
+                yield timestamp, dbm.copy()
+        finally:
+            if f is not None:
+                f.close()
@@ -0,0 +1,315 @@
+import itertools
+import struct
+import time
+
+from .instrumentation import Histogram
+
+# Fragment header: source address, message id, fragment index, fragment
+# count, message length. A message is split in count fragments of
+# ceil(length / count) bytes (the last one shorter), so the receiver knows
+# the offset of every fragment without having seen the others.
+FRAGMENT_HEADER = struct.Struct("<BBBBH")
+
+MAX_FRAGMENTS = 255
+MAX_MESSAGE = 0xFFFF
+
+
+class Message(object):
+    __slots__ = ("data", "source", "messageId", "fragments", "address", "timestamp", "latency")
+
+    def __init__(self, data, source, messageId, fragments, address=None, timestamp=None, latency=None):
+        self.data = data
+        self.source = source
+        self.messageId = messageId
+        self.fragments = fragments
+        self.address = address
+        self.timestamp = timestamp
+        self.latency = latency
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return "Message(source={}, messageId={}, fragments={}, length={})".format(
+            self.source, self.messageId, self.fragments, len(self.data))
+
+
+class _Partial(object):
+    # A message being reassembled in one of the pool buffers
+    __slots__ = ("buff", "length", "count", "size", "received", "seen", "address", "started")
+
+    def __init__(self, buff, length, count, address, started):
+        self.buff = buff
+        self.length = length
+        self.count = count
+        self.size = -(-length // count)
+        self.received = 0
+        self.seen = bytearray(count)
+        self.address = address
+        self.started = started
+
+
+class MessageTransport(object):
+    # Messages of any size (up to MAX_MESSAGE bytes) over a TICC1101. A
+    # message is split in sequenced fragments, each sent as one packet with
+    # a FRAGMENT_HEADER, and the fragments are sent back to back with
+    # sendMany. The packet address byte is the destination, the header
+    # carries the sender's own address.
+    #
+    # Reassembly is keyed on (source, message id) so messages of several
+    # senders are rebuilt at the same time. Fragments may arrive in any order
+    # and are copied straight to their offset in one of slots preallocated
+    # buffers. A partial message is dropped once it is older than timeout,
+    # or evicted (oldest first) when a new message needs a buffer.
+
+    def __init__(self, radio, address=None, slots=8, maxMessage=4096, timeout=1.0, pollInterval=0.0005):
+        if maxMessage > MAX_MESSAGE:
+            raise Exception("Messages are limited to {} bytes".format(MAX_MESSAGE))
+
+        self.radio = radio
+        self.address = address if address is not None else radio._readRegister(radio.ADDR)
+        self.maxMessage = maxMessage
+        self.timeout = timeout
+        self.pollInterval = pollInterval
+        self.latency = Histogram()
+        self._ids = itertools.count()
+        self._free = [bytearray(maxMessage) for _ in range(slots)]
+        self._partials = {}
+        self._completed = {}
+        self._first = None
+        self._last = None
+        self._sendSeconds = 0.0
+
+        self.messagesSent = 0
+        self.fragmentsSent = 0
+        self.bytesSent = 0
+        self.messagesReceived = 0
+        self.fragmentsReceived = 0
+        self.bytesReceived = 0
+        self.duplicates = 0
+        self.malformed = 0
+        self.crcErrors = 0
+        self.messagesLost = 0
+        self.fragmentsLost = 0
+        self.evictions = 0
+
+    def fragmentCapacity(self):
+        # Payload bytes of one fragment for the packet configuration: the
+        # packet must fit the FIFO with its length, address and status bytes
+        mode, pktLen, address = self.radio._packetConfig()
+        addressBytes = 0 if address is None else 1
+        capacity = min(pktLen, self.radio.FIFO_SIZE - 3) - addressBytes - FRAGMENT_HEADER.size
+
+        if capacity <= 0:
+            raise Exception("PKTLEN {} leaves no room for a fragment".format(pktLen))
+
+        return capacity
+
+    def fragments(self, data, messageId=None):
+        # The packets of one message, header included
+        data = bytes(data)
+        capacity = self.fragmentCapacity()
+        count = max(1, -(-len(data) // capacity))
+
+        if len(data) > self.maxMessage or count > MAX_FRAGMENTS:
+            raise Exception("Message of {} bytes is too large".format(len(data)))
+
+        messageId = next(self._ids) & 0xFF if messageId is None else messageId
+        size = -(-len(data) // count)
+
+        return [FRAGMENT_HEADER.pack(self.address, messageId, index, count, len(data))
+                + data[index * size:(index + 1) * size] for index in range(count)]
+
+    # Sending
+
+    def send(self, data, address=None):
+        # Sends one message to address (the radio ADDR when None). Returns
+        # True when every fragment was sent.
+        radio = self.radio
+        packets = self.fragments(data)
+        start = time.monotonic()
+
+        try:
+            if len(packets) == 1:
+                sent = 1 if radio.sendData(packets[0], address) else 0
+            else:
+                sent = radio.sendMany(packets, address)["packets"]
+        finally:
+            self._sendSeconds += time.monotonic() - start
+
+        self.fragmentsSent += sent
+
+        if sent < len(packets):
+            return False
+
+        self.messagesSent += 1
+        self.bytesSent += len(data)
+
+        return True
+
+    # Reassembly
+
+    def feed(self, packet):
+        # Takes one received packet (a Packet from recvData, a receiver ring
+        # or a RadioGroup). Returns the Message it completes, else None.
+        now = time.monotonic()
+        self.expire(now)
+
+        if packet.crcOk is False:
+            self.crcErrors += 1
+            return None
+
+        payload = packet.payload
+
+        if len(payload) < FRAGMENT_HEADER.size:
+            self.malformed += 1
+            return None
+
+        source, messageId, index, count, length = FRAGMENT_HEADER.unpack_from(payload)
+
+        if not count or index >= count or length > self.maxMessage:
+            self.malformed += 1
+            return None
+
+        key = (source, messageId)
+
+        if key in self._completed:
+            self.duplicates += 1
+            return None
+
+        partial = self._partials.get(key)
+
+        if partial is None:
+            partial = _Partial(self._take(), length, count, packet.address, now)
+            self._partials[key] = partial
+
+            if self._first is None:
+                self._first = now
+
+        elif partial.length != length or partial.count != count:
+            # Message id reused by the sender before the old message expired
+            self._drop(key)
+            return self.feed(packet)
+
+        if partial.seen[index]:
+            self.duplicates += 1
+            return None
+
+        offset = index * partial.size
+        end = min(offset + partial.size, length)
+        fragment = payload[FRAGMENT_HEADER.size:FRAGMENT_HEADER.size + end - offset]
+
+        if len(fragment) < end - offset:
+            self.malformed += 1
+            return None
+
+        partial.buff[offset:end] = fragment
+        partial.seen[index] = 1
+        partial.received += 1
+        self.fragmentsReceived += 1
+
+        if partial.received < count:
+            return None
+
+        # The buffer goes back to the pool, the message keeps a copy
+        del self._partials[key]
+        data = bytes(partial.buff[:length])
+        self._free.append(partial.buff)
+        self._completed[key] = now
+
+        latency = now - partial.started
+        self.latency.record(latency)
+        self.messagesReceived += 1
+        self.bytesReceived += length
+        self._last = now
+
+        if self.radio.instrumentation is not None:
+            self.radio.instrumentation.observe("reassembly", latency)
+
+        return Message(data, source, messageId, count, partial.address, now, latency)
+
+    def _take(self):
+        # A free buffer, evicting the oldest partial message if there is none
+        if not self._free:
+            key = min(self._partials, key=lambda key: self._partials[key].started)
+            self._drop(key)
+            self.evictions += 1
+
+        return self._free.pop()
+
+    def _drop(self, key):
+        partial = self._partials.pop(key)
+        self._free.append(partial.buff)
+        self.messagesLost += 1
+        self.fragmentsLost += partial.count - partial.received
+
+    def expire(self, now=None):
+        # Drops partial messages older than timeout, forgets completed ids
+        now = time.monotonic() if now is None else now
+
+        for key in [key for key, partial in self._partials.items() if now - partial.started > self.timeout]:
+            self._drop(key)
+
+        for key in [key for key, completed in self._completed.items() if now - completed > self.timeout]:
+            del self._completed[key]
+
+    def receive(self, timeout=None):
+        # Waits for the next complete message, None on timeout. Packets come
+        # from the radio's background receiver when it runs, else recvData
+        # is polled.
+        radio = self.radio
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+
+            if remaining is not None and remaining <= 0:
+                self.expire()
+                return None
+
+            if radio.receiver is not None:
+                packet = radio.receiver.ring.get(remaining)
+            else:
+                packet = radio.recvData()
+
+                if not packet:
+                    radio._setRXState()
+                    time.sleep(self.pollInterval)
+
+            if packet:
+                message = self.feed(packet)
+
+                if message is not None:
+                    return message
+
+    def messages(self, timeout=None):
+        while True:
+            message = self.receive(timeout)
+
+            if message is None:
+                return
+
+            yield message
+
+    def statistics(self):
+        received = self.fragmentsReceived
+        receiving = (self._last - self._first) if self._last is not None else 0.0
+
+        return {
+            "messagesSent": self.messagesSent,
+            "fragmentsSent": self.fragmentsSent,
+            "sendGoodput": self.bytesSent / self._sendSeconds if self._sendSeconds else 0.0,
+            "messagesReceived": self.messagesReceived,
+            "fragmentsReceived": received,
+            "receiveGoodput": self.bytesReceived / receiving if receiving else 0.0,
+            "messagesLost": self.messagesLost,
+            "fragmentsLost": self.fragmentsLost,
+            "fragmentLoss": self.fragmentsLost / float(received + self.fragmentsLost)
+            if received + self.fragmentsLost else 0.0,
+            "duplicates": self.duplicates,
+            "malformed": self.malformed,
+            "crcErrors": self.crcErrors,
+            "evictions": self.evictions,
+            "pending": len(self._partials),
+            "latency": self.latency.snapshot(),
+        }
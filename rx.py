@@ -1,20 +1,51 @@
 #!/usr/bin/python3
 
 from pycc1101.pycc1101 import TICC1101
+from pycc1101.profile import PANSTAMP_PROFILE
+from pycc1101.gpio import GPIOLineEvent
+from pycc1101.capture import CaptureWriter
+from pycc1101.link import ReliableLink
 from struct import pack
 import binascii
 import time
 
-ticc1101 = TICC1101()
-ticc1101.reset()
+# GPIO line (BCM numbering on the Raspberry Pi) wired to the CC1101 GDO0 pin.
+# When set, packets are received on the GDO0 edge instead of polling RXBYTES.
+GDO0_LINE = None
+
+# When set, received packets are also appended to this capture file, see
+# python -m pycc1101.capture
+CAPTURE_PATH = None
+
+# When set, packets are received through a ReliableLink: acknowledged,
+# deduplicated and delivered in order, see RELIABLE_ADDRESS in tx.py
+RELIABLE = False
+
+gdo0 = GPIOLineEvent(GDO0_LINE) if GDO0_LINE is not None else None
+capture = CaptureWriter(CAPTURE_PATH) if CAPTURE_PATH is not None else None
+
+PROFILE = PANSTAMP_PROFILE.copy("example", ADDR=0x0A, PKTCTRL1=0x05)
+
+ticc1101 = TICC1101(gdo0=gdo0)
 ticc1101.selfTest()
-ticc1101.setDefaultValues()
-ticc1101.setFilteringAddress(0x0A)
-#ticc1101.setPacketMode("PKT_LEN_VARIABLE")
-ticc1101.setPacketMode("PKT_LEN_FIXED")
-ticc1101.configureAddressFiltering("ENABLED_NO_BROADCAST")
+# Fixed packet length (PKTCTRL0), address 0x0A filtered without broadcast
+# (PKTCTRL1). Only the registers that differ from the chip are written, a
+# restart keeps it configured.
+ticc1101.attach(PROFILE)
 ticc1101._setRXState()
 
+if RELIABLE:
+    with ReliableLink(ticc1101) as link:
+        while True:
+            source, data = link.receive()
+            print("{:02x}: {}".format(source, binascii.hexlify(data)))
+
 while True:
-    ticc1101._setRXState()
-    ticc1101.recvData()
+    if gdo0 is not None:
+        packet = ticc1101.waitForPacket()
+    else:
+        ticc1101._setRXState()
+        packet = ticc1101.recvData()
+
+    if packet and capture is not None:
+        capture.write(packet)
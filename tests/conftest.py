@@ -0,0 +1,46 @@
+import sys
+
+import pytest
+
+from pycc1101.profile import PANSTAMP_PROFILE
+from pycc1101.pycc1101 import TICC1101
+from pycc1101.simulator import SimulatedAir, SimulatedCC1101
+
+
+@pytest.fixture(autouse=True, scope="session")
+def switchInterval():
+    # The simulated radios of a test run in threads of one process. With the
+    # default 5 ms GIL switch interval a thread can miss a FIFO refill that
+    # the chip would have received in time.
+    saved = sys.getswitchinterval()
+    sys.setswitchinterval(0.0001)
+    yield
+    sys.setswitchinterval(saved)
+
+
+@pytest.fixture
+def air(request):
+    # Lossless, or parametrized indirectly with a loss rate
+    return SimulatedAir(lossRate=getattr(request, "param", 0.0), seed=1)
+
+
+@pytest.fixture
+def makeRadio(air):
+    # Radios sharing one simulated air, configured with PANSTAMP_PROFILE
+    # and the given registers changed
+
+    def make(shadow=False, **registers):
+        radio = TICC1101(debug=False, shadow=shadow, spi=SimulatedCC1101(air))
+        radio.reset()
+        radio.applyProfile(PANSTAMP_PROFILE.copy("test", **registers))
+
+        return radio
+
+    return make
+
+
+@pytest.fixture
+def addressedPair(makeRadio):
+    # Variable length packets with address check, 0x21 sends to 0x0A
+    return (makeRadio(ADDR=0x21, PKTCTRL0=0x05, PKTCTRL1=0x05),
+            makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05))
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from pycc1101.aio import AsyncTICC1101
+
+PAYLOAD = [0x01, 0x02, 0x03, 0x04]
+
+
+def waitForPacket(radio):
+    # MCSM1.RXOFF_MODE is IDLE: RX ends with the packet
+    while radio._getMRStateMachineState() == 0x0D:
+        time.sleep(0.001)
+
+
+def test_send(makeRadio):
+    tx, rx = makeRadio(), makeRadio()
+    rx._setRXState()
+
+    async def send():
+        async with AsyncTICC1101(tx) as radio:
+            return await radio.send(PAYLOAD)
+
+    assert asyncio.run(send()) is True
+    waitForPacket(rx)
+    assert rx.recvData().payload[:4] == bytes(PAYLOAD)
+
+
+def test_recv(makeRadio):
+    tx, rx = makeRadio(), makeRadio()
+    rx._setRXState()
+    assert tx.sendData(PAYLOAD)
+    waitForPacket(rx)
+
+    async def recv():
+        async with AsyncTICC1101(rx) as radio:
+            return await radio.recv(timeout=1.0)
+
+    assert asyncio.run(recv()).payload[:4] == bytes(PAYLOAD)
+
+
+def test_close_does_not_block_the_loop(makeRadio):
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0.01)
+
+    async def close():
+        radio = AsyncTICC1101(makeRadio())
+        busy = asyncio.ensure_future(radio.run(time.sleep, 0.2))
+        ticker = asyncio.ensure_future(tick())
+        await asyncio.sleep(0)
+
+        async with radio:
+            pass
+
+        ticker.cancel()
+        await busy
+
+    asyncio.run(close())
+    assert len(ticks) > 5
+
+
+def test_send_to_address(makeRadio):
+    tx = makeRadio(ADDR=0x21, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    rx = makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    rx._setRXState()
+
+    async def send():
+        async with AsyncTICC1101(tx) as radio:
+            return await radio.send(PAYLOAD, 0x0A)
+
+    assert asyncio.run(send()) is True
+    waitForPacket(rx)
+
+    packet = rx.recvData()
+    assert packet.address == 0x0A and packet.payload == bytes(PAYLOAD)
+    assert tx._readSingleByte(tx.ADDR) == 0x21
@@ -0,0 +1,38 @@
+import csv
+import json
+
+import pytest
+
+from pycc1101 import bench
+
+
+def test_sweep_points():
+    points = bench.sweep([16, 32], [38400.0], ["fixed", "variable"], ["GFSK"])
+
+    assert len(points) == 4
+    assert len(set((point.length, point.mode) for point in points)) == 4
+
+
+def test_lossless_loopback():
+    points = bench.sweep([16], [38400.0], ["fixed", "variable"], ["GFSK"])
+    rows = bench.runLoopback(points, 20, seed=1)
+
+    assert [row["mode"] for row in rows] == ["fixed", "variable"]
+
+    for row in rows:
+        assert row["received"] == row["sent"] == 20
+        assert row["per"] == 0.0
+        assert row["goodput"] > 0
+
+
+@pytest.mark.parametrize("fmt", ("json", "csv"))
+def test_main_writes_the_results(tmp_path, fmt):
+    output = tmp_path / "bench.{}".format(fmt)
+    bench.main(["--loopback", "--lengths", "8", "--packets", "5", "--seed", "1", "--format", fmt,
+                "--output", str(output)])
+
+    with open(str(output)) as f:
+        rows = json.load(f) if fmt == "json" else list(csv.DictReader(f))
+
+    assert len(rows) == 1
+    assert int(rows[0]["received"]) == 5
@@ -0,0 +1,44 @@
+# Timings of the driver hot paths, compared between runs with
+#
+#   python -m pytest tests/test_benchmark.py --benchmark-autosave
+#   python -m pytest tests/test_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:10%
+#
+# The SPI transaction counts are checked by test_transactions.py.
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from pycc1101.benchmark import PAYLOAD, createRadio
+
+
+@pytest.fixture
+def link(air):
+    return createRadio(air, 50000, True, realtime=False), createRadio(air, 50000, True, realtime=False)
+
+
+def test_setDefaultValues(benchmark, link):
+    tx, rx = link
+
+    def setup():
+        tx.reset()
+
+    benchmark.pedantic(tx.setDefaultValues, setup=setup, rounds=50)
+
+
+def test_fifoFill(benchmark, link):
+    tx, rx = link
+    payload = list(range(64))
+
+    def setup():
+        # Every round starts with an empty TX FIFO, _writeBurst consumes its list
+        tx._flushTXFifo()
+        return (tx.TXFIFO, list(payload)), {}
+
+    benchmark.pedantic(tx._writeBurst, setup=setup, rounds=50)
+
+
+def test_sendData(benchmark, link):
+    tx, rx = link
+
+    assert benchmark.pedantic(tx.sendData, (list(PAYLOAD),), rounds=20) is True
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from pycc1101.capture import CaptureReader, CaptureWriter, capture, replay
+from pycc1101.packet import Packet
+
+
+def drain(radio):
+    payloads = []
+
+    while True:
+        packet = radio.get(0.1)
+
+        if packet is None:
+            return payloads
+
+        payloads.append(bytes(packet.payload))
+
+
+@pytest.mark.parametrize("timing", ("original", None))
+def test_replay_sends_to_the_captured_address(makeRadio, timing):
+    tx = makeRadio(ADDR=0x21, PKTCTRL0=0x05, PKTCTRL1=0x06)
+    receivers = dict((address, makeRadio(ADDR=address, PKTCTRL0=0x05, PKTCTRL1=0x05)) for address in (0x0A, 0x0B))
+    packets = [Packet(bytes([index]) * 5, address=0x0A if index % 2 else 0x0B, timestamp=index * 0.01)
+               for index in range(6)]
+
+    for radio in receivers.values():
+        radio.start_receiver()
+
+    try:
+        assert replay(tx, packets, timing=timing) == len(packets)
+        time.sleep(0.1)
+        received = dict((address, drain(radio)) for address, radio in receivers.items())
+    finally:
+        for radio in receivers.values():
+            radio.stop_receiver()
+
+    assert tx._readSingleByte(tx.ADDR) == 0x21
+    assert received == {0x0A: [packet.tobytes() for packet in packets[1::2]],
+                        0x0B: [packet.tobytes() for packet in packets[0::2]]}
+
+
+def test_capture_round_trip(addressedPair, tmp_path):
+    tx, rx = addressedPair
+    path = str(tmp_path / "traffic.cap")
+    payloads = [bytes([index]) * 8 for index in range(5)]
+
+    def send():
+        time.sleep(0.1)
+
+        for data in payloads:
+            tx.sendData(list(data), 0x0A)
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    written = capture(rx, path, count=len(payloads), timeout=1.0)
+    thread.join()
+
+    assert written == len(payloads)
+    assert rx.receiver is None
+
+    reader = CaptureReader(path)
+
+    assert [packet.tobytes() for packet in reader] == payloads
+    assert all(packet.address == 0x0A for packet in reader)
+
+
+def test_rewritten_captures_keep_their_timestamps(tmp_path):
+    first, second = str(tmp_path / "first.cap"), str(tmp_path / "second.cap")
+    monotonic = time.monotonic()
+
+    with CaptureWriter(first) as writer:
+        for index in range(3):
+            writer.write(Packet(bytes([index]), address=0x0A, timestamp=monotonic + index))
+
+    reader = CaptureReader(first)
+    timestamps = [packet.timestamp for packet in reader]
+
+    assert abs(timestamps[0] - time.time()) < 1.0
+
+    # Packets of a capture are already in UNIX time
+    with CaptureWriter(second) as writer:
+        for packet in reader.between(timestamps[1]):
+            writer.write(packet)
+
+    assert [packet.timestamp for packet in CaptureReader(second)] == timestamps[1:]
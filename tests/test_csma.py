@@ -0,0 +1,59 @@
+import time
+
+from pycc1101.csma import CsmaScheduler
+
+
+def drain(scheduler):
+    payloads = []
+
+    while True:
+        packet = scheduler.get(0.1)
+
+        if packet is None:
+            return payloads
+
+        payloads.append(bytes(packet.payload))
+
+
+def test_schedulers_share_the_channel(makeRadio):
+    radios = [makeRadio(PKTCTRL0=0x05) for _ in range(3)]
+    saved = [(radio._readRegister(radio.MCSM1), radio._readRegister(radio.AGCCTRL1)) for radio in radios]
+    schedulers = [CsmaScheduler(radio, seed=index) for index, radio in enumerate(radios)]
+
+    for scheduler in schedulers:
+        scheduler.start()
+
+    try:
+        futures = [scheduler.send(bytes([index, sequence]) * 4) for sequence in range(5)
+                   for index, scheduler in enumerate(schedulers)]
+        results = [future.result(10) for future in futures]
+    finally:
+        for scheduler in schedulers:
+            scheduler.stop()
+
+    stats = [scheduler.statistics() for scheduler in schedulers]
+
+    assert sum(results) == sum(item["sent"] for item in stats)
+    assert all(item["attempts"] >= item["sent"] + item["dropped"] for item in stats)
+    assert [(radio._readRegister(radio.MCSM1), radio._readRegister(radio.AGCCTRL1)) for radio in radios] == saved
+
+
+def test_keepReceived_runs_a_receiver(makeRadio):
+    a, b = makeRadio(PKTCTRL0=0x05), makeRadio(PKTCTRL0=0x05)
+    mcsm1 = a._readRegister(a.MCSM1)
+    first = CsmaScheduler(a, keepReceived=True, seed=1)
+    second = CsmaScheduler(b, keepReceived=True, seed=2)
+
+    with first, second:
+        # One after the other, packets sent at the same time may collide
+        assert first.sendAll([bytes([1, index]) * 4 for index in range(5)]) == [True] * 5
+        assert second.sendAll([bytes([2, index]) * 4 for index in range(5)]) == [True] * 5
+
+        time.sleep(0.1)
+        receivedByFirst = drain(first)
+        receivedBySecond = drain(second)
+
+    assert receivedByFirst == [bytes([2, index]) * 4 for index in range(5)]
+    assert receivedBySecond == [bytes([1, index]) * 4 for index in range(5)]
+    assert first.receiver is None
+    assert a._readRegister(a.MCSM1) == mcsm1
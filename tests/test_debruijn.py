@@ -0,0 +1,33 @@
+import pytest
+
+from pycc1101.debruijn import DeBruijnTransmitter, deBruijn, encode
+
+
+@pytest.mark.parametrize("n, k", ((1, 2), (3, 2), (8, 2), (4, 3)))
+def test_every_word_appears_once(n, k):
+    sequence = deBruijn(n, k)
+    linear = sequence + sequence[:n - 1]
+
+    assert len(sequence) == k ** n
+    assert len(set(tuple(linear[index:index + n]) for index in range(len(sequence)))) == k ** n
+
+
+def test_encode_packs_chips_msb_first():
+    assert encode([0, 1, 1], ("1000", "1110")) == (12, b"\x8e\xe0")
+
+
+def test_transmit_restores_the_radio(makeRadio, tmp_path):
+    radio = makeRadio()
+    before = radio.snapshot()
+    transmitter = DeBruijnTransmitter(radio, 8, "pwm", rate=20000, cacheDirectory=str(tmp_path))
+    result = transmitter.transmit()
+
+    assert result["sent"] is True
+    assert result["chips"] == (2 ** 8 + 7) * 4
+    assert result["seconds"] >= result["minimumSeconds"] * 0.9
+    assert result["naiveSeconds"] > result["minimumSeconds"]
+    assert [(address, value) for address, value in enumerate(radio.snapshot())
+            if address not in radio.SHADOW_VOLATILE] == [(address, value) for address, value in enumerate(before)
+                                                         if address not in radio.SHADOW_VOLATILE]
+    assert len(list(tmp_path.iterdir())) == 1
+    assert DeBruijnTransmitter(radio, 8, "pwm", cacheDirectory=str(tmp_path)).bitstream() == transmitter.bitstream()
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from pycc1101.gpio import PipeEventSource
+
+
+@pytest.fixture
+def gdo0():
+    source = PipeEventSource(edge="both")
+    yield source
+    source.close()
+
+
+@pytest.fixture
+def receiver(makeRadio, gdo0):
+    # IOCFG0 = 0x06: GDO0 falls at the end of the packet
+    radio = makeRadio()
+    radio.gdo0 = gdo0
+    radio._spi.attachGDO0(gdo0.setLevel)
+
+    return radio
+
+
+def test_waitForPacket(makeRadio, receiver):
+    tx = makeRadio()
+    sender = threading.Timer(0.01, tx.sendData, ([0x01, 0x02, 0x03, 0x04],))
+    sender.start()
+
+    try:
+        data = receiver.waitForPacket(timeout=1.0)
+    finally:
+        sender.join()
+
+    assert data.payload[:4] == bytes([0x01, 0x02, 0x03, 0x04])
+    assert data.crcOk is True
+
+
+def test_waitForPacket_timeout(receiver):
+    assert receiver.waitForPacket(timeout=0.02) is None
@@ -0,0 +1,43 @@
+import pytest
+from concurrent.futures import CancelledError
+
+from pycc1101.group import RadioGroup
+
+
+@pytest.fixture
+def group(makeRadio):
+    group = RadioGroup()
+    group.add(makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05), "tx", bus=0)
+    group.add(makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05), "rx", bus=0)
+    yield group
+    group.stop()
+
+
+def test_sent_packets_reach_the_merged_stream(group):
+    group.start(receive=["rx"], transmit=["tx"])
+
+    assert group.sendAll([[index] * 4 for index in range(5)]) == [True] * 5
+
+    for index in range(5):
+        packet = group.get(timeout=1.0)
+
+        assert bytes(packet.payload) == bytes([index] * 4)
+        assert packet.source == "rx"
+
+    assert group.radios["tx"].busLock is group.radios["rx"].busLock
+    assert group.statistics()["sent"] == {"tx": 5, "rx": 0}
+
+
+def test_stop_cancels_queued_sends(group):
+    group.start(receive=[], transmit=[])
+    shared = group.send([1, 2, 3])
+    own = group.send([4, 5, 6], radio="tx")
+    group.stop()
+
+    for future in (shared, own):
+        assert future.cancelled()
+
+        with pytest.raises(CancelledError):
+            future.result(timeout=0)
+
+    assert group.get(timeout=0) is None
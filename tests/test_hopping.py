@@ -0,0 +1,24 @@
+from pycc1101.hopping import HoppingScheduler
+
+
+def test_hop_writes_channel_and_cached_calibration(makeRadio, tmp_path):
+    radio = makeRadio()
+    cachePath = str(tmp_path / "fscal.json")
+    hopping = HoppingScheduler(radio, [0, 5, 10], cachePath=cachePath)
+
+    with hopping:
+        assert radio._readRegister(radio.MCSM0) & 0x30 == 0
+
+        for channel in (0, 5, 10, 0):
+            hopping.hop()
+            assert radio._readRegister(radio.CHANNR) == channel
+            assert tuple(radio._readBurst(radio.FSCAL3, 3)) == hopping.table[channel]
+            assert radio._getMRStateMachineState() == 0x0D
+
+    assert radio._readRegister(radio.MCSM0) == 0x18
+    assert hopping.calibrations == 3 and hopping.hops == 4
+
+    # A second scheduler reads the table from the cache file
+    cached = HoppingScheduler(radio, [0, 5, 10], cachePath=cachePath)
+    cached.calibrate()
+    assert cached.calibrations == 0 and cached.table == hopping.table
@@ -0,0 +1,45 @@
+import threading
+
+from pycc1101.instrumentation import Histogram, Instrumentation
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+
+    for microseconds in range(1, 1001):
+        histogram.record(microseconds * 1e-6)
+
+    assert histogram.count == 1000
+    assert abs(histogram.percentile(50) - 500e-6) < 500e-6 / 32
+    assert abs(histogram.percentile(99) - 990e-6) < 990e-6 / 32
+    assert histogram.percentile(100) == 1000e-6
+
+
+def test_send_and_receive_are_recorded(makeRadio):
+    tx = makeRadio()
+    rx = makeRadio()
+    tx.instrumentation = Instrumentation()
+    rx.instrumentation = Instrumentation()
+
+    rx._setRXState()
+    sender = threading.Thread(target=tx.sendData, args=([0x0A, 1, 2, 3],))
+    sender.start()
+    sender.join()
+
+    while rx.recvData() is None:
+        pass
+
+    sent = tx.instrumentation.snapshot()
+    assert sent["operations"]["sendData"]["count"] == 1
+    assert sent["operations"]["sendData.fifoLoad"]["count"] == 1
+    assert sent["transfers"]["_writeBurst"] == 1
+    assert sent["transfers"]["_snop"] > 0
+
+    rx.sidle()
+    rx._getMRStateMachineState()
+    rx._setRXState()
+    rx._getMRStateMachineState()
+    assert list(rx.instrumentation.snapshot()["transitions"])[0].startswith("0x01->")
+
+    text = rx.instrumentation.toPrometheus(labels={"radio": "rx"})
+    assert 'pycc1101_operation_seconds_count{operation="recvData",radio="rx"}' in text
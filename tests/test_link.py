@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from pycc1101.link import ReliableLink, sequenceDistance
+
+
+def test_sequenceDistance():
+    assert sequenceDistance(5, 3) == 2
+    assert sequenceDistance(3, 5) == -2
+    assert sequenceDistance(1, 0xFFFF) == 2
+
+
+def transfer(sender, receiver, count):
+    payloads = [bytes([index]) * 10 for index in range(count)]
+    received = []
+
+    def receive():
+        while len(received) < count:
+            message = receiver.receive(5.0)
+
+            if message is None:
+                break
+
+            received.append(message)
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    results = sender.sendAll(payloads, 0x0A)
+    thread.join()
+
+    return payloads, results, received
+
+
+def test_lossless_link_has_no_timeouts(addressedPair):
+    tx, rx = addressedPair
+
+    # A window is drained and refilled over the 50 kHz SPI clock while it is
+    # on air, at a quarter of the panStamp data rate a stall of the test
+    # process neither overflows nor underflows a FIFO
+    for radio in (tx, rx):
+        radio.setDataRate(9600)
+
+    with ReliableLink(tx) as sender, ReliableLink(rx) as receiver:
+        payloads, results, received = transfer(sender, receiver, 40)
+        stats = sender.statistics()
+
+    assert all(results)
+    assert received == [(0x21, payload) for payload in payloads]
+    assert stats["timeouts"] == 0
+    assert stats["retransmissions"] == 0
+    assert stats["acksReceived"] == receiver.acksSent
+    assert stats["rtt"]["count"] == stats["acksReceived"]
+
+
+@pytest.mark.parametrize("air", (0.1,), indirect=True)
+def test_lossy_link_delivers_in_order(addressedPair):
+    tx, rx = addressedPair
+
+    with ReliableLink(tx) as sender, ReliableLink(rx) as receiver:
+        payloads, results, received = transfer(sender, receiver, 40)
+
+    assert all(results)
+    assert received == [(0x21, payload) for payload in payloads]
@@ -0,0 +1,111 @@
+import time
+
+from pycc1101.profile import ConfigurationProfile, PANSTAMP_PROFILE
+
+# SmartRF Studio 7 export of a CC1101 at 433.92 MHz, GFSK 38.4 kBaud, with
+# the "SmartRF_CC1101.h" template
+SMARTRF_HEADER = """\
+/***************************************************************
+ *  SmartRF Studio(tm) Export
+ *
+ *  Radio register settings specifed with C-code
+ *  compatible #define statements.
+ *
+ *  RF device: CC1101
+ *
+ ***************************************************************/
+
+#ifndef SMARTRF_CC1101_H
+#define SMARTRF_CC1101_H
+
+#define SMARTRF_RADIO_CC1101
+#define SMARTRF_SETTING_IOCFG0           0x06
+#define SMARTRF_SETTING_FIFOTHR          0x47
+#define SMARTRF_SETTING_PKTCTRL0         0x05
+#define SMARTRF_SETTING_FSCTRL1          0x06
+#define SMARTRF_SETTING_FREQ2            0x10
+#define SMARTRF_SETTING_FREQ1            0xB0
+#define SMARTRF_SETTING_FREQ0            0x71
+#define SMARTRF_SETTING_MDMCFG4          0xCA
+#define SMARTRF_SETTING_MDMCFG3          0x83
+#define SMARTRF_SETTING_MDMCFG2          0x13
+#define SMARTRF_SETTING_DEVIATN          0x35
+#define SMARTRF_SETTING_MCSM0            0x18
+#define SMARTRF_SETTING_FOCCFG           0x16
+#define SMARTRF_SETTING_AGCCTRL2         0x43
+#define SMARTRF_SETTING_WORCTRL          0xFB
+#define SMARTRF_SETTING_FSCAL3           0xE9
+#define SMARTRF_SETTING_FSCAL2           0x2A
+#define SMARTRF_SETTING_FSCAL1           0x00
+#define SMARTRF_SETTING_FSCAL0           0x1F
+#define SMARTRF_SETTING_TEST2            0x81
+#define SMARTRF_SETTING_TEST1            0x35
+#define SMARTRF_SETTING_TEST0            0x09
+
+#endif
+"""
+
+SMARTRF_HEADER_VALUES = {
+    "IOCFG0": 0x06, "FIFOTHR": 0x47, "PKTCTRL0": 0x05, "FSCTRL1": 0x06,
+    "FREQ2": 0x10, "FREQ1": 0xB0, "FREQ0": 0x71, "MDMCFG4": 0xCA,
+    "MDMCFG3": 0x83, "MDMCFG2": 0x13, "DEVIATN": 0x35, "MCSM0": 0x18,
+    "FOCCFG": 0x16, "AGCCTRL2": 0x43, "WORCTRL": 0xFB, "FSCAL3": 0xE9,
+    "FSCAL2": 0x2A, "FSCAL1": 0x00, "FSCAL0": 0x1F, "TEST2": 0x81,
+    "TEST1": 0x35, "TEST0": 0x09,
+}
+
+# Register view export: name, address, value and description
+SMARTRF_TABLE = """\
+Name      Address  Value  Description
+IOCFG2    0x0000   0x29   GDO2 Output Pin Configuration
+SYNC1     0x0004   0xD3   Sync Word, High Byte
+ADDR      0x0009   0x0A   Device Address
+CHANNR    0x000A   0x00   Channel Number
+FREQ2     0x000D   0x10   Frequency Control Word, High Byte
+PA_TABLE0 0x003E   0xC0   PA Power Setting 0
+"""
+
+
+def test_smartrf_header_export():
+    profile = ConfigurationProfile.fromSmartRFText(SMARTRF_HEADER, "header")
+
+    assert profile.toDict() == SMARTRF_HEADER_VALUES
+    assert profile.name == "header"
+
+
+def test_smartrf_register_table():
+    profile = ConfigurationProfile.fromSmartRFText(SMARTRF_TABLE)
+
+    assert profile.toDict() == {"IOCFG2": 0x29, "SYNC1": 0xD3, "ADDR": 0x0A, "CHANNR": 0x00, "FREQ2": 0x10,
+                                "PATABLE": [0xC0]}
+
+
+def test_panstamp_profile_keeps_the_address():
+    assert "ADDR" not in PANSTAMP_PROFILE
+    assert PANSTAMP_PROFILE.copy("addressed", ADDR=0x0A)["ADDR"] == 0x0A
+
+
+def test_snapshot_is_one_burst(makeRadio):
+    radio = makeRadio()
+
+    assert radio.snapshot() == [radio._readSingleByte(address) for address in range(radio.TEST0 + 1)]
+
+
+def test_attach_leaves_the_calibration_alone(makeRadio):
+    radio = makeRadio()
+    profile = PANSTAMP_PROFILE.copy("test")
+    radio._setRXState()
+    time.sleep(0.01)
+    calibration = radio._readBurst(radio.FSCAL3, 3)
+
+    # The calibration differs from the profile, the chip is still taken over
+    assert calibration != [profile.registers[address] for address in radio.SHADOW_VOLATILE]
+    assert radio.attach(profile) == 0
+    assert radio._getMRStateMachineState() == 0x0D
+
+    # FREND0 and FSCAL0 are rewritten in two runs, not bridged over FSCAL3..1
+    changed = profile.copy("changed", FREND0=0x11, FSCAL0=0x1D)
+    assert radio.attach(changed) == 2
+    assert radio._readRegister(radio.FREND0) == 0x11
+    assert radio._readRegister(radio.FSCAL0) == 0x1D
+    assert radio._readBurst(radio.FSCAL3, 3) == calibration
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from pycc1101.packet import Packet, packetDtype, packetsToArray
+from pycc1101.receiver import BackgroundReceiver
+
+
+@pytest.fixture
+def receiver(makeRadio):
+    radio = makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    receiver = BackgroundReceiver(radio)
+    yield receiver
+    receiver.stop()
+
+
+def test_receives_addressed_packets(makeRadio, receiver):
+    # The packets of 0x0B are discarded by the address check, they must not
+    # shift the framing of the packets of 0x0A
+    own = makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    foreign = makeRadio(ADDR=0x0B, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    receiver.start()
+
+    for index in range(5):
+        assert foreign.sendData([0xEE] * 12)
+        assert own.sendData([index] * (index + 1))
+
+    for index in range(5):
+        packet = receiver.ring.get(timeout=1.0)
+
+        assert bytes(packet.payload) == bytes([index] * (index + 1))
+        assert packet.address == 0x0A
+        assert packet.crcOk is True
+
+    assert receiver.packetsReceived == 5
+
+
+def test_length_above_PKTLEN_is_flushed(receiver):
+    radio = receiver.radio
+    radio._setRXState()
+    # A stray length byte, e.g. after the FIFO lost its framing
+    radio._spi.rxFifo.extend([0x40, 0x0A, 0x01, 0x02])
+
+    assert receiver._drain() is False
+    assert receiver.lengthErrors == 1
+    assert receiver._pendingLength is None
+    assert radio._readSingleByte(radio.RXBYTES) == 0
+    assert radio._getMRStateMachineState() == 0x0D
+
+
+def test_get_array(makeRadio):
+    numpy = pytest.importorskip("numpy")
+    tx = makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    rx = makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05)
+    rx.start_receiver()
+
+    try:
+        for index in range(3):
+            assert tx.sendData([index] * (index + 1))
+
+        deadline = time.monotonic() + 1.0
+
+        while len(rx.receiver.ring) < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        array = rx.get_array(maxPayload=8)
+    finally:
+        rx.stop_receiver()
+
+    assert array.dtype == packetDtype(8)
+    assert list(array["length"]) == [1, 2, 3]
+    assert [list(row[:length]) for row, length in zip(array["payload"], array["length"])] == [[0], [1, 1], [2, 2, 2]]
+    assert list(array["address"]) == [0x0A] * 3
+    assert list(array["channel"]) == [0] * 3
+    assert array["crcOk"].all()
+    assert numpy.isfinite(array["rssi"]).all()
+    assert (numpy.diff(array["timestamp"]) > 0).all()
+
+
+def test_packetsToArray():
+    numpy = pytest.importorskip("numpy")
+    packets = [Packet(b"\x01\x02", -60.5, 12, True, 0x0A, 3, 1.5), Packet(b"\x03")]
+    array = packetsToArray(packets, maxPayload=4)
+
+    assert list(array["length"]) == [2, 1]
+    assert list(array["payload"][0]) == [1, 2, 0, 0]
+    assert list(array["address"]) == [0x0A, -1]
+    assert list(array["lqi"]) == [12, -1]
+    assert array["rssi"][0] == -60.5 and numpy.isnan(array["rssi"][1])
+    assert numpy.isnan(array["timestamp"][1])
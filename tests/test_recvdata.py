@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pycc1101.aio import AsyncTICC1101
+
+COUNT = 10
+
+
+def payloads(length=12):
+    return [bytes([index]) * length for index in range(COUNT)]
+
+
+def sendLater(radio, packets, address=None, delay=0.05, gap=0.02):
+    def run():
+        time.sleep(delay)
+
+        for data in packets:
+            radio.sendData(list(data), address)
+            time.sleep(gap)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+
+    return thread
+
+
+def pollPackets(radio, count, timeout=3.0):
+    # The loop of rx.py without GDO0
+    packets = []
+    deadline = time.monotonic() + timeout
+
+    while len(packets) < count and time.monotonic() < deadline:
+        radio._setRXState()
+        packet = radio.recvData()
+
+        if packet:
+            packets.append(packet)
+
+        time.sleep(0.0005)
+
+    return packets
+
+
+@pytest.mark.parametrize("registers", (
+    {"PKTCTRL0": 0x04},
+    {"PKTCTRL0": 0x05},
+    {"PKTCTRL0": 0x05, "MCSM1": 0x2C},
+), ids=("fixed", "variable", "variableRxoffRx"))
+def test_recvData_returns_complete_packets(makeRadio, registers):
+    tx = makeRadio(ADDR=0x21, PKTCTRL1=0x05, **registers)
+    rx = makeRadio(ADDR=0x0A, PKTCTRL1=0x05, **registers)
+    thread = sendLater(tx, payloads(), 0x0A)
+    packets = pollPackets(rx, COUNT)
+    thread.join()
+
+    assert [packet.payload[:12] for packet in packets] == payloads()
+    assert all(packet.crcOk for packet in packets)
+
+
+def test_async_recv_without_gdo0(addressedPair):
+    tx, rx = addressedPair
+    radio = AsyncTICC1101(rx)
+
+    async def receive():
+        packets = []
+
+        while len(packets) < COUNT:
+            packet = await radio.recv(1.0)
+
+            if packet is None:
+                break
+
+            packets.append(packet)
+
+        return packets
+
+    thread = sendLater(tx, payloads(), 0x0A)
+    packets = asyncio.run(receive())
+    thread.join()
+
+    assert [bytes(packet.payload) for packet in packets] == payloads()
+    assert all(packet.crcOk for packet in packets)
+
+
+@pytest.mark.parametrize("length, complete", ((16, False), (22, True)))
+def test_saturated_count_in_idle(makeRadio, length, complete):
+    # Fixed 20 byte packets and 2 status bytes: the status byte count
+    # saturates, RXBYTES tells an aborted packet from a complete one
+    radio = makeRadio()
+    radio.sidle()
+    radio._spi.rxFifo.extend(range(length))
+    packet = radio.recvData()
+
+    if complete:
+        assert packet.payload == bytes(range(20))
+    else:
+        assert packet is None
+
+    assert radio._readSingleByte(radio.RXBYTES) == 0
+
+
+def test_overflow_is_flushed(makeRadio):
+    radio = makeRadio()
+    spi = radio._spi
+    radio._setRXState()
+
+    with spi._lock:
+        # Drop a calibration still pending, it would enter RX afterwards
+        spi._pending = None
+        spi.rxFifo.extend([0x00] * 64)
+        spi.rxOverflow = True
+        spi.state = spi.RXFIFO_OVERFLOW
+
+    assert radio.recvData() is None
+    assert radio._readSingleByte(radio.RXBYTES) == 0
+    assert radio._getMRStateMachineState() == 0x0D
+
+
+def test_length_above_PKTLEN_is_flushed(makeRadio):
+    radio = makeRadio(PKTCTRL0=0x05)
+    radio._setRXState()
+    radio._spi.rxFifo.extend([0x40, 0x01, 0x02])
+
+    assert radio.recvData() is None
+    assert radio._rxPendingLength is None
+    assert radio._readSingleByte(radio.RXBYTES) == 0
+    assert radio._getMRStateMachineState() == 0x0D
@@ -0,0 +1,50 @@
+import pytest
+
+from pycc1101.registers import FIELDS
+
+
+def test_field_codec():
+    field = FIELDS["MOD_FORMAT"]
+
+    assert field.encode("MSK", 0x13) == 0x73
+    assert field.decode(0x73) == "MSK"
+    assert field.decode(0x13) == "GFSK"
+    assert FIELDS["MANCHESTER_EN"].decode(0x08) is True
+
+    with pytest.raises(Exception):
+        field.encode("QPSK")
+
+    with pytest.raises(Exception):
+        FIELDS["SYNC_MODE"].encode(8)
+
+
+@pytest.mark.parametrize("shadow", (True, False), ids=("shadow", "noShadow"))
+def test_configure_writes_each_register_once(makeRadio, shadow):
+    radio = makeRadio(shadow=shadow)
+    mdmcfg2 = radio._readRegister(radio.MDMCFG2)
+
+    with radio.configure() as cfg:
+        cfg["MOD_FORMAT"] = "2-FSK"
+        cfg["SYNC_MODE"] = 2
+        cfg["MANCHESTER_EN"] = True
+        cfg["ADR_CHK"] = "ENABLED_NO_BROADCAST"
+        assert cfg["SYNC_MODE"] == 2
+
+    # MDMCFG2 and PKTCTRL1 are too far apart for one burst
+    assert cfg.transfers == 2
+    assert radio._readRegister(radio.MDMCFG2) == (mdmcfg2 & 0x80) | 0x0A
+    assert radio.getField("ADR_CHK") == "ENABLED_NO_BROADCAST"
+
+    with radio.configure() as cfg:
+        cfg["MOD_FORMAT"] = "2-FSK"
+
+    assert cfg.transfers == 0
+
+
+def test_decodeRegisters(makeRadio):
+    radio = makeRadio(PKTCTRL1=0x05)
+    registers = radio.decodeRegisters(status=True)
+
+    assert registers["PKTCTRL1"]["ADR_CHK"] == "ENABLED_NO_BROADCAST"
+    assert registers["PKTCTRL1"]["APPEND_STATUS"] is True
+    assert registers["MARCSTATE"]["MARC_STATE"] == radio._getMRStateMachineState()
@@ -0,0 +1,31 @@
+import pytest
+
+PAYLOADS = [[index] * 12 for index in range(3)]
+
+
+@pytest.fixture
+def pair(makeRadio):
+    # Variable length packets with address check, sent to 0x0A
+    return (makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05),
+            makeRadio(ADDR=0x0A, PKTCTRL0=0x05, PKTCTRL1=0x05))
+
+
+# MCSM1.TXOFF_MODE and the MARCSTATE the radio is left in
+@pytest.mark.parametrize("offMode, marcstate", ((3, 0x0D), (0, 0x01), (1, 0x12)), ids=("RX", "IDLE", "FSTXON"))
+@pytest.mark.parametrize("count", (1, 2, 3))
+def test_sendMany_ends_in_txoff_mode(pair, offMode, marcstate, count):
+    tx, rx = pair
+    mcsm1 = (tx._readRegister(tx.MCSM1) & 0xFC) | offMode
+    tx._writeSingleByte(tx.MCSM1, mcsm1)
+    receiver = rx.start_receiver()
+
+    try:
+        stats = tx.sendMany(PAYLOADS[:count])
+        received = [receiver.ring.get(0.5) for _ in range(count)]
+    finally:
+        rx.stop_receiver()
+
+    assert stats["results"] == [True] * count
+    assert tx._getMRStateMachineState() == marcstate
+    assert [bytes(packet.payload) for packet in received] == [bytes(payload) for payload in PAYLOADS[:count]]
+    assert tx._readRegister(tx.MCSM1) == mcsm1
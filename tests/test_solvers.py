@@ -0,0 +1,53 @@
+import pytest
+
+from pycc1101 import solvers
+
+
+@pytest.mark.parametrize("freq, registers", [
+    (433e6, [0x10, 0xA7, 0x62]),
+    (868e6, [0x21, 0x62, 0x76]),
+])
+def test_carrier_frequency_presets(makeRadio, freq, registers):
+    radio = makeRadio()
+    achieved = radio.setCarrierFrequency(freq)
+
+    assert radio._readBurst(radio.FREQ2, 3) == registers
+    assert abs(achieved - freq) < 400
+    assert radio.getCarrierFrequency() == achieved
+
+
+def test_carrier_frequency_in_hz(makeRadio):
+    radio = makeRadio()
+    achieved = radio.setCarrierFrequency(915e6)
+
+    assert abs(achieved - 915e6) < 400
+    assert radio.getCarrierFrequency() == achieved
+
+    # MHz values are outside the bands
+    with pytest.raises(Exception):
+        radio.setCarrierFrequency(433)
+
+
+def test_setters_only_touch_their_fields(makeRadio):
+    radio = makeRadio()
+    mdmcfg4 = radio._readRegister(radio.MDMCFG4)
+
+    assert abs(radio.setDataRate(38400) - 38400) < 38400 * 0.01
+    assert radio._readRegister(radio.MDMCFG4) & 0xF0 == mdmcfg4 & 0xF0
+    assert radio.getDataRate() == pytest.approx(38400, rel=0.01)
+
+    bandwidth = radio.setRXBandwidth(100e3)
+    assert radio.getRXBandwidth() == bandwidth
+    assert radio.getDataRate() == pytest.approx(38400, rel=0.01)
+
+    assert radio.getDeviation() == radio.setDeviation(20e3)
+    assert radio.getChannelSpacing() == radio.setChannelSpacing(200e3)
+
+
+def test_airtime():
+    # 4 preamble and 4 sync bytes (30/32 sync), 10 bytes of packet
+    assert solvers.airtime(10, 0x22, 0x03, 38400) == pytest.approx(8.0 * 18 / 38400)
+    # Manchester doubles the symbols
+    assert solvers.airtime(10, 0x22, 0x0B, 38400) == pytest.approx(16.0 * 18 / 38400)
+    # FEC: 2 * (10 + 1) rounded up to the 4 byte interleaver block
+    assert solvers.airtime(10, 0xA2, 0x03, 38400) == pytest.approx(8.0 * 32 / 38400)
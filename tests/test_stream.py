@@ -0,0 +1,27 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize("length", (10, 1000))
+def test_send_stream(makeRadio, length):
+    # 1000 bytes need several TX FIFO refills and RX FIFO drains. Every
+    # refill must land within the FIFO threshold margin, at a quarter of the
+    # panStamp data rate (DRATE_E 8) a stall of the test process does not
+    # underflow it
+    tx, rx = makeRadio(MDMCFG4=0xC8), makeRadio(MDMCFG4=0xC8)
+    data = bytes(index & 0xFF for index in range(length))
+    received = []
+
+    thread = threading.Thread(target=lambda: received.extend(rx.recv_stream(len(data), timeout=2.0)))
+    thread.start()
+    time.sleep(0.05)
+
+    assert tx.send_stream(data) is True
+
+    thread.join()
+
+    assert b"".join(received) == data
+    assert tx._readRegister(tx.PKTCTRL0) == 0x04
+    assert rx._readRegister(rx.PKTCTRL0) == 0x04
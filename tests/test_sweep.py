@@ -0,0 +1,43 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from pycc1101.sweep import SpectrumSweep
+
+
+def test_sweep_reads_the_noise_floor(makeRadio):
+    radio = makeRadio()
+    mcsm0 = radio._readRegister(radio.MCSM0)
+    result = radio.sweep([0, 1, 2, 3], dwell_us=100, passes=3)
+
+    assert result.dbm.shape == (3, 4)
+    assert result.dbm.dtype == numpy.float32
+    assert numpy.allclose(result.dbm, -100, atol=1)
+    assert result.timestamps.shape == (3,)
+    assert len(result.quietest(2)) == 2
+
+    # Registers are restored after the sweep
+    assert radio._readRegister(radio.MCSM0) == mcsm0
+    assert radio._readRegister(radio.CHANNR) == 0
+
+
+def test_sweep_costs_one_transfer_per_step(makeRadio):
+    radio = makeRadio()
+    sweep = SpectrumSweep(radio, frequencies=[433e6, 434e6], dwell_us=100)
+
+    sweep.sweep(passes=2)
+    assert sweep.transfers == 2 * 2 + 1
+    assert sweep.waterfall.shape == (sweep.historyLength, 2)
+    assert numpy.isnan(sweep.waterfall[:-2]).all()
+
+
+def test_stream_to_file(makeRadio, tmp_path):
+    radio = makeRadio()
+    sweep = SpectrumSweep(radio, channels=[0, 1], dwell_us=100)
+    path = str(tmp_path / "sweep.bin")
+
+    rows = list(sweep.stream(path, passes=3))
+    records = numpy.fromfile(path, dtype=sweep.recordDtype)
+
+    assert len(records) == 3
+    assert numpy.array_equal(records["dbm"], numpy.array([dbm for timestamp, dbm in rows]))
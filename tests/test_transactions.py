@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+from pycc1101.benchmark import PAYLOAD, createRadio
+from pycc1101.pycc1101 import RadioTimeoutError, TICC1101
+
+# SPI transactions of the benchmark operations, see pycc1101.benchmark. The
+# waits of sendData poll the chip, their count depends on the scheduling:
+# it is an upper bound.
+TRANSACTIONS = {
+    True: {"sendData": 5, "recvData": 5, "setDefaultValues": 3},
+    False: {"sendData": 17, "recvData": 9, "setDefaultValues": 3},
+}
+
+
+@pytest.fixture(params=(True, False), ids=("shadow", "noShadow"))
+def shadow(request):
+    return request.param
+
+
+@pytest.fixture
+def link(air, shadow):
+    return createRadio(air, 50000, shadow), createRadio(air, 50000, shadow)
+
+
+def armReceiver(radio):
+    radio.sidle()
+    radio._flushRXFifo()
+    radio._setRXState()
+
+
+def waitForPacket(radio):
+    # MCSM1.RXOFF_MODE is IDLE: RX ends with the packet
+    while radio._getMRStateMachineState() == 0x0D:
+        time.sleep(0.001)
+
+
+def transactions(radio, operation):
+    radio._spi.resetCounters()
+    result = operation()
+
+    return result, radio._spi.transactions
+
+
+def test_setDefaultValues(link, shadow):
+    tx, rx = link
+    tx.reset()
+    result, count = transactions(tx, tx.setDefaultValues)
+
+    assert count == TRANSACTIONS[shadow]["setDefaultValues"]
+
+
+def test_sendData(link, shadow):
+    tx, rx = link
+
+    for _ in range(3):
+        armReceiver(rx)
+        result, count = transactions(tx, lambda: tx.sendData(list(PAYLOAD)))
+
+        assert result is True
+        assert count <= TRANSACTIONS[shadow]["sendData"]
+
+
+def test_recvData(link, shadow):
+    tx, rx = link
+
+    for _ in range(3):
+        armReceiver(rx)
+        assert tx.sendData(list(PAYLOAD))
+        waitForPacket(rx)
+        packet, count = transactions(rx, rx.recvData)
+
+        assert packet.payload[:len(PAYLOAD)] == bytes(PAYLOAD)
+        assert packet.address == 0x0A
+        assert packet.crcOk is True
+        assert count == TRANSACTIONS[shadow]["recvData"]
+
+
+class _DrainingFifo(object):
+    # Every read of TXBYTES returns step bytes less, as when the FIFO drains
+    # faster than the register is read
+    max_speed_hz = 50000
+
+    def __init__(self, step):
+        self.step = step
+        self.value = 60
+        self.reads = 0
+
+    def xfer(self, data):
+        self.reads += 1
+        self.value -= self.step
+
+        return [0x0F, self.value]
+
+
+@pytest.mark.parametrize("step, reads, value", ((1, 2, 58), (3, 1 + TICC1101.FIFO_READ_RETRIES, 48)))
+def test_readFifoBytes_is_bounded(step, reads, value):
+    spi = _DrainingFifo(step)
+    radio = TICC1101(debug=False, spi=spi)
+
+    assert radio._readFifoBytes(radio.TXBYTES) == value
+    assert spi.reads == reads
+
+
+def test_wait_timeout_recovers(makeRadio):
+    radio = makeRadio()
+    radio._setRXState()
+
+    with pytest.raises(RadioTimeoutError) as raised:
+        radio._waitChipState((radio.STATE_TX,), 0.01, "test")
+
+    assert raised.value.operation == "test"
+    assert raised.value.state == radio.STATE_RX
+    assert radio.chipState() == radio.STATE_IDLE
+
+
+class _RecordingSpi(object):
+    # Records what every transfer sent, as bytes
+    max_speed_hz = 50000
+
+    def __init__(self):
+        self.transfers = []
+        self.writes = []
+
+    def xfer2(self, data):
+        self.transfers.append(bytes(data))
+        return [0x0F] * len(data)
+
+    def writebytes2(self, data):
+        self.writes.append(bytes(data))
+
+
+@pytest.mark.parametrize("data", ([1, 2, 3], b"\x01\x02\x03", bytearray(b"\x01\x02\x03"),
+                                  memoryview(b"\x00\x01\x02\x03")[1:]), ids=("list", "bytes", "bytearray", "view"))
+def test_writeBurst_copies_the_data(data):
+    spi = _RecordingSpi()
+    radio = TICC1101(debug=False, spi=spi)
+    saved = bytes(data)
+
+    radio._writeBurst(radio.TXFIFO, data, before=radio.SRX)
+    radio._writeBurst(radio.TXFIFO, data, status=False)
+
+    assert bytes(data) == saved
+    assert spi.transfers == [bytes((radio.SRX, radio.WRITE_BURST | radio.TXFIFO)) + saved]
+    assert spi.writes == [bytes((radio.WRITE_BURST | radio.TXFIFO,)) + saved]
@@ -0,0 +1,63 @@
+import pytest
+
+from pycc1101.packet import Packet
+from pycc1101.transport import FRAGMENT_HEADER, MessageTransport
+
+MESSAGE = bytes(range(256)) * 2
+
+
+def test_message_round_trip(addressedPair):
+    tx, rx = addressedPair
+
+    # 40 fragments back to back: the receiver thread must drain the RX FIFO
+    # every ~2.5 packets, at half the panStamp data rate a stall of the test
+    # process does not overflow it
+    for radio in (tx, rx):
+        radio.setDataRate(19200)
+
+    sender = MessageTransport(tx)
+    receiver = MessageTransport(rx)
+    rx.start_receiver()
+
+    try:
+        assert sender.send(MESSAGE, 0x0A)
+        message = receiver.receive(2.0)
+    finally:
+        rx.stop_receiver()
+
+    assert message.data == MESSAGE
+    assert message.source == 0x21
+    assert message.fragments == len(sender.fragments(MESSAGE))
+    # The destination is the packet address byte, ADDR is left alone
+    assert tx._readRegister(tx.ADDR) == 0x21
+    assert receiver.statistics()["fragmentLoss"] == 0.0
+
+
+def test_fragments_in_any_order(makeRadio):
+    transport = MessageTransport(makeRadio(PKTCTRL0=0x05), address=0x21)
+    fragments = transport.fragments(MESSAGE, messageId=7)
+    capacity = transport.fragmentCapacity()
+
+    assert all(len(fragment) <= FRAGMENT_HEADER.size + capacity for fragment in fragments)
+
+    results = [transport.feed(Packet(fragment, crcOk=True)) for fragment in reversed(fragments)]
+    assert results[:-1] == [None] * (len(fragments) - 1)
+    assert results[-1].data == MESSAGE
+
+    assert transport.feed(Packet(fragments[0], crcOk=True)) is None
+    assert transport.duplicates == 1
+
+
+def test_oldest_partial_is_evicted(makeRadio):
+    transport = MessageTransport(makeRadio(PKTCTRL0=0x05), address=0x21, slots=1)
+    first = transport.fragments(MESSAGE, messageId=1)
+    second = transport.fragments(MESSAGE, messageId=2)
+
+    transport.feed(Packet(first[0], crcOk=True))
+    transport.feed(Packet(second[0], crcOk=True))
+
+    stats = transport.statistics()
+    assert stats["evictions"] == 1
+    assert stats["messagesLost"] == 1
+    assert stats["fragmentsLost"] == len(first) - 1
+    assert stats["pending"] == 1
@@ -1,22 +1,39 @@
 #!/usr/bin/python3
 
 from pycc1101.pycc1101 import TICC1101
+from pycc1101.profile import PANSTAMP_PROFILE
+from pycc1101.link import ReliableLink
 from struct import pack
 import time
 
+# When set, this radio takes the address and the counter is sent through a
+# ReliableLink to 0x0A: retransmitted until rx.py (with RELIABLE) ACKs it.
+RELIABLE_ADDRESS = None
+
+PROFILE = PANSTAMP_PROFILE.copy("example", ADDR=0x0A, PKTCTRL1=0x05)
+
 ticc1101 = TICC1101()
-ticc1101.reset()
 ticc1101.selfTest()
-ticc1101.setDefaultValues()
-ticc1101.setFilteringAddress(0x0A)
-#ticc1101.setPacketMode("PKT_LEN_VARIABLE")
-ticc1101.setPacketMode("PKT_LEN_FIXED")
-ticc1101.configureAddressFiltering("ENABLED_NO_BROADCAST")
+# Fixed packet length (PKTCTRL0), address 0x0A filtered without broadcast
+# (PKTCTRL1). Only the registers that differ from the chip are written, a
+# restart keeps it configured.
+ticc1101.attach(PROFILE)
+
+link = None
+
+if RELIABLE_ADDRESS is not None:
+    ticc1101.setFilteringAddress(RELIABLE_ADDRESS)
+    link = ReliableLink(ticc1101)
 
 count = 0
 
 while True:
     data = pack('<I', count)
-    ticc1101.sendData(list(data))
+
+    if link is not None:
+        print("{} acknowledged: {}".format(count, link.send(data, 0x0A)))
+    else:
+        ticc1101.sendData(list(data))
+
     count += 1
     time.sleep(1)